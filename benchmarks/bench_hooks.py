@@ -0,0 +1,471 @@
+"""Measure the cost of tw_hooks on synthetic workloads of configurable size.
+
+The following are measured, each one separately:
+
+- Parsing the hook input (stdin_lines_to_json)
+- The _on_add/_on_modify/_on_exit method of each concrete hook
+- Constructing the tag hooks and running them once, as a new shim process does, with and
+  without the memo of tw_hooks.memo
+- The in-process dispatcher, running all the hooks of an event
+- End-to-end shim execution, as a subprocess, like Taskwarrior does it
+
+Results are printed as a table and can be saved as JSON, to compare them with those of another
+release, e.g.:
+
+    python -m benchmarks.bench_hooks --tasks 500 --rules 100 -o before.json
+    git checkout ...
+    python -m benchmarks.bench_hooks --tasks 500 --rules 100 --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Type
+
+import tw_hooks.config
+from benchmarks.workloads import (
+    Workload,
+    make_modification,
+    make_tag_mappings,
+    make_tag_patterns,
+    make_tag_sets,
+    make_tasks,
+    to_stdin_line,
+    write_pending_data,
+)
+from tw_hooks import json_codec
+from tw_hooks.base_hooks import BaseHook, OnAddHook, OnExitHook, OnModifyHook
+from tw_hooks.dispatcher import _hook_instances, dispatch
+from tw_hooks.hooks.auto_tag_based_on_tags import AutoTagBasedOnTags
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.hooks.detect_mutually_exclusive_tags import DetectMutuallyExclusiveTags
+from tw_hooks.hooks.maintain_task_index import MaintainTaskIndex
+from tw_hooks.hooks.post_latest_start_to_i3_status import PostLatestSTartToI3Status
+from tw_hooks.hooks.warn_on_task_congestion import WarnOnTaskCongestion
+from tw_hooks.memo import envvar as memo_envvar
+from tw_hooks.registry import HookInfo
+from tw_hooks.scripts.install_hook_shims import _build_shim
+from tw_hooks.task import parse_iso_basic
+from tw_hooks.task_index import TaskIndex
+from tw_hooks.utils import stdin_lines_to_json
+
+REPO_ROOT = Path(__file__).absolute().parent.parent
+
+ALL_HOOKS: Sequence[Type[BaseHook]] = (
+    AutoTagBasedOnTags,
+    CorrectTagNames,
+    DetectMutuallyExclusiveTags,
+    MaintainTaskIndex,
+    PostLatestSTartToI3Status,
+    WarnOnTaskCongestion,
+)
+
+Result = Dict[str, float]
+
+
+class _NullWriter(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def _stats(durations_ns: List[int]) -> Result:
+    durations_us = sorted(d / 1000 for d in durations_ns)
+    n = len(durations_us)
+    total_s = sum(durations_us) / 1e6
+    return {
+        "n": n,
+        "ops_per_s": n / total_s if total_s else float("inf"),
+        "mean_us": statistics.fmean(durations_us),
+        "p50_us": durations_us[n // 2],
+        "p95_us": durations_us[min(n - 1, int(n * 0.95))],
+        "p99_us": durations_us[min(n - 1, int(n * 0.99))],
+        "max_us": durations_us[-1],
+    }
+
+
+def _measure(fn: Callable[..., Any], inputs: Sequence[Any], setup=None) -> Result:
+    """Call fn once per input, with the standard output discarded, and time each call."""
+    durations = []
+    with redirect_stdout(_NullWriter()):
+        for args in inputs:
+            if setup is not None:
+                setup()
+            start = time.perf_counter_ns()
+            fn(*args)
+            durations.append(time.perf_counter_ns() - start)
+
+    return _stats(durations)
+
+
+class Bench:
+    """Set up the workload under a temporary directory and run all the measurements."""
+
+    def __init__(self, workload: Workload, e2e_runs: int, workdir: Path):
+        self.workload = workload
+        self.e2e_runs = e2e_runs
+        self.workdir = workdir
+        self.results: Dict[str, Result] = {}
+
+        rng = random.Random(workload.seed)
+        self.tasks = make_tasks(workload)
+        self.add_lines = [to_stdin_line(task) for task in self.tasks]
+        self.modify_lines = []
+        for task in self.tasks:
+            modified = make_modification(task, rng)
+            self.modify_lines.append([to_stdin_line(task), to_stdin_line(modified)])
+
+        self.task_dir = workdir / ".task"
+        self.task_dir.mkdir()
+        write_pending_data(self.task_dir / "pending.data", workload)
+
+        # stand-in for busctl, so that PostLatestSTartToI3Status doesn't talk to a real bus
+        bin_dir = workdir / "bin"
+        bin_dir.mkdir()
+        busctl = bin_dir / "busctl"
+        busctl.write_text("#!/bin/sh\nexit 0\n")
+        busctl.chmod(0o755)
+
+        self.env = dict(os.environ)
+        self.env.update(
+            {
+                "HOME": str(workdir),
+                "PATH": os.pathsep.join([str(bin_dir), self.env.get("PATH", "")]),
+                "PYTHONPATH": os.pathsep.join(
+                    [str(REPO_ROOT), self.env.get("PYTHONPATH", "")]
+                ),
+                "TW_CORRECT_TAG_MAPPINGS": json.dumps(make_tag_mappings(workload)),
+                "TW_AUTO_TAG_MAPPINGS": json.dumps(make_tag_patterns(workload)),
+                "TW_INCOMPATIBLE_TAG_SETS": json.dumps(make_tag_sets(workload)),
+            }
+        )
+
+    def _record(self, name: str, result: Result):
+        self.results[name] = result
+        print(
+            f"{name:<58} {result['n']:>6} {result['p50_us']:>11.1f} {result['p95_us']:>11.1f}"
+            f" {result['ops_per_s']:>11.1f}",
+            file=sys.stderr,
+        )
+
+    def run(self):
+        print(
+            f"{'benchmark':<58} {'n':>6} {'p50 [us]':>11} {'p95 [us]':>11} {'ops/s':>11}",
+            file=sys.stderr,
+        )
+        self.bench_parsing()
+        self.bench_hooks()
+        self.bench_memo()
+        self.bench_dispatcher()
+        if self.e2e_runs:
+            self.bench_shims()
+
+    def bench_parsing(self):
+        self._record(
+            "stdin_lines_to_json/on-add",
+            _measure(stdin_lines_to_json, [([line],) for line in self.add_lines]),
+        )
+        self._record(
+            "stdin_lines_to_json/on-modify",
+            _measure(stdin_lines_to_json, [(lines,) for lines in self.modify_lines]),
+        )
+
+        timestamps = [(json.loads(line)["entry"],) for line in self.add_lines]
+        self._record("parse_iso_basic", _measure(parse_iso_basic, timestamps))
+
+    def _fresh_tasks(self, lines: List[str]) -> List[Any]:
+        # the hooks modify the tasks in place, hand a fresh copy to each call
+        return [json.loads(line) for line in lines]
+
+    def bench_hooks(self):
+        # the tasks as the hooks get them, parsed up front to only measure the hook itself
+        modified = [lines[1] for lines in self.modify_lines]
+        hooks: List[BaseHook] = [
+            AutoTagBasedOnTags(tag_mappings=make_tag_patterns(self.workload)),
+            CorrectTagNames(tag_mappings=make_tag_mappings(self.workload)),
+            DetectMutuallyExclusiveTags(tag_sets=make_tag_sets(self.workload)),
+            PostLatestSTartToI3Status(busctl=shutil.which("true") or "true"),
+        ]
+        for hook in hooks:
+            if isinstance(hook, OnAddHook):
+                inputs = [(task,) for task in self._fresh_tasks(self.add_lines)]
+                self._record(f"hook/{hook.name()}/on-add", _measure(hook._on_add, inputs))
+            if isinstance(hook, OnModifyHook):
+                inputs = [(None, task) for task in self._fresh_tasks(modified)]
+                self._record(
+                    f"hook/{hook.name()}/on-modify", _measure(hook._on_modify, inputs)
+                )
+
+        index_path = self.task_dir / "tw_hooks" / "warn-on-task-congestion.index"
+        tasks = self._fresh_tasks(self.add_lines)
+
+        def remove_index():
+            if index_path.exists():
+                index_path.unlink()
+
+        n_cold = max(1, min(20, len(tasks)))
+        hook = WarnOnTaskCongestion(task_dir=self.task_dir)
+        self._record(
+            "hook/WarnOnTaskCongestion/on-exit/cold",
+            _measure(
+                lambda t: WarnOnTaskCongestion(task_dir=self.task_dir)._on_exit([t]),
+                [(t,) for t in tasks[:n_cold]],
+                setup=remove_index,
+            ),
+        )
+        self._record(
+            "hook/WarnOnTaskCongestion/on-exit/warm",
+            _measure(hook._on_exit, [([t],) for t in tasks]),
+        )
+
+        pending_data = self.task_dir / "pending.data"
+        appended = iter(tasks)
+
+        def append_task():
+            task = next(appended)
+            with pending_data.open("a") as f:
+                f.write(f'[description:"appended" status:"pending" uuid:"{task["uuid"]}"]\n')
+
+        self._record(
+            "hook/WarnOnTaskCongestion/on-exit/append",
+            _measure(hook._on_exit, [([t],) for t in tasks], setup=append_task),
+        )
+
+        index = TaskIndex.for_task_dir(self.task_dir)
+        self._record("task_index/rebuild", _measure(index.rebuild, [()] * n_cold))
+        self._record(
+            "hook/MaintainTaskIndex/on-exit",
+            _measure(
+                MaintainTaskIndex(task_dir=self.task_dir)._on_exit, [([t],) for t in tasks]
+            ),
+        )
+        now = int(time.time())
+        self._record(
+            "task_index/count_between",
+            _measure(index.count_between, [(now, now + 86400)] * len(tasks)),
+        )
+        tags = [(t["tags"][0],) for t in tasks if t.get("tags")] or [("kalimera",)]
+        self._record("task_index/uuids_with_tag", _measure(index.uuids_with_tag, tags))
+        index.close()
+
+    def bench_memo(self):
+        # what a new shim process starts without: the derived structures are loaded from the
+        # cache directory and the regular expressions compiled again
+        def forget():
+            tw_hooks.config._derived.clear()
+            re.purge()
+
+        patterns = make_tag_patterns(self.workload)
+        mappings = make_tag_mappings(self.workload)
+        tag_sets = make_tag_sets(self.workload)
+        makers: Dict[str, Callable[[], OnAddHook]] = {
+            "AutoTagBasedOnTags": lambda: AutoTagBasedOnTags(tag_mappings=patterns),
+            "CorrectTagNames": lambda: CorrectTagNames(tag_mappings=mappings),
+            "DetectMutuallyExclusiveTags": lambda: DetectMutuallyExclusiveTags(
+                tag_sets=tag_sets
+            ),
+        }
+
+        environ = dict(os.environ)
+        os.environ[tw_hooks.config.cache_dir_envvar] = str(self.workdir / "cache")
+        try:
+            for name, make in makers.items():
+                for label, max_entries in (("cold", 0), ("cold-memo", 2 * len(self.tasks))):
+                    os.environ[memo_envvar] = str(max_entries)
+                    # first pass to fill the caches, only the second one is measured
+                    for _ in range(2):
+                        inputs = [(make, task) for task in self._fresh_tasks(self.add_lines)]
+                        result = _measure(
+                            lambda make, task: make()._on_add(task), inputs, setup=forget
+                        )
+                    self._record(f"hook/{name}/on-add/{label}", result)
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def _specs(self, Base: Type[BaseHook]):
+        return [(Hook.__module__, Hook.name()) for Hook in ALL_HOOKS if issubclass(Hook, Base)]
+
+    def bench_dispatcher(self):
+        environ = dict(os.environ)
+        os.environ.update(self.env)
+        _hook_instances.clear()
+        try:
+            self._record(
+                "dispatcher/on-add",
+                _measure(
+                    lambda lines: dispatch("on-add", self._specs(OnAddHook), lines),
+                    [([line],) for line in self.add_lines],
+                ),
+            )
+            self._record(
+                "dispatcher/on-modify",
+                _measure(
+                    lambda lines: dispatch("on-modify", self._specs(OnModifyHook), lines),
+                    [(lines,) for lines in self.modify_lines],
+                ),
+            )
+            self._record(
+                "dispatcher/on-exit",
+                _measure(
+                    lambda lines: dispatch("on-exit", self._specs(OnExitHook), lines),
+                    [([line],) for line in self.add_lines],
+                ),
+            )
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+            _hook_instances.clear()
+
+    def _run_shim(self, shim: Path, stdin: str) -> str:
+        proc = subprocess.run(
+            [sys.executable, str(shim)],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            env=self.env,
+            check=False,
+        )
+        return proc.stdout
+
+    def _run_chain(self, shims: List[Path], lines: List[str]):
+        """Run the shims one after the other, feeding the output of each one to the next."""
+        if len(lines) == 1:
+            for shim in shims:
+                self._run_shim(shim, lines[0])
+            return
+
+        original, modified = lines
+        for shim in shims:
+            out = self._run_shim(shim, original + modified)
+            task_lines = [line for line in out.splitlines() if line.startswith("{")]
+            if task_lines:
+                modified = task_lines[-1] + "\n"
+
+    def bench_shims(self):
+        shim_dir = self.workdir / "shims"
+        shim_dir.mkdir()
+        events = {
+            OnAddHook: [[line] for line in self.add_lines[: self.e2e_runs]],
+            OnModifyHook: self.modify_lines[: self.e2e_runs],
+            OnExitHook: [[line] for line in self.add_lines[: self.e2e_runs]],
+        }
+        for Base, inputs in events.items():
+            event = Base.shim_prefix()
+            hooks = [HookInfo.from_class(Hook) for Hook in ALL_HOOKS if issubclass(Hook, Base)]
+
+            dispatcher_shim = shim_dir / f"{event}-tw-hooks-dispatcher.py"
+            dispatcher_shim.write_text(_build_shim(Base, hooks))
+            per_hook_shims = []
+            for hook in hooks:
+                shim = shim_dir / f"{event}-{hook.name}.py"
+                shim.write_text(_build_shim(Base, [hook]))
+                per_hook_shims.append(shim)
+
+            self._record(
+                f"shim/{event}/dispatcher",
+                _measure(self._run_chain, [([dispatcher_shim], lines) for lines in inputs]),
+            )
+            self._record(
+                f"shim/{event}/per-hook",
+                _measure(self._run_chain, [(per_hook_shims, lines) for lines in inputs]),
+            )
+
+
+def _meta(workload: Workload) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": json_codec.backend,
+        "workload": workload.__dict__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results: Dict[str, Result], baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text())
+    print(
+        f"\n{'benchmark':<58} {'base p50':>11} {'p50':>11} {'ratio':>7}"
+        f"  (baseline: {baseline['meta']['commit']})"
+    )
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["p50_us"] / base["p50_us"] if base["p50_us"] else float("inf")
+        print(f"{name:<58} {base['p50_us']:>11.1f} {result['p50_us']:>11.1f} {ratio:>7.2f}")
+
+
+def main():
+    defaults = Workload()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tasks", type=int, default=defaults.tasks, help="Tasks to process")
+    parser.add_argument("--tags-per-task", type=int, default=defaults.tags_per_task)
+    parser.add_argument("--annotations", type=int, default=defaults.annotations)
+    parser.add_argument("--tag-vocabulary", type=int, default=defaults.tag_vocabulary)
+    parser.add_argument(
+        "--rules", type=int, default=defaults.rules, help="Size of the hook configurations"
+    )
+    parser.add_argument(
+        "--pending-tasks",
+        type=int,
+        default=defaults.pending_tasks,
+        help="Size of pending.data",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--e2e-runs",
+        type=int,
+        default=20,
+        help="Invocations of each shim as a subprocess, 0 to skip the end-to-end benchmarks",
+    )
+    parser.add_argument("-o", "--output", type=Path, help="Save the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    workload = Workload(
+        tasks=args.tasks,
+        tags_per_task=args.tags_per_task,
+        annotations=args.annotations,
+        tag_vocabulary=args.tag_vocabulary,
+        rules=args.rules,
+        pending_tasks=args.pending_tasks,
+        seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory(prefix="tw-hooks-bench-") as workdir:
+        bench = Bench(workload, e2e_runs=args.e2e_runs, workdir=Path(workdir))
+        bench.run()
+
+    output: Dict[str, Any] = {"meta": _meta(workload), "results": bench.results}
+    if args.output is not None:
+        args.output.write_text(json.dumps(output, indent=2))
+    if args.compare is not None:
+        compare(bench.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Compare the JSON backends of tw_hooks.json_codec on task payloads like the ones Taskwarrior
+passes to the hooks.
+
+Run it from the root of the repo, e.g., with each of orjson and ujson installed or not:
+
+    python -m benchmarks.bench_json_codec
+"""
+import argparse
+import ast
+import json
+import timeit
+from typing import Any, Callable, Dict, List
+
+from tw_hooks.json_codec import backends, load_backend, loads_literal
+
+# Same as the stdlines0/stdlines1 fixtures of tests/conftest.py
+_RECURRING = (
+    '{"description":"Meditate","due":"20220528T155959Z","entry":"20220528T144107Z",'
+    '"mask":"XXXXX-WW","modified":"20220603T161607Z","recur":"1d","rtype":"periodic",'
+    '"status":"recurring","uuid":"0fbe94ed-0b8b-419b-ab49-d85acd6c8b8e",'
+    '"wait":"20220527T225959Z","tags":["remindme","routine"]}'
+)
+_UNICODE = _RECURRING.replace("Meditate", "🍣🍣🍣 More food")
+
+
+def _annotated(n: int) -> str:
+    task = json.loads(_UNICODE)
+    task["annotations"] = [
+        {"entry": "20220603T161607Z", "description": f"Σημείωση #{i}, don't forget 🍣"}
+        for i in range(n)
+    ]
+    return json.dumps(task, ensure_ascii=False)
+
+
+PAYLOADS: Dict[str, str] = {
+    "recurring": _RECURRING,
+    "unicode": _UNICODE,
+    "unicode-escaped": json.dumps(json.loads(_UNICODE)),
+    "annotations-100": _annotated(100),
+}
+
+
+def _per_op_us(fn: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def bench_backends(number: int) -> List[Dict[str, Any]]:
+    results = []
+    for name in backends:
+        try:
+            _, loads, dumps = load_backend(name)
+        except ImportError:
+            print(f"{name}: not installed, skipping")
+            continue
+
+        for payload_name, payload in PAYLOADS.items():
+            obj = loads(payload)
+            results.append(
+                {
+                    "backend": name,
+                    "payload": payload_name,
+                    "loads_us": _per_op_us(lambda: loads(payload), number),  # noqa: B023
+                    "dumps_us": _per_op_us(lambda: dumps(obj), number),  # noqa: B023
+                }
+            )
+
+    return results
+
+
+def bench_literal_fallback(number: int) -> List[Dict[str, Any]]:
+    """Python literals, e.g., str() of a task, and invalid input that must fail fast."""
+    literal = str(json.loads(_UNICODE))
+    results = []
+    for payload_name, payload in {"literal": literal, "garbage": "kalimera " * 20}.items():
+
+        def fallback():
+            try:
+                loads_literal(payload)  # noqa: B023
+            except ValueError:
+                pass
+
+        def literal_eval():
+            try:
+                ast.literal_eval(payload)  # noqa: B023
+            except (SyntaxError, ValueError):
+                pass
+
+        results.append(
+            {
+                "payload": payload_name,
+                "loads_literal_us": _per_op_us(fallback, number),
+                "literal_eval_us": _per_op_us(literal_eval, number),
+            }
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=2000, help="Calls per measurement")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "backends": bench_backends(args.number),
+        "literal_fallback": bench_literal_fallback(args.number),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':<8} {'payload':<16} {'loads [us]':>10} {'dumps [us]':>10}")
+    for r in results["backends"]:
+        print(
+            f"{r['backend']:<8} {r['payload']:<16} {r['loads_us']:>10.2f} {r['dumps_us']:>10.2f}"
+        )
+
+    print()
+    print(f"{'payload':<16} {'loads_literal [us]':>18} {'literal_eval [us]':>18}")
+    for r in results["literal_fallback"]:
+        print(
+            f"{r['payload']:<16} {r['loads_literal_us']:>18.2f} {r['literal_eval_us']:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
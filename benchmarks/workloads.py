@@ -0,0 +1,143 @@
+"""Synthetic Taskwarrior workloads: tasks, hook input lines, pending.data files and hook
+configurations of configurable size.
+
+All the generators are deterministic for a given seed, so that runs are comparable.
+"""
+import json
+import random
+import time
+import uuid as uuid_mod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from tw_hooks.types import ListOfTagsList, TaskT
+
+_WORDS = (
+    "kalimera meditate food 🍣 groceries release review call mom taxes movie work read "
+    "Σημείωση écrire fix bug deploy don't forget book gym"
+).split()
+
+
+@dataclass
+class Workload:
+    """Size of the synthetic workload."""
+
+    tasks: int = 1000
+    tags_per_task: int = 5
+    annotations: int = 2
+    tag_vocabulary: int = 200
+    rules: int = 50
+    pending_tasks: int = 10000
+    seed: int = 0
+
+
+def _iso(ts: float) -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(ts))
+
+
+def tag_vocabulary(workload: Workload) -> List[str]:
+    """Tags that the synthetic tasks use.
+
+    >>> tag_vocabulary(Workload(tag_vocabulary=3))
+    ['tag0', 'tag1', 'tag2']
+    """
+    return [f"tag{i}" for i in range(workload.tag_vocabulary)]
+
+
+def make_task(rng: random.Random, workload: Workload) -> TaskT:
+    now = time.time()
+    tags = tag_vocabulary(workload)
+    task: TaskT = {
+        "description": " ".join(rng.choices(_WORDS, k=rng.randint(2, 8))),
+        "entry": _iso(now - rng.randint(0, 30 * 86400)),
+        "modified": _iso(now),
+        "status": "pending",
+        "uuid": str(uuid_mod.UUID(int=rng.getrandbits(128), version=4)),
+        "tags": rng.sample(tags, min(workload.tags_per_task, len(tags))),
+    }
+    if rng.random() < 0.5:
+        task["due"] = _iso(now + rng.randint(-86400, 7 * 86400))
+    if workload.annotations:
+        task["annotations"] = [
+            {
+                "entry": _iso(now - i),
+                "description": " ".join(rng.choices(_WORDS, k=rng.randint(3, 12))),
+            }
+            for i in range(workload.annotations)
+        ]
+
+    return task
+
+
+def make_tasks(workload: Workload) -> List[TaskT]:
+    rng = random.Random(workload.seed)
+    return [make_task(rng, workload) for _ in range(workload.tasks)]
+
+
+def to_stdin_line(task: TaskT) -> str:
+    """Line in the format that Taskwarrior passes to the hooks."""
+    return json.dumps(task, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def make_modification(task: TaskT, rng: random.Random) -> TaskT:
+    """Modified version of the given task, with a new description and a changed tag.
+
+    Some of the tasks are also started.
+    """
+    modified: TaskT = json.loads(json.dumps(task))
+    if rng.random() < 0.1:
+        modified["start"] = modified["modified"]
+    modified["description"] += " " + rng.choice(_WORDS)
+    if modified["tags"]:
+        modified["tags"][-1] = f"{modified['tags'][-1]}x"
+    return modified
+
+
+def write_pending_data(path: Path, workload: Workload):
+    """Write a pending.data file, in the format of Taskwarrior 2.x, with due dates around today."""
+    rng = random.Random(workload.seed + 1)
+    sub_workload = Workload(**{**workload.__dict__, "annotations": 0})
+    now = time.time()
+    with path.open("w", encoding="utf-8") as f:
+        for _ in range(workload.pending_tasks):
+            task = make_task(rng, sub_workload)
+            attrs: Dict[str, str] = {
+                "description": task["description"].replace('"', ""),
+                "entry": str(int(now)),
+                "status": rng.choice(["pending"] * 9 + ["completed"]),
+                "tags": ",".join(task["tags"]),
+                "uuid": task["uuid"],
+            }
+            if rng.random() < 0.5:
+                attrs["due"] = str(int(now) + rng.randint(-86400, 7 * 86400))
+            for i in range(rng.randint(0, workload.annotations)):
+                attrs[f"annotation_{int(now) - i}"] = "some annotation"
+
+            f.write("[" + " ".join(f'{k}:"{v}"' for k, v in sorted(attrs.items())) + "]\n")
+
+
+def make_tag_mappings(workload: Workload) -> Dict[str, str]:
+    """Mappings for CorrectTagNames and AutoTagBasedOnTags: some hit, most don't."""
+    tags = tag_vocabulary(workload)
+    mappings = {f"misspelled{i}": tags[i % len(tags)] for i in range(workload.rules)}
+    for tag in tags[: max(1, workload.rules // 10)]:
+        mappings[tag] = f"{tag}-extra"
+    return mappings
+
+
+def make_tag_patterns(workload: Workload) -> Dict[str, List[str]]:
+    """Mappings for AutoTagBasedOnTags, a mix of plain prefixes and regular expressions."""
+    tags = tag_vocabulary(workload)
+    patterns: Dict[str, List[str]] = {}
+    for i in range(workload.rules):
+        pattern = f"{tags[i % len(tags)]}" if i % 2 else f"tag{i % 10}[0-9]+$"
+        patterns[pattern] = [f"auto{i}"]
+    return patterns
+
+
+def make_tag_sets(workload: Workload) -> ListOfTagsList:
+    """Sets of mutually exclusive tags for DetectMutuallyExclusiveTags, rarely violated."""
+    rng = random.Random(workload.seed + 2)
+    tags = tag_vocabulary(workload)
+    return [rng.sample(tags, min(3, len(tags))) for _ in range(workload.rules)]
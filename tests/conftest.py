@@ -3,9 +3,26 @@ from typing import Any, List
 import pytest
 from pytest import fixture
 
+import tw_hooks.dispatcher
 from tw_hooks.types import TaskT
 
 
+@fixture(autouse=True)
+def isolated_hooks_config(tmp_path_factory: pytest.TempPathFactory, monkeypatch):
+    """Don't let the configuration and the cache of the user leak into the tests."""
+    tmp_path = tmp_path_factory.mktemp("tw_hooks_config")
+    monkeypatch.setenv("TW_HOOKS_CONFIG", str(tmp_path / "config.json"))
+    monkeypatch.setenv("TW_HOOKS_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@fixture
+def clear_hook_instances():
+    """Instantiate the hooks of each test from scratch, and don't keep them around after it."""
+    tw_hooks.dispatcher._hook_instances.clear()
+    yield
+    tw_hooks.dispatcher._hook_instances.clear()
+
+
 @fixture
 def on_modify_changed_title(
     on_modify_changed_title_orig, on_modify_changed_title_mod
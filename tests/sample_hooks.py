@@ -0,0 +1,17 @@
+"""Hooks configured for the tests, shared by the tests of the dispatcher, the daemon and apply."""
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.hooks.detect_mutually_exclusive_tags import DetectMutuallyExclusiveTags
+
+
+class CorrectWor(CorrectTagNames):
+    def __init__(self):
+        super().__init__(tag_mappings={"wor": "work"})
+
+
+class DetectWorkMovie(DetectMutuallyExclusiveTags):
+    def __init__(self):
+        super().__init__(tag_sets=[["work", "movie"]])
+
+
+correct_wor = (__name__, "CorrectWor")
+detect_work_movie = (__name__, "DetectWorkMovie")
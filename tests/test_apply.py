@@ -0,0 +1,55 @@
+from typing import List
+
+import pytest
+
+from tests.sample_hooks import correct_wor, detect_work_movie
+from tw_hooks.apply import apply, iter_task_lines
+from tw_hooks.json_codec import dumps
+from tw_hooks.utils import use_json
+
+hooks = [correct_wor, detect_work_movie]
+
+
+def _export(n: int) -> List[str]:
+    """Lines in the format of `task export`."""
+    tags = [["wor"], ["work"], ["wor", "movie"], ["movie"]]
+    tasks = [
+        {"uuid": str(i), "description": "kalimera", "tags": tags[i % 4]} for i in range(n)
+    ]
+    lines = ["[\n"]
+    lines.extend(dumps(task) + ",\n" for task in tasks[:-1])
+    lines.append(dumps(tasks[-1]) + "\n")
+    lines.append("]\n")
+    return lines
+
+
+def test_iter_task_lines_json_lines():
+    lines = ['{"uuid": "1"}\n', "\n", '{"uuid": "2", "tags": ["a"]}\n']
+    assert [use_json(line) for line in iter_task_lines(lines)] == [
+        {"uuid": "1"},
+        {"uuid": "2", "tags": ["a"]},
+    ]
+
+
+def test_iter_task_lines_incomplete():
+    with pytest.raises(RuntimeError):
+        list(iter_task_lines(["[\n", '{"uuid": "1",\n']))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_apply_only_reports_changed_and_rejected(jobs: int):
+    results = list(apply(hooks, _export(100), jobs=jobs, chunk_size=7))
+
+    changed = [r for r in results if r.retcode == 0]
+    rejected = [r for r in results if r.retcode]
+    assert [r.uuid for r in changed] == [str(i) for i in range(0, 100, 4)]
+    assert [r.uuid for r in rejected] == [str(i) for i in range(2, 100, 4)]
+
+    assert all(use_json(r.task_line)["tags"] == ["work"] for r in changed)  # type: ignore
+    assert all(r.task_line is None for r in rejected)
+    assert rejected[0].feedback[-1].startswith("[DetectWorkMovie] Can't use")
+
+
+def test_apply_unknown_event():
+    with pytest.raises(RuntimeError):
+        list(apply([("tw_hooks.hooks.warn_on_task_congestion", "WarnOnTaskCongestion")], []))
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List
+
+from pytest import fixture
+
+from tw_hooks.base_hooks.on_modify_hook import OnModifyHook
+from tw_hooks.hooks.auto_tag_based_on_tags import AutoTagBasedOnTags
+from tw_hooks.utils import use_json
+
+
+@fixture
+def hook0() -> OnModifyHook:
+    tag_mappings = {"python": "programming", "w.*r": ["work", "job"], "mov": ["fun"]}
+    return AutoTagBasedOnTags(tag_mappings=tag_mappings)
+
+
+@fixture
+def hook1() -> OnModifyHook:
+    tag_mappings = {"work": ["job"], "job": "money", "movie": ["movie"]}
+    return AutoTagBasedOnTags(tag_mappings=tag_mappings)
+
+
+def test_nop(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+):
+    """If no pattern matches, this hook should do nothing."""
+    AutoTagBasedOnTags(tag_mappings={"python": "programming"}).on_modify(
+        on_modify_changed_title
+    )
+    captured = capsys.readouterr()
+    assert use_json(captured.out.strip()) == on_modify_changed_title_mod_dict
+    assert captured.err == ""
+
+
+def test_apply_extra_tags(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+    hook0: OnModifyHook,
+):
+    """Both plain prefixes and regular expressions should add their tags, once."""
+    hook0.on_modify(on_modify_changed_title)
+    captured = capsys.readouterr()
+    on_modify_changed_title_mod_dict["tags"] = ["movie", "wor", "work", "job", "fun"]
+    lines = captured.out.splitlines()
+    assert (
+        lines[0]
+        == "[AutoTagBasedOnTags] Applying extra tags (due to pattern w.*r): ['work', 'job']"
+    )
+    assert lines[1] == "[AutoTagBasedOnTags] Applying extra tags (due to pattern mov): ['fun']"
+    assert use_json(lines[2]) == on_modify_changed_title_mod_dict
+
+
+def test_extra_tags_match_other_patterns(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+    hook1: OnModifyHook,
+):
+    """Extra tags should be checked against the patterns as well, but never duplicated."""
+    on_modify_changed_title[1] = on_modify_changed_title[1].replace("'wor'", "'work'")
+    hook1.on_modify(on_modify_changed_title)
+    captured = capsys.readouterr()
+    on_modify_changed_title_mod_dict["tags"] = ["movie", "work", "job", "money"]
+    lines = captured.out.splitlines()
+    assert len(lines) == 3
+    assert use_json(lines[2]) == on_modify_changed_title_mod_dict
@@ -0,0 +1,48 @@
+import os
+import subprocess
+from pathlib import Path
+
+from tw_hooks.base_hooks import OnAddHook
+from tw_hooks.bundle import build_bundle
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.registry import HookInfo
+from tw_hooks.scripts.install_hook_shims import _build_shim, _write_shim
+from tw_hooks.utils import use_json
+
+TASK = '{"description": "kalimera", "uuid": "c236dff8", "tags": ["wor"]}\n'
+
+
+def test_bundled_shim(tmp_path: Path):
+    bundle_dir = tmp_path / "bundle"
+    modules = ["tw_hooks.dispatcher", CorrectTagNames.__module__]
+    bundled = build_bundle(bundle_dir, modules)
+    assert "tw_hooks" in [path.name for path in bundled]
+    assert "bubop" not in [path.name for path in bundled]
+    assert list((bundle_dir / "tw_hooks").glob("__pycache__/*.pyc"))
+
+    shim = tmp_path / "on-add-tw-hooks-dispatcher.py"
+    hooks = [HookInfo.from_class(CorrectTagNames)]
+    _write_shim(shim, _build_shim(OnAddHook, hooks, bundle_dir=bundle_dir))
+    assert shim.read_text().startswith("#!") and " -IS\n" in shim.read_text()
+
+    # the shim has to work without any of the installed packages on its path
+    env = {
+        **os.environ,
+        "HOME": str(tmp_path),
+        "PYTHONPATH": "",
+        "TW_CORRECT_TAG_MAPPINGS": '{"wor": "work"}',
+    }
+    proc = subprocess.run(
+        [str(shim)],
+        input=TASK,
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=tmp_path,
+        check=True,
+    )
+    assert use_json(proc.stdout.splitlines()[-1])["tags"] == ["work"]
+
+    # rebuilding replaces the existing bundle
+    build_bundle(bundle_dir, modules)
+    assert not (tmp_path / "bundle.tmp").exists()
@@ -0,0 +1,102 @@
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from tw_hooks.base_hooks import OnAddHook
+from tw_hooks.circuit_breaker import CircuitBreaker, from_config
+from tw_hooks.dispatcher import dispatch
+from tw_hooks.types import TaskLike
+
+
+class BrokenIntegration(OnAddHook):
+    calls = 0
+
+    def _on_add(self, added_task: TaskLike):
+        BrokenIntegration.calls += 1
+        raise RuntimeError("Target is down")
+
+
+broken_integration = (__name__, "BrokenIntegration")
+
+
+@pytest.fixture
+def task_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(sys, "argv", ["on-add", "api:2", f"data:{tmp_path}"])
+    return tmp_path
+
+
+def test_opens_after_consecutive_failures(tmp_path: Path):
+    breaker = CircuitBreaker(tmp_path / "state.json", max_failures=2, cooldown=600)
+    assert breaker.record("Hook", failed=True) is None
+    assert breaker.record("Hook", failed=False) is None
+    assert breaker.record("Hook", failed=True) is None
+    assert breaker.allow("Hook")
+
+    message = breaker.record("Hook", failed=True)
+    assert message == "[Hook] Failed 2 time(s) in a row, bypassing it for the next 600s"
+    assert not breaker.allow("Hook")
+    assert breaker.allow("OtherHook")
+
+    # persisted for the next invocations
+    breaker.save()
+    assert not CircuitBreaker(tmp_path / "state.json", cooldown=600).allow("Hook")
+
+
+def test_half_open_probe(tmp_path: Path, monkeypatch):
+    breaker = CircuitBreaker(tmp_path / "state.json", max_failures=1, cooldown=10)
+    breaker.record("Hook", failed=True)
+    assert not breaker.allow("Hook")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert breaker.allow("Hook")
+    # the probe failed, bypass it for another cooldown
+    assert breaker.record("Hook", failed=True) is not None
+    assert not breaker.allow("Hook")
+
+    monkeypatch.setattr(time, "time", lambda: now + 22)
+    assert breaker.allow("Hook")
+    breaker.record("Hook", failed=False)
+    assert breaker.states == {}
+
+
+def test_slow_invocations_count_as_failures(tmp_path: Path):
+    breaker = CircuitBreaker(tmp_path / "state.json", max_failures=1, slow_ms=100)
+    assert breaker.record("Hook", failed=False, elapsed_ms=50) is None
+    assert breaker.record("Hook", failed=False, elapsed_ms=150) is not None
+
+
+def test_config(task_dir: Path, monkeypatch):
+    assert from_config() is None
+    monkeypatch.setenv("TW_HOOKS_CIRCUIT_BREAKER", "0")
+    assert from_config() is None
+    monkeypatch.setenv("TW_HOOKS_CIRCUIT_BREAKER", "1")
+    breaker = from_config()
+    assert breaker is not None
+    assert breaker._path == task_dir / "tw_hooks" / "circuit-breaker.json"
+    monkeypatch.setenv("TW_HOOKS_CIRCUIT_BREAKER", '{"cooldown": 5}')
+    breaker = from_config()
+    assert breaker is not None
+    assert breaker._cooldown == 5
+    monkeypatch.setenv("TW_HOOKS_CIRCUIT_BREAKER", '{"cooldwn": 5}')
+    with pytest.raises(RuntimeError):
+        from_config()
+
+
+@pytest.mark.usefixtures("clear_hook_instances")
+def test_dispatch_bypasses_failing_hook(task_dir: Path, monkeypatch, capsys):
+    monkeypatch.setenv("TW_HOOKS_CIRCUIT_BREAKER", '{"max_failures": 2}')
+    stdin_lines: List[str] = ['{"description": "kalimera", "uuid": "c2"}\n']
+    BrokenIntegration.calls = 0
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            dispatch("on-add", [broken_integration], stdin_lines=stdin_lines)
+    assert capsys.readouterr().out.startswith("[BrokenIntegration] Failed 2 time(s) in a row")
+
+    assert dispatch("on-add", [broken_integration], stdin_lines=stdin_lines) == 0
+    assert capsys.readouterr().out == stdin_lines[0]
+    assert BrokenIntegration.calls == 2
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import tw_hooks.config
+from tw_hooks.config import get_config, get_derived
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+
+built: List[Any] = []
+
+
+def _build(config: Dict[str, str]) -> Dict[str, str]:
+    built.append(config)
+    return {v: k for k, v in config.items()}
+
+
+@pytest.fixture
+def config_file(monkeypatch) -> Path:
+    path = Path(tw_hooks.config.config_file_path())
+    path.write_text(json.dumps({"TW_CORRECT_TAG_MAPPINGS": {"wor": "work"}}))
+    return path
+
+
+def test_env_overrides_file(config_file: Path, monkeypatch):
+    monkeypatch.delenv("TW_CORRECT_TAG_MAPPINGS", raising=False)
+    assert get_config("TW_CORRECT_TAG_MAPPINGS") == {"wor": "work"}
+
+    monkeypatch.setenv("TW_CORRECT_TAG_MAPPINGS", '{"wor": "job"}')
+    assert get_config("TW_CORRECT_TAG_MAPPINGS") == {"wor": "job"}
+
+
+def test_hook_reads_file(config_file: Path, monkeypatch, on_modify_changed_title, capsys):
+    monkeypatch.delenv("TW_CORRECT_TAG_MAPPINGS", raising=False)
+    CorrectTagNames().on_modify(on_modify_changed_title)
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])["tags"] == ["movie", "work"]
+
+
+def test_derived_structures_are_persisted(monkeypatch):
+    built.clear()
+    monkeypatch.setattr(tw_hooks.config, "_derived", {})
+    assert get_derived(_build, {"a": "b"}) == {"b": "a"}
+    assert get_derived(_build, {"a": "b"}) == {"b": "a"}
+    assert len(built) == 1
+
+    # as if in a new process
+    monkeypatch.setattr(tw_hooks.config, "_derived", {})
+    assert get_derived(_build, {"a": "b"}) == {"b": "a"}
+    assert len(built) == 1
+
+    assert get_derived(_build, {"a": "c"}) == {"c": "a"}
+    assert len(built) == 2
+
+
+def test_corrupted_cache(monkeypatch):
+    built.clear()
+    monkeypatch.setattr(tw_hooks.config, "_derived", {})
+    get_derived(_build, {"a": "b"})
+    for path in tw_hooks.config.cache_dir_path().iterdir():  # type: ignore
+        path.write_bytes(b"garbage")
+
+    monkeypatch.setattr(tw_hooks.config, "_derived", {})
+    assert get_derived(_build, {"a": "b"}) == {"b": "a"}
+    assert len(built) == 2
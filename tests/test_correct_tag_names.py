@@ -1,10 +1,11 @@
 from typing import Any, Dict, List
 
+import pytest
 from pytest import fixture
 
 from tw_hooks.base_hooks.on_modify_hook import OnModifyHook
 from tw_hooks.hooks.correct_tag_names import CorrectTagNames
-from tw_hooks.utils import _use_json
+from tw_hooks.utils import use_json
 
 
 @fixture
@@ -37,7 +38,7 @@ def test_nop(
     """If the tags are irrelevant then this hook should do nothing."""
     hook0.on_modify(on_modify_changed_title)
     captured = capsys.readouterr()
-    assert _use_json(captured.out.strip()) == on_modify_changed_title_mod_dict
+    assert use_json(captured.out.strip()) == on_modify_changed_title_mod_dict
     assert captured.err == ""
 
 
@@ -54,7 +55,7 @@ def test_change_one_tag(
     out: str = captured.out
     parts = out.split("\n", maxsplit=1)
     assert parts[0].startswith("[CorrectTagNames] Correcting")
-    assert _use_json(parts[1].strip()) == on_modify_changed_title_mod_dict
+    assert use_json(parts[1].strip()) == on_modify_changed_title_mod_dict
     assert captured.err == ""
 
 
@@ -74,6 +75,35 @@ def test_change_multiple_tag(
     parts = out.split("\n", maxsplit=2)
     assert parts[0].startswith("[CorrectTagNames] Correcting")
     assert parts[1].startswith("[CorrectTagNames] Correcting")
-    assert _use_json(parts[2].strip()) == on_modify_changed_title_mod_dict
+    assert use_json(parts[2].strip()) == on_modify_changed_title_mod_dict
 
     assert captured.err == ""
+
+
+def test_transitive_glob_and_dedup(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+):
+    """Chains of corrections should settle at once and produce no duplicate tags."""
+    hook = CorrectTagNames(tag_mappings={"wor": "work", "work": "job", "mov*": "job"})
+    hook.on_modify(on_modify_changed_title)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:2] == [
+        "[CorrectTagNames] Correcting tag: movie -> job",
+        "[CorrectTagNames] Correcting tag: wor -> job",
+    ]
+    on_modify_changed_title_mod_dict["tags"] = ["job"]
+    assert use_json(lines[2]) == on_modify_changed_title_mod_dict
+
+
+def test_ignore_case(on_modify_changed_title: List[str], capsys):
+    CorrectTagNames(tag_mappings={"MOVIE": "film"}, ignore_case=True).on_modify(
+        on_modify_changed_title
+    )
+    assert use_json(capsys.readouterr().out.splitlines()[-1])["tags"] == ["film", "wor"]
+
+
+def test_cycle():
+    with pytest.raises(RuntimeError, match="cycle"):
+        CorrectTagNames(tag_mappings={"wor": "work", "work": "wor"})
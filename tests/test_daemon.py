@@ -0,0 +1,170 @@
+import os
+import socket
+import stat
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import List, Sequence, Set
+
+import pytest
+from pytest import fixture
+
+import tw_hooks.dispatcher
+from tests import sample_hooks
+from tests.sample_hooks import CorrectWor
+from tw_hooks.base_hooks import OnAddHook, OnExitHook
+from tw_hooks.daemon import HookDaemon
+from tw_hooks.registry import HookInfo
+from tw_hooks.scripts.install_hook_shims import _build_shim
+from tw_hooks.types import HookSpec, TaskLike
+from tw_hooks.utils import get_task_dir, use_json
+
+REPO_ROOT = Path(__file__).absolute().parent.parent
+
+
+@fixture
+def shim(tmp_path: Path) -> Path:
+    path = tmp_path / "on-add-correct-wor.py"
+    path.write_text(_build_shim(OnAddHook, [HookInfo.from_class(CorrectWor)], use_daemon=True))
+    return path
+
+
+@fixture
+def daemon(tmp_path: Path, clear_hook_instances):
+    modules = [__name__, sample_hooks.__name__]
+    server = HookDaemon(tmp_path / "tw-hooks.sock", additional_modules=modules)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _run_shim(
+    shim: Path, socket_path: Path, stdin: str, args: Sequence[str] = ()
+) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), env.get("PYTHONPATH", "")])
+    env["TW_HOOKS_DAEMON_SOCKET"] = str(socket_path)
+    return subprocess.run(
+        [sys.executable, str(shim), *args],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+
+
+def _instantiated_hooks() -> Set[HookSpec]:
+    return {spec for _, spec in tw_hooks.dispatcher._hook_instances}
+
+
+def _tags(task_line: str) -> List[str]:
+    tags: List[str] = use_json(task_line)["tags"]
+    return tags
+
+
+def test_shim_is_served_by_daemon(shim: Path, daemon: HookDaemon):
+    proc = _run_shim(shim, daemon.socket_path, '{"uuid": "c2", "tags": ["wor"]}\n')
+    assert proc.returncode == 0
+
+    lines = proc.stdout.splitlines()
+    assert lines[0] == "[CorrectWor] Correcting tag: wor -> work"
+    assert _tags(lines[1]) == ["work"]
+
+    # the hook was instantiated by the daemon, not by the shim
+    assert sample_hooks.correct_wor in _instantiated_hooks()
+
+
+def test_shim_falls_back_when_daemon_is_down(shim: Path, tmp_path: Path):
+    proc = _run_shim(shim, tmp_path / "missing.sock", '{"uuid": "c2", "tags": ["wor"]}\n')
+    assert proc.returncode == 0
+
+    lines = proc.stdout.splitlines()
+    assert lines[0] == "[CorrectWor] Correcting tag: wor -> work"
+    assert _tags(lines[1]) == ["work"]
+
+
+class ReportTaskDir(OnExitHook):
+    """Like WarnOnTaskCongestion, only reads the Taskwarrior directory when instantiated."""
+
+    def __init__(self):
+        self._task_dir = get_task_dir()
+
+    def _on_exit(self, added_modified_tasks: List[TaskLike]):
+        self.log(str(self._task_dir))
+
+
+def test_daemon_serves_each_task_dir(daemon: HookDaemon, tmp_path: Path):
+    shim = tmp_path / "on-exit-report-task-dir.py"
+    shim.write_text(
+        _build_shim(OnExitHook, [HookInfo.from_class(ReportTaskDir)], use_daemon=True)
+    )
+    first, second = tmp_path / "first", tmp_path / "second"
+    for task_dir in (first, second, first):
+        proc = _run_shim(shim, daemon.socket_path, "", args=["api:2", f"data:{task_dir}"])
+        assert proc.stdout == f"[ReportTaskDir] {task_dir}\n"
+
+    # by the daemon, once for each directory
+    instances = tw_hooks.dispatcher._hook_instances
+    assert {d for d, spec in instances if spec[1] == "ReportTaskDir"} == {first, second}
+
+
+def test_daemon_refuses_unknown_hooks(tmp_path: Path, shim: Path):
+    server = HookDaemon(tmp_path / "tw-hooks.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        proc = _run_shim(shim, server.socket_path, '{"uuid": "c2", "tags": ["wor"]}\n')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert proc.returncode == 1
+    assert proc.stdout.startswith("Refusing to run unknown hook(s) CorrectWor")
+    assert sample_hooks.correct_wor not in _instantiated_hooks()
+
+
+def test_socket_is_private(daemon: HookDaemon, tmp_path: Path):
+    assert stat.S_IMODE(daemon.socket_path.stat().st_mode) == 0o600
+
+    shared_dir = tmp_path / "shared"
+    shared_dir.mkdir(mode=0o777)
+    shared_dir.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        HookDaemon(shared_dir / "tw-hooks.sock")
+
+
+def test_shim_only_trusts_sockets_of_its_user(shim: Path, tmp_path: Path):
+    impostor = tmp_path / "impostor.sock"
+    impostor.write_text('{"stdout": "{}\\n", "retcode": 0}')
+    proc = _run_shim(shim, impostor, '{"uuid": "c2", "tags": ["wor"]}\n')
+    assert proc.returncode == 0
+    assert "not a socket of the current user" in proc.stderr
+    assert _tags(proc.stdout.splitlines()[1]) == ["work"]
+
+
+class QuickCorrectWor(CorrectWor):
+    timeout = 0.2
+
+
+def test_shim_gives_up_on_daemon_that_doesnt_reply(tmp_path: Path):
+    shim = tmp_path / "on-add-quick-correct-wor.py"
+    hooks = [HookInfo.from_class(QuickCorrectWor)]
+    shim.write_text(_build_shim(OnAddHook, hooks, use_daemon=True))
+
+    # accepts connections, in its backlog, but never reads or replies to them
+    wedged = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    wedged.bind(str(tmp_path / "wedged.sock"))
+    wedged.listen(1)
+    try:
+        proc = _run_shim(shim, tmp_path / "wedged.sock", '{"uuid": "c2", "tags": ["wor"]}\n')
+    finally:
+        wedged.close()
+
+    assert proc.returncode == 0
+    assert "tw-hooks-daemon didn't reply within 1.2s" in proc.stderr
+    # by the shim itself instead
+    assert _tags(proc.stdout.splitlines()[1]) == ["work"]
@@ -0,0 +1,33 @@
+from typing import Any, Dict, List
+
+from tw_hooks.hooks.detect_mutually_exclusive_tags import DetectMutuallyExclusiveTags
+from tw_hooks.utils import use_json
+
+
+def test_nop(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+):
+    hook = DetectMutuallyExclusiveTags(tag_sets=[["movie", "work"], ["wor", "freetime"]])
+    assert hook.on_modify(on_modify_changed_title) == 0
+    assert use_json(capsys.readouterr().out.strip()) == on_modify_changed_title_mod_dict
+
+
+def test_report_all_conflicts(on_modify_changed_title: List[str], capsys):
+    """All the violated sets should be reported, not just the first one."""
+    hook = DetectMutuallyExclusiveTags(
+        tag_sets=[["movie", "wor"], ["movie", "freetime"], ["wor"], ["movie", "wor", "job"]]
+    )
+    assert hook.on_modify(on_modify_changed_title) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert lines[0] in (
+        "[DetectMutuallyExclusiveTags] Can't use the following tags together -> {'movie', 'wor'}",
+        "[DetectMutuallyExclusiveTags] Can't use the following tags together -> {'wor', 'movie'}",
+    )
+    assert (
+        lines[1]
+        == "[DetectMutuallyExclusiveTags] Can't use the following tags together -> {'wor'}"
+    )
+    assert lines[2].startswith("{")
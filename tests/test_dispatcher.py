@@ -0,0 +1,306 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+from pytest import fixture
+
+from tests.sample_hooks import CorrectWor, correct_wor, detect_work_movie
+from tw_hooks.base_hooks import BaseHook, OnExitHook, OnModifyHook
+from tw_hooks.dispatcher import dispatch
+from tw_hooks.json_codec import dumps
+from tw_hooks.lazy_task import LazyTask
+from tw_hooks.types import TaskLike, TaskT
+from tw_hooks.utils import use_json
+
+pytestmark = pytest.mark.usefixtures("clear_hook_instances")
+
+# The stuck hooks below are stuck until the end of the test, unless the dispatcher waits for
+# them, and then released by wait_for_abandoned_hooks
+_stuck_hooks_released = threading.Event()
+_stuck_hooks_finished: List[str] = []
+
+
+def _get_stuck(hook: BaseHook):
+    _stuck_hooks_released.wait(timeout=10)
+    _stuck_hooks_finished.append(hook.name())
+
+
+@fixture(autouse=True)
+def wait_for_abandoned_hooks():
+    """Don't let hooks that overran their timeout print into the output of the next tests."""
+    _stuck_hooks_released.clear()
+    _stuck_hooks_finished.clear()
+    yield
+    _stuck_hooks_released.set()
+    for thread in threading.enumerate():
+        if thread.name.startswith("tw-hooks-"):
+            thread.join()
+
+
+@fixture
+def on_add_work_movie() -> List[str]:
+    return ['{"description": "kalimera", "uuid": "c2", "tags": ["work", "movie", "wor"]}\n']
+
+
+def test_dispatch_chains_hooks(
+    on_modify_changed_title: List[str],
+    on_modify_changed_title_mod_dict: Dict[str, Any],
+    capsys,
+):
+    """The task emitted by a hook should be the input of the next one."""
+    ret = dispatch(
+        "on-modify",
+        [correct_wor, detect_work_movie],
+        stdin_lines=on_modify_changed_title,
+    )
+    assert ret == 1
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith("[CorrectWor] Correcting")
+    assert lines[1].startswith("[DetectWorkMovie] Can't use")
+    on_modify_changed_title_mod_dict["tags"] = ["movie", "work"]
+    assert use_json(lines[2]) == on_modify_changed_title_mod_dict
+
+
+def test_dispatch_stops_at_first_failure(on_add_work_movie: List[str], capsys):
+    """Processing should stop at the first hook that returns a non-zero exit code."""
+    ret = dispatch("on-add", [detect_work_movie, correct_wor], stdin_lines=on_add_work_movie)
+    assert ret == 1
+
+    out = capsys.readouterr().out
+    assert "[DetectWorkMovie]" in out
+    assert "[CorrectWor]" not in out
+
+
+def test_dispatch_missing_hook_module(on_modify_changed_title: List[str], capsys):
+    """A hook that can't be imported should not block the rest of the chain."""
+    ret = dispatch(
+        "on-modify",
+        [("some_missing_module", "SomeHook")],
+        stdin_lines=on_modify_changed_title,
+    )
+    assert ret == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Can't import SomeHook hook"
+    assert lines[1] == on_modify_changed_title[1].strip()
+
+
+class RecordOriginal(OnModifyHook):
+    """Record the original task passed to it, without modifying anything."""
+
+    originals: List[Optional[TaskLike]] = []
+
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
+        self.originals.append(original_task)
+        print(dumps(modified_task))
+
+
+class IgnoreOriginal(RecordOriginal):
+    requires_original_task = False
+
+
+def test_dispatch_original_task_is_lazy(on_modify_changed_title: List[str], capsys):
+    """The original task should be decoded once and only if a hook accesses it."""
+    RecordOriginal.originals = []
+    ret = dispatch(
+        "on-modify",
+        [(__name__, "IgnoreOriginal"), (__name__, "RecordOriginal")],
+        stdin_lines=on_modify_changed_title,
+    )
+    assert ret == 0
+    capsys.readouterr()
+
+    ignored, recorded = RecordOriginal.originals
+    assert ignored is None
+    assert isinstance(recorded, LazyTask) and not recorded.decoded
+    assert recorded["description"] == "kalimera kalimera kalimera"
+
+
+def test_dispatch_skips_hooks_of_unchanged_fields(
+    on_modify_changed_title: List[str], on_modify_changed_title_orig_dict: TaskT, capsys
+):
+    """Hooks should run only if the fields they watch changed, or a previous hook changed them."""
+    # only the title changes
+    on_modify_changed_title_orig_dict["tags"] = ["movie", "wor"]
+    stdin_lines = [f"{on_modify_changed_title_orig_dict}\n", on_modify_changed_title[1]]
+    ret = dispatch("on-modify", [correct_wor, detect_work_movie], stdin_lines=stdin_lines)
+    assert ret == 0
+    assert capsys.readouterr().out.splitlines() == [stdin_lines[1].strip()]
+
+    # CorrectWor changes the tags, DetectWorkMovie has to check them
+    on_modify_changed_title_orig_dict["tags"] = ["movie"]
+    stdin_lines[0] = f"{on_modify_changed_title_orig_dict}\n"
+    ret = dispatch("on-modify", [correct_wor, detect_work_movie], stdin_lines=stdin_lines)
+    assert ret == 1
+
+
+class SlowReport(OnExitHook):
+    delay = 0.1
+    retcode = 0
+
+    def _on_exit(self, added_modified_tasks: List[TaskLike]):
+        time.sleep(self.delay)
+        self.log(f"{len(added_modified_tasks)} task(s)")
+        return self.retcode
+
+
+class FastReport(SlowReport):
+    delay = 0.0
+    retcode = 1
+
+
+class StuckReport(SlowReport):
+    def _on_exit(self, added_modified_tasks: List[TaskLike]):
+        _get_stuck(self)
+        return super()._on_exit(added_modified_tasks)
+
+
+class Rendezvous(SlowReport):
+    """Only gets past the barrier if another instance runs at the same time."""
+
+    barrier = threading.Barrier(2)
+
+    def _on_exit(self, added_modified_tasks: List[TaskLike]):
+        self.barrier.wait(timeout=10)
+        return super()._on_exit(added_modified_tasks)
+
+
+slow_report = (__name__, "SlowReport")
+fast_report = (__name__, "FastReport")
+stuck_report = (__name__, "StuckReport")
+rendezvous = (__name__, "Rendezvous")
+
+
+def test_dispatch_on_exit_runs_hooks_concurrently(on_add_work_movie: List[str], capsys):
+    ret = dispatch("on-exit", [rendezvous, rendezvous, fast_report], on_add_work_movie)
+    assert ret == 1
+
+    # in the order of the hooks, not in the order they finished
+    assert capsys.readouterr().out.splitlines() == [
+        "[Rendezvous] 1 task(s)",
+        "[Rendezvous] 1 task(s)",
+        "[FastReport] 1 task(s)",
+    ]
+    assert not hasattr(sys.stdout, "register")
+
+
+def test_dispatch_on_exit_budget(on_add_work_movie: List[str], monkeypatch, capsys):
+    monkeypatch.setenv("TW_HOOKS_EXIT_BUDGET", "1")
+    ret = dispatch("on-exit", [slow_report, stuck_report], on_add_work_movie)
+    assert _stuck_hooks_finished == []
+    assert ret == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "[SlowReport] 1 task(s)",
+        "[StuckReport] Didn't finish within 1s, skipping it",
+    ]
+
+
+class StuckCorrectWor(CorrectWor):
+    timeout = 0.2
+
+    def _on_add(self, added_task: TaskLike):
+        _get_stuck(self)
+        # too late, the task has already been passed on
+        return super()._on_add(added_task)
+
+
+class SlowTitle(OnModifyHook):
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
+        _get_stuck(self)
+        modified_task["description"] = "kalinixta"
+        print(dumps(modified_task))
+
+
+stuck_correct_wor = (__name__, "StuckCorrectWor")
+slow_title = (__name__, "SlowTitle")
+
+
+def test_dispatch_timeout_passes_task_through(on_add_work_movie: List[str], capsys):
+    ret = dispatch("on-add", [stuck_correct_wor, correct_wor], stdin_lines=on_add_work_movie)
+    # without waiting for the stuck hook
+    assert _stuck_hooks_finished == []
+    assert ret == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "[StuckCorrectWor] Didn't finish within 0.2s, passing the task through"
+    assert lines[1].startswith("[CorrectWor] Correcting")
+    # corrected by the next hook only
+    assert use_json(lines[-1])["tags"] == ["work", "movie"]
+
+
+def test_dispatch_timeouts_from_config(
+    on_modify_changed_title: List[str], on_add_work_movie: List[str], monkeypatch, capsys
+):
+    monkeypatch.setenv("TW_HOOKS_TIMEOUTS", '{"SlowTitle": 0.2, "StuckReport": 0.3}')
+    assert dispatch("on-modify", [slow_title], stdin_lines=on_modify_changed_title) == 0
+    assert dispatch("on-exit", [slow_report, stuck_report], on_add_work_movie) == 0
+    assert _stuck_hooks_finished == []
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "[SlowTitle] Didn't finish within 0.2s, passing the task through"
+    assert lines[1] == on_modify_changed_title[1].strip()
+    assert lines[2:] == [
+        "[SlowReport] 1 task(s)",
+        "[StuckReport] Didn't finish within 0.3s, skipping it",
+    ]
+
+
+class CountUpTo(OnExitHook):
+    threshold = 10
+
+    def _on_exit_iter(self, added_modified_tasks: Iterator[TaskLike]):
+        count = 0
+        for _ in added_modified_tasks:
+            count += 1
+            if count == self.threshold:
+                break
+        self.log(f"Read {count} task(s)")
+        return 0
+
+
+count_up_to = (__name__, "CountUpTo")
+
+
+def test_dispatch_on_exit_streaming(on_add_work_movie: List[str], capsys):
+    ret = dispatch("on-exit", [count_up_to, slow_report], on_add_work_movie * 20)
+    assert ret == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "[CountUpTo] Read 10 task(s)",
+        "[SlowReport] 20 task(s)",
+    ]
+
+
+def test_on_exit_hook_implements_either_method():
+    with pytest.raises(TypeError, match="either _on_exit or _on_exit_iter"):
+
+        class Bad(OnExitHook):  # pylint: disable=W0612
+            pass
+
+
+def test_dispatch_on_exit_streams_stdin(on_add_work_movie: List[str]):
+    """A single streaming hook reads the standard input incrementally and stops early."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(Path(__file__).absolute().parent.parent), env.get("PYTHONPATH", "")]
+    )
+    code = f"from tw_hooks.dispatcher import dispatch; dispatch('on-exit', [{count_up_to}])"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+    assert proc.stdin is not None and proc.stdout is not None
+    # way more than the pipe buffer, the rest is discarded instead of breaking the pipe
+    proc.stdin.write(on_add_work_movie[0] * 20_000)
+    proc.stdin.close()
+    assert proc.stdout.read().splitlines() == ["[CountUpTo] Read 10 task(s)"]
+    assert proc.wait() == 0
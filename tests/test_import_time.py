@@ -0,0 +1,76 @@
+"""Make sure that the hook shims start fast, i.e., that they don't import more than needed."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from tw_hooks.base_hooks import OnAddHook, OnExitHook, OnModifyHook
+from tw_hooks.registry import builtin_modules, discover
+from tw_hooks.scripts.install_hook_shims import _build_shim
+
+REPO_ROOT = Path(__file__).absolute().parent.parent
+
+# Upper limit for the time spent importing tw_hooks and the hooks from a shim. Without the
+# heavy dependencies this takes a few tens of milliseconds, leave some room for slow machines.
+# Only checked with `pytest -m benchmark`, it depends on the machine
+IMPORT_BUDGET_US = int(os.environ.get("TW_HOOKS_IMPORT_BUDGET_US", 100_000))
+
+# These are only required for installing the shims, never when running them
+FORBIDDEN_IMPORTS = ("bubop", "loguru", "tqdm", "yaml")
+
+TASK = '{"description": "kalimera", "uuid": "c236dff8", "tags": ["movie"]}\n'
+STDIN = {OnAddHook: TASK, OnModifyHook: TASK * 2, OnExitHook: TASK}
+
+
+def _import_times(shim: Path, stdin: str, home: Path) -> Dict[str, int]:
+    """Run the shim and return the cumulative import time of each top-level import in us."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), env.get("PYTHONPATH", "")])
+    env["HOME"] = str(home)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(shim)],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+
+    times: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip() == "cumulative":
+            continue
+        times[name.rstrip()] = int(cumulative)
+
+    return times
+
+
+def _dispatcher_shim_import_times(Base, tmp_path: Path) -> Dict[str, int]:
+    hooks = [hook for hook in discover(builtin_modules()) if Base.shim_prefix() in hook.events]
+    shim = tmp_path / f"{Base.shim_prefix()}-tw-hooks-dispatcher.py"
+    shim.write_text(_build_shim(Base, hooks))
+    return _import_times(shim, STDIN[Base], home=tmp_path)
+
+
+@pytest.mark.parametrize("Base", [OnAddHook, OnModifyHook, OnExitHook])
+def test_shim_imports(Base, tmp_path: Path):
+    times = _dispatcher_shim_import_times(Base, tmp_path)
+    assert "tw_hooks.dispatcher" in {name.strip() for name in times}
+
+    for name in times:
+        assert not name.strip().startswith(FORBIDDEN_IMPORTS)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("Base", [OnAddHook, OnModifyHook, OnExitHook])
+def test_shim_import_time(Base, tmp_path: Path):
+    times = _dispatcher_shim_import_times(Base, tmp_path)
+    # indented entries are included in the cumulative time of the top-level ones
+    tw_hooks_time = sum(time for name, time in times.items() if name.startswith(" tw_hooks"))
+    assert tw_hooks_time < IMPORT_BUDGET_US
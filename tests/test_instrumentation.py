@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+from typing import List
+
+from tw_hooks.dispatcher import dispatch
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.instrumentation import envvar
+from tw_hooks.scripts.tw_hooks_stats import aggregate
+
+
+def _records(path: Path) -> List[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_disabled_by_default(on_modify_changed_title: List[str], tmp_path: Path, monkeypatch):
+    monkeypatch.delenv(envvar, raising=False)
+    monkeypatch.setattr("sys.argv", ["hook", f"data:{tmp_path}"])
+    CorrectTagNames(tag_mappings={}).on_modify(on_modify_changed_title)
+    assert not (tmp_path / "tw_hooks").exists()
+
+
+def test_records_entrypoint(
+    on_modify_changed_title: List[str], tmp_path: Path, monkeypatch, capsys
+):
+    monkeypatch.setenv(envvar, "1")
+    monkeypatch.setattr("sys.argv", ["hook", f"data:{tmp_path}"])
+    CorrectTagNames(tag_mappings={"wor": "work"}).on_modify(on_modify_changed_title)
+    assert capsys.readouterr().out.splitlines()[-1].startswith("{")
+
+    (record,) = _records(tmp_path / "tw_hooks" / "stats.jsonl")
+    assert record["hook"] == "CorrectTagNames"
+    assert record["event"] == "on-modify"
+    assert record["payload_bytes"] == sum(len(line) for line in on_modify_changed_title)
+    assert 0 <= record["parse_ms"] <= record["wall_ms"]
+    assert record["peak_kib"] > 0
+
+
+def test_records_dispatcher(
+    on_modify_changed_title: List[str], tmp_path: Path, monkeypatch, capsys
+):
+    stats_file = tmp_path / "stats.jsonl"
+    monkeypatch.setenv(envvar, str(stats_file))
+    for _ in range(3):
+        dispatch(
+            "on-modify",
+            [("tests.sample_hooks", "CorrectWor")],
+            stdin_lines=on_modify_changed_title,
+        )
+    capsys.readouterr()
+
+    stats = aggregate(_records(stats_file))
+    assert set(stats) == {("CorrectWor", "on-modify"), ("dispatcher", "on-modify")}
+    for row in stats.values():
+        assert row["count"] == 3
+        assert row["failures"] == 0
+        assert row["wall_ms_p50"] <= row["wall_ms_p99"]
+
+
+def test_concurrent_on_exit_hooks(
+    on_modify_changed_title: List[str], tmp_path: Path, monkeypatch, capsys
+):
+    stats_file = tmp_path / "stats.jsonl"
+    monkeypatch.setenv(envvar, str(stats_file))
+    fast_report = ("tests.test_dispatcher", "FastReport")
+    modified = on_modify_changed_title[1:]
+    dispatch("on-exit", [fast_report], modified)
+    dispatch("on-exit", [fast_report, fast_report], modified)
+    capsys.readouterr()
+
+    alone, dispatcher, *in_parallel, _ = _records(stats_file)
+    assert alone["hook"] == "FastReport" and alone["peak_kib"] > 0
+    assert dispatcher["hook"] == "dispatcher" and dispatcher["peak_kib"] > 0
+    # tracemalloc only keeps the peak of the whole process, it's not measured for each one
+    assert [r["peak_kib"] for r in in_parallel] == [None, None]
+
+    stats = aggregate(_records(stats_file))
+    assert stats[("FastReport", "on-exit")]["peak_kib_p95"] > 0
@@ -0,0 +1,47 @@
+from typing import Any, List
+
+import pytest
+
+from tw_hooks.json_codec import backends, dumps, load_backend, loads_lenient
+from tw_hooks.lazy_task import LazyTask
+from tw_hooks.utils import stdin_lines_to_json
+
+
+def _installed_backends() -> List[str]:
+    out = []
+    for name in backends:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        out.append(name)
+    return out
+
+
+@pytest.mark.parametrize("name", _installed_backends())
+@pytest.mark.parametrize("stdlines", ["stdlines0", "stdlines1"], indirect=True)
+def test_backends_roundtrip(name: str, stdlines: List[Any]):
+    """All backends should decode the tasks the same way and emit them in a single line."""
+    _, loads, dumps = load_backend(name)
+    for line in stdlines:
+        task = loads(line)
+        assert task == stdin_lines_to_json([line])[0]
+        assert "\n" not in dumps(task)
+        assert loads(dumps(task)) == task
+
+
+def test_python_literal_keeps_apostrophes():
+    task = {"description": "Read Tom's book", "tags": ["book"]}
+    assert loads_lenient(str(task)) == task
+
+
+def test_invalid_input_raises_json_error():
+    with pytest.raises(ValueError):
+        loads_lenient("{kalimera")
+    with pytest.raises(ValueError):
+        loads_lenient("kalimera")
+
+
+def test_dumps_mappings():
+    task = LazyTask('{"description": "kalimera"}')
+    assert loads_lenient(dumps(task)) == {"description": "kalimera"}
@@ -0,0 +1,95 @@
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+import tw_hooks.memo
+from tw_hooks.hooks.auto_tag_based_on_tags import AutoTagBasedOnTags
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.hooks.detect_mutually_exclusive_tags import DetectMutuallyExclusiveTags
+from tw_hooks.memo import TagMemo, get_memo
+
+
+def _as_dict(value: Any) -> Dict[str, str]:
+    return dict(value.items())
+
+
+def test_order_independent(tmp_path: Path):
+    memo = TagMemo(tmp_path / "memo", "namespace", max_entries=10, decode=_as_dict)
+    assert memo.get(["work", "movie"]) is None
+    memo.put(["work", "movie"], {"wor": "work"})
+    assert memo.get(["movie", "work", "movie"]) == {"wor": "work"}
+    assert memo.get(["movie"]) is None
+    other = TagMemo(tmp_path / "memo", "other", max_entries=10, decode=_as_dict)
+    assert other.get(["work", "movie"]) is None
+
+
+def test_malformed_entries_are_misses(tmp_path: Path):
+    memo = TagMemo(tmp_path / "memo", "namespace", max_entries=10, decode=_as_dict)
+    memo.put(["work"], ["not", "a", "dict"])
+    assert memo.get(["work"]) is None
+    memo._entry_path(["movie"]).write_text("{not json")
+    assert memo.get(["movie"]) is None
+
+
+def test_evicts_least_recently_used(tmp_path: Path):
+    # few enough entries for a single shard
+    memo = TagMemo(tmp_path / "memo", "namespace", max_entries=3, decode=int)
+    last_used = time.time() - 1000
+    for i in range(3):
+        memo.put([f"tag{i}"], i)
+        os.utime(memo._entry_path([f"tag{i}"]), (last_used + i, last_used + i))
+
+    assert memo.get(["tag0"]) == 0
+    memo.put(["tag3"], 3)
+    assert memo.get(["tag1"]) is None
+    assert [memo.get([f"tag{i}"]) for i in (0, 2, 3)] == [0, 2, 3]
+
+
+def test_config(monkeypatch):
+    assert get_memo(CorrectTagNames, {}, _as_dict) is None
+    monkeypatch.setenv("TW_HOOKS_TAG_MEMO", "100")
+    assert get_memo(CorrectTagNames, {}, _as_dict) is not None
+    monkeypatch.setenv("TW_HOOKS_CACHE_DIR", "")
+    assert get_memo(CorrectTagNames, {}, _as_dict) is None
+    monkeypatch.setenv("TW_HOOKS_TAG_MEMO", "lots")
+    with pytest.raises(RuntimeError):
+        get_memo(CorrectTagNames, {}, _as_dict)
+
+
+def _run_twice(make_hook, tags, capsys):
+    outputs = []
+    for _ in range(2):
+        task = {"description": "kalimera", "tags": list(tags)}
+        ret = make_hook()._on_add(task)
+        outputs.append((ret, capsys.readouterr().out))
+    return outputs
+
+
+def test_hooks_return_the_same_when_memoized(monkeypatch, capsys):
+    monkeypatch.setenv("TW_HOOKS_TAG_MEMO", "100")
+    monkeypatch.setattr(tw_hooks.memo.TagMemo, "put", _count_puts(tw_hooks.memo.TagMemo.put))
+
+    cases = [
+        (lambda: CorrectTagNames({"wor": "work", "mov*": "movie"}), ["wor", "movies", "work"]),
+        (lambda: AutoTagBasedOnTags({"git.*": "programming", "prog.*": "fun"}), ["github"]),
+        (
+            lambda: DetectMutuallyExclusiveTags([["work", "movie"], ["movie", "fun"]]),
+            ["movie", "work", "fun"],
+        ),
+    ]
+    for make_hook, tags in cases:
+        _count_puts.calls = 0
+        computed, memoized = _run_twice(make_hook, tags, capsys)
+        assert _count_puts.calls == 1
+        assert computed == memoized
+
+
+def _count_puts(put):
+    def wrapper(*args, **kargs):
+        _count_puts.calls += 1
+        return put(*args, **kargs)
+
+    return wrapper
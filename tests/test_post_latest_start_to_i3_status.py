@@ -0,0 +1,62 @@
+import time
+from pathlib import Path
+from typing import List
+
+from pytest import fixture
+
+from tw_hooks.hooks.post_latest_start_to_i3_status import PostLatestSTartToI3Status
+
+
+def _fake_busctl(tmp_path: Path, body: str) -> Path:
+    """Executable that stands in for busctl, recording its arguments to args.txt."""
+    path = tmp_path / "busctl"
+    path.write_text(f'#!/bin/sh\n{body}\necho "$@" > "{tmp_path}/args.txt"\n')
+    path.chmod(0o755)
+    return path
+
+
+@fixture
+def started_task(on_modify_changed_title: List[str]) -> List[str]:
+    return [
+        line.replace("'status'", "'start': '20220602T212709Z', 'status'")
+        for line in on_modify_changed_title
+    ]
+
+
+def test_post_is_non_blocking(tmp_path: Path, started_task: List[str], capsys):
+    """The hook should return without waiting for busctl."""
+    busctl = _fake_busctl(tmp_path, "sleep 2")
+    hook = PostLatestSTartToI3Status(busctl=str(busctl))
+
+    start = time.monotonic()
+    assert hook.on_modify(started_task) == 0
+    assert time.monotonic() - start < 1
+    assert capsys.readouterr().out.startswith("{")
+
+    args_file = tmp_path / "args.txt"
+    for _ in range(100):
+        if args_file.exists():
+            break
+        time.sleep(0.05)
+    args = args_file.read_text()
+    assert "--expect-reply=no" in args
+    assert "c236dff8 | kalimera kalimera kalimera kalimera" in args
+
+
+def test_post_blocking_reports_errors(tmp_path: Path, started_task: List[str], capsys):
+    busctl = _fake_busctl(tmp_path, "echo 'no such bus' >&2; exit 1")
+    hook = PostLatestSTartToI3Status(busctl=str(busctl), blocking=True)
+    assert hook.on_modify(started_task) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "[PostLatestSTartToI3Status] Failed to send started task."
+    assert "no such bus" in "\n".join(lines)
+
+
+def test_post_blocking_times_out(tmp_path: Path, started_task: List[str], capsys):
+    busctl = _fake_busctl(tmp_path, "sleep 5")
+    hook = PostLatestSTartToI3Status(busctl=str(busctl), blocking=True, timeout=0.1)
+
+    start = time.monotonic()
+    assert hook.on_modify(started_task) == 0
+    assert time.monotonic() - start < 3
+    assert "timed out" in capsys.readouterr().out
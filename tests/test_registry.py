@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+import tw_hooks.registry
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+from tw_hooks.hooks.maintain_task_index import MaintainTaskIndex
+from tw_hooks.registry import HookInfo, available_hooks, discover
+
+HOOK_MODULE = '''
+from tw_hooks.base_hooks import OnExitHook
+from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+
+
+class CorrectWor(CorrectTagNames):
+    """Correct wor to work."""
+
+
+class _Helper:
+    pass
+
+
+class Report(OnExitHook):
+    timeout = 2
+
+    def _on_exit(self, added_modified_tasks):
+        pass
+'''
+
+
+def test_builtin_hooks_match_classes():
+    hooks = {hook.name: hook for hook in available_hooks()}
+    assert hooks["CorrectTagNames"] == HookInfo.from_class(CorrectTagNames)
+    assert hooks["WarnOnTaskCongestion"].events == ("on-exit",)
+
+
+def test_opt_in_hooks():
+    hooks = {hook.name: hook for hook in available_hooks()}
+    assert hooks["CorrectTagNames"].installed_by_default
+    assert not hooks["MaintainTaskIndex"].installed_by_default
+    assert hooks["MaintainTaskIndex"] == HookInfo.from_class(MaintainTaskIndex)
+
+
+def test_discover_without_importing(tmp_path: Path, monkeypatch):
+    (tmp_path / "my_hooks.py").write_text(HOOK_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    hooks = available_hooks(["my_hooks", "not_a_module"])
+    mine = [hook for hook in hooks if hook.module == "my_hooks"]
+    assert [(h.name, h.events, h.description) for h in mine] == [
+        ("CorrectWor", ("on-add", "on-modify"), "Correct wor to work."),
+        ("Report", ("on-exit",), "No description"),
+    ]
+    assert [h.timeout for h in mine] == [None, 2.0]
+    assert "my_hooks" not in sys.modules
+
+    # parsed once, then read from the manifest until the module changes
+    manifest_path = tw_hooks.registry._manifest_path()
+    assert manifest_path is not None and manifest_path.is_file()
+    monkeypatch.setattr(tw_hooks.registry, "_manifests", {})
+    monkeypatch.setattr(tw_hooks.registry, "_parse_module", None)
+    # CorrectTagNames, and so CorrectWor, is only known along with the builtin modules
+    assert discover(["my_hooks"]) == mine[1:]
+
+
+def test_inherited_timeouts(tmp_path: Path, monkeypatch):
+    (tmp_path / "timed_hooks.py").write_text(
+        HOOK_MODULE
+        + """
+
+class SlowReport(Report):
+    pass
+
+
+class UnboundedReport(SlowReport):
+    timeout = None
+"""
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    timeouts = {h.name: h.timeout for h in discover(["timed_hooks"])}
+    assert timeouts == {"Report": 2.0, "SlowReport": 2.0, "UnboundedReport": None}
@@ -0,0 +1,62 @@
+import calendar
+import random
+import time
+from typing import Any, List, Optional
+
+import pytest
+
+from tw_hooks.base_hooks import OnModifyHook
+from tw_hooks.dispatcher import dispatch
+from tw_hooks.task import Task, parse_iso_basic
+from tw_hooks.types import TaskLike, TaskT
+
+
+def test_parse_iso_basic_matches_strptime():
+    rng = random.Random(0)
+    for _ in range(10_000):
+        ts = rng.randint(0, 2**32)
+        s = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(ts))
+        assert parse_iso_basic(s) == calendar.timegm(time.strptime(s, "%Y%m%dT%H%M%SZ")) == ts
+
+
+@pytest.mark.parametrize("s", ["20221328T155959Z", "20220528T255959Z", "2022052xT155959Z", ""])
+def test_parse_iso_basic_invalid(s: str):
+    with pytest.raises(ValueError):
+        parse_iso_basic(s)
+
+
+def test_task_view_caches_and_invalidates():
+    data: TaskT = {"uuid": "c2", "due": "20220528T155959Z", "tags": ["work"]}
+    task = Task(data)
+    assert task.due == 1653753599
+    assert task.tags == {"work"}
+
+    task["due"] = "20220529T155959Z"
+    task.tags = {"movie"}
+    assert task.due == 1653753599 + 86400
+    assert data["tags"] == ["movie"]
+
+    task.tags = set()
+    assert "tags" not in data
+    del task["due"]
+    assert task.due is None
+    assert task.to_json().replace(" ", "") == '{"uuid":"c2"}'
+
+
+class RecordView(OnModifyHook):
+    task_view = True
+    seen: List[Any] = []
+
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
+        self.seen.extend([original_task, modified_task])
+        print(modified_task.to_json())  # type: ignore
+        return 0
+
+
+def test_hooks_get_task_views(on_modify_changed_title: List[str], capsys):
+    RecordView.seen.clear()
+    assert dispatch("on-modify", [(__name__, "RecordView")], on_modify_changed_title) == 0
+    original, modified = RecordView.seen
+    assert isinstance(original, Task) and isinstance(modified, Task)
+    assert original.entry == modified.entry is not None
+    assert capsys.readouterr().out.strip()
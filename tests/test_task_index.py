@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from pytest import fixture
+
+from tw_hooks.hooks.maintain_task_index import MaintainTaskIndex
+from tw_hooks.task_index import TaskIndex
+
+DUE = 1653753599
+
+
+def _pending_line(uuid: str, status: str = "pending", **attrs: str) -> str:
+    attrs = {"description": f"task {uuid}", "status": status, "uuid": uuid, **attrs}
+    return "[" + " ".join(f'{k}:"{v}"' for k, v in sorted(attrs.items())) + "]\n"
+
+
+@fixture
+def task_dir(tmp_path: Path) -> Path:
+    lines = [
+        _pending_line("00000000", due=str(DUE), tags="home,errand", project="house"),
+        _pending_line("00000001", due=str(DUE + 3600), project="house.garden"),
+        _pending_line("00000002", scheduled=str(DUE), tags="errand", project="houseboat"),
+        _pending_line("00000003", status="completed", due=str(DUE), tags="errand"),
+    ]
+    (tmp_path / "pending.data").write_text("".join(lines))
+    return tmp_path
+
+
+@fixture
+def index(task_dir: Path) -> Iterator[TaskIndex]:
+    index = TaskIndex.for_task_dir(task_dir)
+    yield index
+    index.close()
+
+
+def _forbid_rebuild(index: TaskIndex, monkeypatch):
+    monkeypatch.setattr(index, "rebuild", pytest.fail)
+
+
+def test_queries(index: TaskIndex):
+    index.refresh()
+    assert index.count() == 3
+    assert index.count_between(DUE, DUE + 1) == 1
+    assert index.uuids_between(DUE, DUE + 7200) == ["00000000", "00000001"]
+    assert index.count_between(DUE, DUE + 1, field="scheduled") == 1
+    assert sorted(index.uuids_with_tag("errand")) == ["00000000", "00000002"]
+    assert index.uuids_with_tag("kalimera") == []
+    assert sorted(index.uuids_in_project("house")) == ["00000000", "00000001"]
+
+    with pytest.raises(RuntimeError):
+        index.count_between(0, 1, field="description")
+
+
+def test_journal_is_wal(index: TaskIndex):
+    assert index.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_refresh_applies_tasks(index: TaskIndex, task_dir: Path, monkeypatch):
+    index.refresh()
+    _forbid_rebuild(index, monkeypatch)
+
+    # the command that's exiting modified pending.data in place
+    with (task_dir / "pending.data").open("a") as f:
+        f.write(_pending_line("00000004", tags="errand"))
+    index.refresh(
+        [
+            {"uuid": "00000004", "status": "pending", "tags": ["errand"]},
+            {"uuid": "00000000", "status": "pending", "due": "20220528T165959Z"},
+            {"uuid": "00000002", "status": "completed", "tags": ["errand"]},
+        ]
+    )
+    assert sorted(index.uuids_with_tag("errand")) == ["00000004"]
+    assert index.uuids_with_tag("home") == []
+    assert index.uuids_between(DUE, DUE + 7200) == ["00000000", "00000001"]
+    assert index.count() == 3
+
+    # persisted, a new process wouldn't have to rebuild it either
+    index.close()
+    new_index = TaskIndex.for_task_dir(task_dir)
+    _forbid_rebuild(new_index, monkeypatch)
+    new_index.refresh()
+    assert new_index.count() == 3
+    new_index.close()
+
+
+def test_rebuild_if_changed_otherwise(index: TaskIndex, task_dir: Path):
+    index.refresh()
+
+    pending_data = task_dir / "pending.data"
+    pending_data.write_text(_pending_line("00000005", tags="synced"))
+    os.utime(pending_data, ns=(time.time_ns(), time.time_ns() + 1))
+    index.refresh()
+    assert index.uuids_with_tag("synced") == ["00000005"]
+    assert index.count() == 1
+
+
+def test_escaped_values(index: TaskIndex, task_dir: Path):
+    (task_dir / "pending.data").write_text(
+        _pending_line("00000006", project=r"say \"hi\" &open;now&close;")
+    )
+    index.refresh()
+    assert index.uuids_in_project('say "hi" [now]') == ["00000006"]
+
+
+def test_hook_uses_data_dir_of_taskwarrior(task_dir: Path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["on-exit", "api:2", f"data:{task_dir}"])
+    MaintainTaskIndex()._on_exit([])
+    index = TaskIndex.for_task_dir(task_dir)
+    assert index.count() == 3
+    index.close()
+
+
+def test_hook(task_dir: Path, capsys):
+    MaintainTaskIndex(task_dir=task_dir)._on_exit([])
+    assert capsys.readouterr().out == ""
+    index = TaskIndex.for_task_dir(task_dir)
+    assert index.count() == 3
+    index.close()
+
+    MaintainTaskIndex(task_dir=task_dir / "kalimera")._on_exit([])
+    assert capsys.readouterr().out.startswith("[MaintainTaskIndex] Can't find pending.data")
@@ -0,0 +1,186 @@
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from pytest import fixture
+
+from tw_hooks.histogram import _counts_numpy, _counts_python, day_boundaries
+from tw_hooks.hooks.warn_on_task_congestion import WarnOnTaskCongestion
+from tw_hooks.pending_data import PendingDataIndex
+
+TODAY_NOON = int(datetime.today().replace(hour=12, minute=0, second=0).timestamp())
+TOMORROW_NOON = int((datetime.fromtimestamp(TODAY_NOON) + timedelta(days=1)).timestamp())
+TODAY_NOON_ISO = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(TODAY_NOON))
+
+
+def _pending_line(uuid: str, due: int, status: str = "pending") -> str:
+    return f'[description:"task {uuid}" due:"{due}" status:"{status}" uuid:"{uuid}"]\n'
+
+
+@fixture
+def task_dir(tmp_path: Path) -> Path:
+    lines = [_pending_line(f"0000000{i}", TODAY_NOON) for i in range(3)]
+    lines.append(_pending_line("00000003", TODAY_NOON, status="completed"))
+    (tmp_path / "pending.data").write_text("".join(lines))
+    return tmp_path
+
+
+@fixture
+def index(task_dir: Path) -> PendingDataIndex:
+    return PendingDataIndex(
+        pending_data=task_dir / "pending.data",
+        index_path=task_dir / "index",
+        fields=["due"],
+    )
+
+
+def _new_index(index: PendingDataIndex) -> PendingDataIndex:
+    """Load the index from disk, as a new process would."""
+    return PendingDataIndex(
+        pending_data=index._pending_data, index_path=index._index_path, fields=["due"]
+    )
+
+
+def _forbid_rescan(index: PendingDataIndex, monkeypatch):
+    monkeypatch.setattr(index, "_rescan", pytest.fail)
+
+
+def test_warn(task_dir: Path, capsys):
+    WarnOnTaskCongestion(task_dir=task_dir, warn_threshold=3)._on_exit([])
+    assert capsys.readouterr().out == ""
+
+    WarnOnTaskCongestion(task_dir=task_dir, warn_threshold=2)._on_exit([])
+    assert capsys.readouterr().out.startswith(
+        "[WarnOnTaskCongestion] Too many due:today tasks"
+    )
+
+
+def test_uses_data_dir_of_taskwarrior(task_dir: Path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["on-exit", "api:2", f"data:{task_dir}"])
+    WarnOnTaskCongestion(warn_threshold=2)._on_exit([])
+    assert capsys.readouterr().out.startswith(
+        "[WarnOnTaskCongestion] Too many due:today tasks"
+    )
+
+
+def test_warn_per_field_and_day(tmp_path: Path, capsys):
+    lines = [
+        _pending_line("00000000", TOMORROW_NOON),
+        _pending_line("00000001", TOMORROW_NOON),
+        _pending_line("00000002", TODAY_NOON),
+        '[scheduled:"%d" status:"pending" uuid:"00000003"]\n' % TODAY_NOON,
+        '[scheduled:"%d" status:"pending" uuid:"00000004"]\n' % TODAY_NOON,
+    ]
+    (tmp_path / "pending.data").write_text("".join(lines))
+
+    hook = WarnOnTaskCongestion(
+        task_dir=tmp_path, warn_threshold=1, date_fields=["due", "scheduled"], horizon_days=2
+    )
+    hook._on_exit([])
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 2
+    assert out[0].startswith("[WarnOnTaskCongestion] Too many due:tomorrow tasks")
+    assert out[1].startswith("[WarnOnTaskCongestion] Too many scheduled:today tasks")
+
+
+def test_config_from_env(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("TW_CONGESTION_DATE_FIELDS", '["due", "wait"]')
+    monkeypatch.setenv("TW_CONGESTION_HORIZON_DAYS", "14")
+    hook = WarnOnTaskCongestion(task_dir=tmp_path)
+    assert hook._date_fields == ["due", "wait"]
+    assert hook._horizon_days == 14
+
+    monkeypatch.setenv("TW_CONGESTION_HORIZON_DAYS", "0")
+    with pytest.raises(RuntimeError):
+        WarnOnTaskCongestion(task_dir=tmp_path)
+
+
+def test_histogram_backends_agree():
+    numpy = pytest.importorskip("numpy")
+    boundaries = day_boundaries(14)
+    timestamps = array("q", range(boundaries[0] - 86400, boundaries[-1] + 86400, 997))
+    assert _counts_numpy(numpy, timestamps, boundaries) == _counts_python(
+        timestamps, boundaries
+    )
+
+
+def test_index_timestamp_arrays(tmp_path: Path):
+    (tmp_path / "pending.data").write_text(
+        _pending_line("00000000", TODAY_NOON)
+        + '[scheduled:"%d" status:"pending" uuid:"00000001"]\n' % TODAY_NOON
+    )
+    index = PendingDataIndex(
+        pending_data=tmp_path / "pending.data",
+        index_path=tmp_path / "index",
+        fields=["due", "scheduled", "wait"],
+    )
+    index.refresh()
+    arrays = index.timestamp_arrays()
+    assert {field: list(arr) for field, arr in arrays.items()} == {
+        "due": [TODAY_NOON],
+        "scheduled": [TODAY_NOON],
+        "wait": [],
+    }
+
+
+def test_index_skips_inactive_tasks(index: PendingDataIndex):
+    index.refresh()
+    assert sorted(index.entries) == ["00000000", "00000001", "00000002"]
+    assert list(index.timestamps("due")) == [TODAY_NOON] * 3
+
+
+def test_index_parses_appended_lines_only(index: PendingDataIndex, monkeypatch):
+    index.refresh()
+    with (index._pending_data).open("a") as f:
+        f.write(_pending_line("00000004", TODAY_NOON + 1))
+
+    index = _new_index(index)
+    _forbid_rescan(index, monkeypatch)
+    index.refresh()
+    assert index.entries["00000004"] == (TODAY_NOON + 1,)
+    assert len(index.entries) == 4
+
+
+def test_index_applies_modified_tasks(index: PendingDataIndex, monkeypatch):
+    index.refresh()
+    conts = index._pending_data.read_text()
+    index._pending_data.write_text(conts.replace(_pending_line("00000001", TODAY_NOON), ""))
+
+    index = _new_index(index)
+    _forbid_rescan(index, monkeypatch)
+    index.refresh([{"uuid": "00000001", "status": "deleted"}])
+    index.refresh([{"uuid": "00000000", "status": "pending", "due": TODAY_NOON_ISO}])
+    assert sorted(index.entries) == ["00000000", "00000002"]
+
+
+def test_index_rescans_rewritten_file(index: PendingDataIndex):
+    index.refresh()
+    index._pending_data.write_text(_pending_line("00000005", TODAY_NOON))
+
+    index = _new_index(index)
+    index.refresh()
+    assert list(index.entries) == ["00000005"]
+
+
+def test_index_ignores_stale_pickles(index: PendingDataIndex):
+    # e.g., pickled by an older version, with a class that's gone since
+    index._index_path.write_bytes(b"ctw_hooks.pending_data\n_Gone\n.")
+    index.refresh()
+    assert sorted(index.entries) == ["00000000", "00000001", "00000002"]
+
+
+def test_index_works_without_saving(task_dir: Path):
+    # the directory of the index can't be created, the file is in the way
+    (task_dir / "not-a-dir").write_text("")
+    index = PendingDataIndex(
+        pending_data=task_dir / "pending.data",
+        index_path=task_dir / "not-a-dir" / "index",
+        fields=["due"],
+    )
+    index.refresh()
+    assert len(index.entries) == 3
+    # no temporary file left behind either
+    assert sorted(p.name for p in task_dir.iterdir()) == ["not-a-dir", "pending.data"]
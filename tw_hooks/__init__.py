@@ -1,4 +1,18 @@
 """Base hooks."""
-from .base_hooks import BaseHook, OnAddHook, OnExitHook, OnLaunchHook, OnModifyHook
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .base_hooks import BaseHook, OnAddHook, OnExitHook, OnLaunchHook, OnModifyHook
 
 __all__ = ["BaseHook", "OnExitHook", "OnModifyHook", "OnAddHook", "OnLaunchHook"]
+
+
+def __getattr__(name: str):
+    # Import the base hooks on first access, so that importing e.g., tw_hooks.utils from a shim
+    # doesn't have to pay for them
+    if name in __all__:
+        from . import base_hooks  # pylint: disable=C0415
+
+        return getattr(base_hooks, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
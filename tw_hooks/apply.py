@@ -0,0 +1,203 @@
+"""Run hooks over existing tasks, e.g., the output of `task export`, instead of a single event.
+
+The tasks are streamed: they are read, passed through the hooks and written out one chunk at a
+time, so memory usage doesn't depend on the size of the database. Chunks can be processed by a
+pool of worker processes, each with its own instances of the hooks.
+
+Each task goes through the on-add entrypoint of the hooks that have one and through the
+on-modify one otherwise, as if it had been modified without changing anything. The
+watched_fields of the hooks are ignored, as nothing has changed.
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, Optional, Sequence, Union, cast
+
+from tw_hooks.base_hooks import OnAddHook, OnModifyHook
+from tw_hooks.dispatcher import capture, load_hook, split_output
+from tw_hooks.json_codec import dumps, loads
+from tw_hooks.lazy_task import LazyTask
+from tw_hooks.types import HookSpec, TaskT
+from tw_hooks.utils import changed_fields, use_json
+
+_Hook = Union[OnAddHook, OnModifyHook]
+
+# Hooks of the worker process, instantiated once by _init_worker
+_worker_hooks: List[_Hook] = []
+
+
+@dataclass
+class Result:
+    """Outcome of passing a single task through the hooks.
+
+    Only tasks that were changed, rejected, or got some feedback have a Result.
+    """
+
+    uuid: str
+    # JSON line of the changed task, None if it wasn't changed or it was rejected
+    task_line: Optional[str] = None
+    feedback: List[str] = field(default_factory=list)
+    retcode: int = 0
+
+
+def _strip_separators(line: str) -> str:
+    # the array that `task export` prints has a task per line, e.g., '[{...},' or '{...}]'
+    return line.strip().lstrip("[").rstrip(",]").strip()
+
+
+def iter_task_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield the JSON of each task, given the lines of a JSON array or of JSON lines.
+
+    A task per line is the format of `task export`, and the fast path. Pretty-printed tasks
+    that span multiple lines and arrays on a single line are also accepted.
+
+    >>> list(iter_task_lines(['[{"id": 1},\\n', '{"id": 2}\\n', ']\\n']))
+    ['{"id": 1}', '{"id": 2}']
+    >>> lines = ['{\\n', '  "tags": ["a"]\\n', '},\\n', '[{"id": 1}, {"id": 2}]\\n']
+    >>> [loads(task_line) for task_line in iter_task_lines(lines)]
+    [{'tags': ['a']}, {'id': 1}, {'id': 2}]
+    """
+    pending: List[str] = []
+    for line in lines:
+        if not pending:
+            stripped = line.strip()
+            if stripped.startswith("[") and stripped.endswith("]"):
+                # whole array in a single line
+                try:
+                    tasks = loads(stripped)
+                except ValueError:
+                    pass
+                else:
+                    yield from (dumps(task) for task in tasks)
+                    continue
+
+            chunk = _strip_separators(line)
+            if not chunk:
+                continue
+            if chunk.startswith("{") and chunk.endswith("}"):
+                yield chunk
+                continue
+
+        # part of a task that spans multiple lines, wait until it can be decoded
+        pending.append(line)
+        chunk = _strip_separators("".join(pending))
+        if not chunk.endswith("}"):
+            continue
+        try:
+            loads(chunk)
+        except ValueError:
+            continue
+        pending.clear()
+        yield chunk
+
+    if pending:
+        raise RuntimeError(f"Incomplete task at the end of the input: {''.join(pending)}")
+
+
+def apply_hooks(hooks: Sequence[_Hook], task_line: str) -> Optional[Result]:
+    """Pass a single task through the given hooks, in order.
+
+    :return: None if the hooks didn't change the task and didn't have anything to say about it
+    """
+    # pylint: disable=W0212
+    # hooks modify the task in place, keep the original one around to compare against
+    original_task = cast(TaskT, LazyTask(task_line))
+    task = use_json(task_line)
+    emitted_line = None
+    feedback: List[str] = []
+    for hook in hooks:
+        if isinstance(hook, OnAddHook):
+            ret, out = capture(hook._on_add, hook._view(task))
+        else:
+            ret, out = capture(
+                hook._on_modify,
+                original_task=(
+                    hook._view(original_task) if hook.requires_original_task else None
+                ),
+                modified_task=hook._view(task),
+            )
+        emitted, hook_feedback = split_output(out)
+        feedback.extend(hook_feedback)
+        if emitted is not None:
+            emitted_line = emitted
+            task = use_json(emitted)
+        if ret:
+            return Result(uuid=task.get("uuid", ""), feedback=feedback, retcode=1)
+
+    changed = emitted_line is not None and changed_fields(original_task, task)
+    if not changed and not feedback:
+        return None
+
+    return Result(
+        uuid=task.get("uuid", ""),
+        task_line=emitted_line if changed else None,
+        feedback=feedback,
+    )
+
+
+def _load_hooks(specs: Sequence[HookSpec]) -> List[_Hook]:
+    hooks: List[_Hook] = []
+    for spec in specs:
+        hook = load_hook(spec)
+        if not isinstance(hook, (OnAddHook, OnModifyHook)):
+            raise RuntimeError(f"{spec[1]} is neither an on-add nor an on-modify hook")
+        hooks.append(hook)
+
+    return hooks
+
+
+def _init_worker(specs: Sequence[HookSpec]):
+    _worker_hooks[:] = _load_hooks(specs)
+
+
+def _apply_to_chunk(task_lines: List[str]) -> List[Result]:
+    results = (apply_hooks(_worker_hooks, line) for line in task_lines)
+    return [result for result in results if result is not None]
+
+
+def _chunks(task_lines: Iterator[str], chunk_size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(islice(task_lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def apply(
+    specs: Sequence[HookSpec],
+    lines: Iterable[str],
+    jobs: int = 1,
+    chunk_size: int = 500,
+) -> Iterator[Result]:
+    """Pass the tasks in the given lines through the given hooks.
+
+    :param specs: (module, class name) pairs of the hooks to run, in order
+    :param lines: Lines of a JSON array of tasks, or JSON lines, e.g., the output of
+                  `task export`
+    :param jobs: Number of worker processes, 1 to run the hooks from within this process
+    :param chunk_size: Number of tasks that are handed to a worker process at once
+    :return: A Result for each task that was changed, rejected or got feedback, in the order
+             of the input
+    """
+    task_lines = iter_task_lines(lines)
+    if jobs <= 1:
+        hooks = _load_hooks(specs)
+        for task_line in task_lines:
+            result = apply_hooks(hooks, task_line)
+            if result is not None:
+                yield result
+        return
+
+    # only keep a couple of chunks per worker in flight, so that the input isn't read faster
+    # than it can be processed
+    in_flight: Deque["Future[List[Result]]"] = deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(list(specs),)
+    ) as executor:
+        for chunk in _chunks(task_lines, chunk_size):
+            in_flight.append(executor.submit(_apply_to_chunk, chunk))
+            if len(in_flight) >= 2 * jobs:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
@@ -1,11 +1,28 @@
 from abc import ABC, abstractmethod
+from typing import AbstractSet, Any, FrozenSet, Optional
 
-from bubop.string import camel_case_to_dashed
+from tw_hooks.task import Task
 
 
 class BaseHook(ABC):
     """Base class for all the Taskwarrior hooks."""
 
+    # Fields of the task that the hook cares about. When a task is modified and none of these
+    # changed, the hook is skipped and the task is passed through untouched. None for all fields
+    watched_fields: Optional[FrozenSet[str]] = None
+
+    # Hand the tasks to the hook as tw_hooks.task.Task views instead of plain dicts
+    task_view: bool = False
+
+    # Seconds that the dispatcher waits for the hook before it gives up on it and passes the
+    # task through unmodified, None to wait for as long as it takes. See tw_hooks.dispatcher
+    timeout: Optional[float] = None
+
+    # Install the hook along with the rest by default, e.g., with install-hook-shims --all-hooks.
+    # Hooks that are costly or that only serve other hooks should only be installed on request.
+    # Set it to a literal in the class body, the registry reads it without importing the hook
+    installed_by_default: bool = True
+
     @classmethod
     @abstractmethod
     def shim_prefix(cls) -> str:
@@ -24,6 +41,16 @@ class BaseHook(ABC):
     def require_stdin(cls) -> bool:
         """True if this Hook requires access to the standard input."""
 
+    @classmethod
+    def watches_any(cls, fields: AbstractSet[str]) -> bool:
+        """True if the hook has to run when the given fields of a task change."""
+        return cls.watched_fields is None or not cls.watched_fields.isdisjoint(fields)
+
+    @classmethod
+    def _view(cls, task: Any) -> Any:
+        """The task, the way the hook wants to get it."""
+        return Task(task) if cls.task_view and task is not None else task
+
     @classmethod
     def _get_subclass_name(cls) -> str:
         return cls.__name__
@@ -47,6 +74,9 @@ class BaseHook(ABC):
     @classmethod
     def dashed_name(cls) -> str:
         """Return the name of the child class in dashed format - instead of camel-case."""
+        # bubop pulls in loguru & co. - only import it when required, not on every hook call
+        from bubop.string import camel_case_to_dashed  # pylint: disable=C0415
+
         name = cls.name()
         return camel_case_to_dashed(name)
 
@@ -2,7 +2,8 @@ from abc import abstractmethod
 from typing import List, final
 
 from tw_hooks.base_hooks.base_hook import BaseHook
-from tw_hooks.types import TaskT
+from tw_hooks.instrumentation import instrument
+from tw_hooks.types import TaskLike
 from tw_hooks.utils import stdin_lines_to_json
 
 
@@ -12,10 +13,13 @@ class OnAddHook(BaseHook):
     @final
     def on_add(self, stdin_lines: List[str]):
         """Entrypoint - to be called by the Hook shim."""
-        return self._on_add(stdin_lines_to_json(stdin_lines)[0])
+        with instrument(self.name(), "on-add", stdin_lines) as invocation:
+            task = stdin_lines_to_json(stdin_lines)[0]
+            invocation.parsed()
+            return invocation.done(self._on_add(self._view(task)))
 
     @abstractmethod
-    def _on_add(self, added_task: TaskT):
+    def _on_add(self, added_task: TaskLike):
         """Implement this in your hook."""
 
     @classmethod
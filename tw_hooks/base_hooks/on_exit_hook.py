@@ -1,23 +1,52 @@
-from abc import abstractmethod
-from typing import List, final
+from typing import Iterator, List, final
 
 from tw_hooks.base_hooks.base_hook import BaseHook
-from tw_hooks.types import TaskT
-from tw_hooks.utils import stdin_lines_to_json
+from tw_hooks.instrumentation import instrument
+from tw_hooks.types import TaskLike
+from tw_hooks.utils import iter_tasks, stdin_lines_to_json
 
 
 class OnExitHook(BaseHook):
-    """On exit hook base class."""
+    """On exit hook base class.
+
+    Implement either _on_exit, which gets all the added/modified tasks at once, or
+    _on_exit_iter, which gets them one at a time as they are read and decoded. Hooks that only
+    count or filter the tasks then run in constant memory, and can stop reading early.
+    """
+
+    def __init_subclass__(cls, **kargs):
+        super().__init_subclass__(**kargs)
+        # the defaults of the two call each other, a hook without either would recurse forever
+        if cls._on_exit is OnExitHook._on_exit and not cls.streams_tasks():
+            raise TypeError(
+                f"{cls.__name__} should implement either _on_exit or _on_exit_iter"
+            )
 
     @final
     def on_exit(self, stdin_lines: List[str]):
         """Entrypoint - to be called by the Hook shim."""
-        items = stdin_lines_to_json(stdin_lines)
-        return self._on_exit(items)
+        with instrument(self.name(), "on-exit", stdin_lines) as invocation:
+            if self.streams_tasks():
+                invocation.parsed()
+                tasks = map(self._view, iter_tasks(stdin_lines))
+                return invocation.done(self._on_exit_iter(tasks))
+
+            items = [self._view(task) for task in stdin_lines_to_json(stdin_lines)]
+            invocation.parsed()
+            return invocation.done(self._on_exit(items))
+
+    @classmethod
+    def streams_tasks(cls) -> bool:
+        """True if the hook implements _on_exit_iter."""
+        return cls._on_exit_iter is not OnExitHook._on_exit_iter
+
+    def _on_exit(self, added_modified_tasks: List[TaskLike]):
+        """Implement this or _on_exit_iter in your hook."""
+        return self._on_exit_iter(iter(added_modified_tasks))
 
-    @abstractmethod
-    def _on_exit(self, added_modified_tasks: List[TaskT]):
-        """Implement this in your hook."""
+    def _on_exit_iter(self, added_modified_tasks: Iterator[TaskLike]):
+        """Implement this or _on_exit in your hook."""
+        return self._on_exit(list(added_modified_tasks))
 
     @classmethod
     def entrypoint(cls) -> str:
@@ -2,6 +2,7 @@ from abc import abstractmethod
 from typing import final
 
 from tw_hooks.base_hooks.base_hook import BaseHook
+from tw_hooks.instrumentation import instrument
 
 
 class OnLaunchHook(BaseHook):
@@ -10,7 +11,8 @@ class OnLaunchHook(BaseHook):
     @final
     def on_launch(self):
         """Entrypoint - to be called by the Hook shim."""
-        return self._on_launch()
+        with instrument(self.name(), "on-launch") as invocation:
+            return invocation.done(self._on_launch())
 
     @abstractmethod
     def _on_launch(self):
@@ -1,22 +1,49 @@
 from abc import abstractmethod
-from typing import List, final
+from typing import List, Optional, cast, final
 
 from tw_hooks.base_hooks.base_hook import BaseHook
-from tw_hooks.types import TaskT
-from tw_hooks.utils import stdin_lines_to_json
+from tw_hooks.instrumentation import instrument
+from tw_hooks.lazy_task import LazyTask
+from tw_hooks.types import TaskLike, TaskT
+from tw_hooks.utils import changed_fields, use_json
 
 
 class OnModifyHook(BaseHook):
-    """On modify hook base class."""
+    """On modify hook base class.
+
+    The original task is decoded only if the hook accesses it. Hooks that never need it should
+    set requires_original_task to False, in which case they get None instead.
+
+    If watched_fields is set, the hook only runs if at least one of these fields was modified.
+    """
+
+    requires_original_task: bool = True
 
     @final
     def on_modify(self, stdin_lines: List[str]):
         """Entrypoint - to be called by the Hook shim."""
-        o, m = stdin_lines_to_json(stdin_lines)
-        return self._on_modify(original_task=o, modified_task=m)
+        with instrument(self.name(), "on-modify", stdin_lines) as invocation:
+            original_line, modified_line = stdin_lines
+            original_task = cast(TaskT, LazyTask(original_line))
+            modified_task = use_json(modified_line.strip())
+            invocation.parsed()
+            if self.watched_fields is not None and not self.watches_any(
+                changed_fields(original_task, modified_task)
+            ):
+                print(modified_line.strip())
+                return invocation.done(0)
+
+            return invocation.done(
+                self._on_modify(
+                    original_task=(
+                        self._view(original_task) if self.requires_original_task else None
+                    ),
+                    modified_task=self._view(modified_task),
+                )
+            )
 
     @abstractmethod
-    def _on_modify(self, original_task: TaskT, modified_task: TaskT):
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
         """Implement this in your hook."""
 
     @classmethod
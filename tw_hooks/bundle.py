@@ -0,0 +1,129 @@
+"""Self-contained, precompiled copy of tw_hooks, the hooks and their dependencies for the shims.
+
+A regular shim starts a full Python interpreter, which imports site and searches every
+sys.path entry, including all of site-packages, for each one of its imports. A shim that uses
+a bundle instead runs `python -IS` (isolated mode, no site) with only the bundle directory and
+the standard library on its path, so importing the hooks costs a handful of stat calls.
+
+The bundle is a directory rather than a zipapp, since compiled dependencies such as orjson
+can't be imported from a zip file. It's a snapshot of the installed packages: install the
+shims again after upgrading any of them.
+"""
+import compileall
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import sysconfig
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+# Flags of the interpreter that runs the bundled shims: isolated mode, don't import site
+BUNDLE_PYTHON_FLAGS = "-IS"
+
+# Run in a separate interpreter, report the files of the top-level packages that importing the
+# given modules pulls in
+_FIND_PACKAGES = """
+import json, sys
+before = set(sys.modules)
+for module in sys.argv[1:]:
+    __import__(module)
+
+paths = {}
+for name in sorted(set(sys.modules) - before):
+    top = sys.modules.get(name.partition(".")[0])
+    file = getattr(top, "__file__", None)
+    if file is None and hasattr(top, "__path__"):
+        # namespace package
+        file = list(top.__path__)[0] + "/__init__.py"
+    if file is not None:
+        paths[top.__name__] = file
+print(json.dumps(paths))
+"""
+
+
+def _is_stdlib(path: Path) -> bool:
+    stdlib_dirs = {Path(sysconfig.get_paths()[key]) for key in ("stdlib", "platstdlib")}
+    return not {"site-packages", "dist-packages"} & set(path.parts) and any(
+        d in path.parents for d in stdlib_dirs
+    )
+
+
+def runtime_packages(modules: Sequence[str]) -> List[Path]:
+    """Paths of the non-standard-library packages and modules that the given modules import.
+
+    Packages are returned as their directory, top-level modules as their file.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-c", _FIND_PACKAGES, *modules],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"Can't import {', '.join(modules)}:\n{proc.stderr}")
+
+    paths = []
+    for file in json.loads(proc.stdout).values():
+        path = Path(file)
+        if _is_stdlib(path):
+            continue
+        paths.append(path.parent if path.name == "__init__.py" else path)
+
+    return paths
+
+
+def build_bundle(bundle_dir: Path, modules: Sequence[str]) -> List[Path]:
+    """Copy the packages that the given modules need under bundle_dir and precompile them.
+
+    An existing bundle is replaced only once the new one is complete.
+
+    :return: The packages and modules that were bundled
+    """
+    packages = runtime_packages(modules)
+    tmp_dir = bundle_dir.with_name(f"{bundle_dir.name}.tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    for path in packages:
+        if path.is_dir():
+            shutil.copytree(
+                path, tmp_dir / path.name, ignore=shutil.ignore_patterns("__pycache__")
+            )
+        else:
+            shutil.copy2(path, tmp_dir / path.name)
+
+    # the shims can't write the bytecode themselves if the bundle isn't writable, and they
+    # shouldn't have to compile it on their first run anyway
+    if not compileall.compile_dir(str(tmp_dir), quiet=1):
+        raise RuntimeError(f"Couldn't compile the bundle under {tmp_dir}")
+
+    if bundle_dir.exists():
+        shutil.rmtree(bundle_dir)
+    tmp_dir.rename(bundle_dir)
+    return packages
+
+
+def measure_startup(
+    modules: Sequence[str], bundle_dir: Optional[Path] = None, runs: int = 5
+) -> float:
+    """Median time in ms to start an interpreter and import the given modules.
+
+    :param bundle_dir: Import the modules from this bundle, the way the bundled shims do
+    """
+    code = f"import {', '.join(modules)}"
+    cmd = [sys.executable, "-c", code]
+    if bundle_dir is not None:
+        code = f"import sys; sys.path.insert(0, {str(bundle_dir)!r}); {code}"
+        cmd = [sys.executable, BUNDLE_PYTHON_FLAGS, "-c", code]
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(times)
@@ -0,0 +1,139 @@
+"""Stop running hooks that keep failing or overrunning their timeout, for a while.
+
+Enable it by setting TW_HOOKS_CIRCUIT_BREAKER to 1, or to a JSON object that overrides any of
+the defaults, e.g., {"max_failures": 3, "cooldown": 600, "slow_ms": 500}:
+
+- max_failures: Consecutive failures after which the hook is bypassed
+- cooldown: Seconds for which the hook is bypassed, before it's given another chance
+- slow_ms: Invocations that take longer than this count as failures too. By default only the
+  ones that raise or overrun their timeout (see BaseHook.timeout) do. Rejecting a task isn't a
+  failure.
+
+The breaker of each hook class is closed (the hook runs) until the hook fails max_failures
+times in a row. It's then open: the dispatcher passes the task through without even calling
+the hook, for cooldown seconds. The next invocation after that is a probe (half-open): if it
+succeeds the breaker closes again, otherwise it stays open for another cooldown.
+
+The state of the breakers is kept in <task dir>/tw_hooks/circuit-breaker.json and is only
+written when it changes.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from tw_hooks.config import get_config
+from tw_hooks.json_codec import dumps, loads
+from tw_hooks.utils import get_hooks_data_dir, get_task_dir
+
+envvar = "TW_HOOKS_CIRCUIT_BREAKER"
+
+_defaults: Dict[str, Any] = {"max_failures": 3, "cooldown": 600.0, "slow_ms": None}
+
+
+class CircuitBreaker:
+    """Persistent breakers of the hooks, keyed by the name of the hook class."""
+
+    def __init__(
+        self,
+        path: Path,
+        max_failures: int = _defaults["max_failures"],
+        cooldown: float = _defaults["cooldown"],
+        slow_ms: Optional[float] = _defaults["slow_ms"],
+    ):
+        self._path = path
+        self._max_failures = max(1, int(max_failures))
+        self._cooldown = float(cooldown)
+        self._slow_ms = None if slow_ms is None else float(slow_ms)
+
+        self._states: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+
+    @property
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        """hook name -> {"failures": consecutive failures, "opened_at": when it was opened}."""
+        if self._states is None:
+            try:
+                self._states = loads(self._path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._states = {}
+            if not isinstance(self._states, dict):
+                self._states = {}
+
+        return self._states
+
+    def allow(self, hook: str) -> bool:
+        """True if the hook should run, either because it's healthy or as a probe."""
+        state = self.states.get(hook)
+        if state is None or state.get("opened_at") is None:
+            return True
+        opened_at = float(state["opened_at"])
+        return time.time() >= opened_at + self._cooldown
+
+    def record(self, hook: str, failed: bool, elapsed_ms: float = 0.0) -> Optional[str]:
+        """Record the outcome of an invocation of the hook.
+
+        :return: A message for the user if the breaker of the hook was opened
+        """
+        failed = failed or (self._slow_ms is not None and elapsed_ms > self._slow_ms)
+        state = self.states.get(hook)
+        if not failed:
+            if state is not None:
+                # closed again, possibly after a successful probe
+                del self.states[hook]
+                self._dirty = True
+            return None
+
+        if state is None:
+            state = self.states[hook] = {"failures": 0, "opened_at": None}
+        state["failures"] += 1
+        self._dirty = True
+        if state["failures"] < self._max_failures:
+            return None
+
+        state["opened_at"] = time.time()
+        return (
+            f"[{hook}] Failed {state['failures']} time(s) in a row, bypassing it for the next"
+            f" {self._cooldown:g}s"
+        )
+
+    def save(self):
+        """Persist the state of the breakers, if it changed."""
+        if not self._dirty:
+            return
+
+        tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(dumps(self.states), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+        except OSError:
+            # losing track of a few failures is better than failing the hooks
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._dirty = False
+
+
+def from_config() -> Optional[CircuitBreaker]:
+    """The circuit breaker configured in TW_HOOKS_CIRCUIT_BREAKER, None if it's disabled."""
+    val = get_config(envvar, raw=True)
+    if isinstance(val, str):
+        if val.lower() in ("", "0", "false", "no"):
+            return None
+        val = {} if val.lower() in ("1", "true", "yes") else get_config(envvar)
+    if val is None or val is False or val == 0:
+        return None
+    if val is True or val == 1:
+        val = {}
+    if not isinstance(val, dict):
+        raise RuntimeError(f"{envvar} should be 1 or a JSON object, got {val}")
+
+    unknown = set(val) - set(_defaults)
+    if unknown:
+        raise RuntimeError(
+            f"Unknown {envvar} parameter(s) {sorted(unknown)}, expected any of"
+            f" {sorted(_defaults)}"
+        )
+
+    path = get_hooks_data_dir(get_task_dir()) / "circuit-breaker.json"
+    return CircuitBreaker(path, **{**_defaults, **val})
@@ -0,0 +1,158 @@
+"""Configuration of the hooks and cache of the structures derived from it.
+
+Each configuration value is identified by the name of its environment variable, e.g.,
+TW_CORRECT_TAG_MAPPINGS. It is read from that environment variable if it's set, and from the
+configuration file otherwise. The configuration file is a JSON object with the same names as
+keys, by default at ~/.config/tw-hooks/config.json (set TW_HOOKS_CONFIG to use another path):
+
+    {
+        "TW_CORRECT_TAG_MAPPINGS": {"movies": "movie", "wor": "work"},
+        "TW_INCOMPATIBLE_TAG_SETS": [["projectideas", "freetime"]]
+    }
+
+The structures that the hooks derive from their configuration, e.g., lookup tables and rule
+indices, are pickled under ~/.cache/tw-hooks (set TW_HOOKS_CACHE_DIR to use another directory
+or to an empty string to disable it). They are keyed by a hash of the configuration and of the
+code that builds them, so that later invocations load them instead of building them again.
+"""
+import hashlib
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from tw_hooks.json_codec import dumps, loads_lenient
+
+config_envvar = "TW_HOOKS_CONFIG"
+cache_dir_envvar = "TW_HOOKS_CACHE_DIR"
+
+# Bump when the way the cache keys are computed changes
+_CACHE_VERSION = 1
+
+T = TypeVar("T")
+
+# (path, mtime_ns) -> contents of the configuration file
+_config_files: Dict[Tuple[Path, int], Dict[str, Any]] = {}
+
+# cache key -> derived structure, shared by all the hook instances of this process
+_derived: Dict[str, Any] = {}
+
+
+def _xdg_dir(envvar: str, default: str) -> Path:
+    path = os.environ.get(envvar)
+    return Path(path) if path else Path.home() / default
+
+
+def config_file_path() -> Path:
+    """Path of the configuration file, it doesn't have to exist."""
+    path = os.environ.get(config_envvar)
+    if path:
+        return Path(path).expanduser()
+    return _xdg_dir("XDG_CONFIG_HOME", ".config") / "tw-hooks" / "config.json"
+
+
+def cache_dir_path() -> Optional[Path]:
+    """Directory of the cached derived structures, None if caching them is disabled."""
+    path = os.environ.get(cache_dir_envvar)
+    if path is not None:
+        return Path(path).expanduser() if path else None
+    return _xdg_dir("XDG_CACHE_HOME", ".cache") / "tw-hooks"
+
+
+def _read_config_file() -> Dict[str, Any]:
+    path = config_file_path()
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return {}
+
+    contents = _config_files.get((path, mtime_ns))
+    if contents is None:
+        contents = loads_lenient(path.read_text(encoding="utf-8"))
+        if not isinstance(contents, dict):
+            raise RuntimeError(
+                f"Configuration file {path} should contain a JSON object, not a"
+                f" {type(contents)}"
+            )
+        _config_files[(path, mtime_ns)] = contents
+
+    return contents
+
+
+def get_config(name: str, raw: bool = False) -> Optional[Any]:
+    """Return the given configuration value, None if it's not set.
+
+    :param raw: Don't parse the value of the environment variable as JSON, e.g., if it's a
+                plain string
+
+    >>> os.environ["TW_SOME_SETTING"] = "{'a': [1, 2]}"
+    >>> get_config("TW_SOME_SETTING")
+    {'a': [1, 2]}
+    >>> get_config("TW_SOME_SETTING", raw=True)
+    "{'a': [1, 2]}"
+    >>> del os.environ["TW_SOME_SETTING"]
+    """
+    val = os.environ.get(name)
+    if val is not None:
+        return val if raw else loads_lenient(val)
+
+    return _read_config_file().get(name)
+
+
+def _cache_key(build: Callable[[Any], Any], config: Any) -> str:
+    # rebuild if the code of the builder changes, its structures might be different
+    module = sys.modules.get(build.__module__)
+    try:
+        code_version = os.stat(module.__file__).st_mtime_ns  # type: ignore
+    except (AttributeError, TypeError, OSError):
+        code_version = 0
+
+    contents = dumps(
+        [_CACHE_VERSION, build.__module__, build.__qualname__, code_version, config]
+    )
+    return hashlib.sha1(contents.encode("utf-8")).hexdigest()
+
+
+def get_derived(build: Callable[[Any], T], config: Any) -> T:
+    """Return build(config), from the cache if it has been built before.
+
+    :param build: Module-level class or function that builds the structure from the config.
+                  What it returns has to be picklable
+    :param config: The configuration to build from, has to be JSON-serializable
+    """
+    key = _cache_key(build, config)
+    derived: Optional[T] = _derived.get(key)
+    if derived is not None:
+        return derived
+
+    cache_dir = cache_dir_path()
+    path = cache_dir / f"{key}.pickle" if cache_dir is not None else None
+    if path is not None:
+        try:
+            with path.open("rb") as f:
+                derived = pickle.load(f)
+        except Exception:  # pylint: disable=W0703
+            # missing, or written by an incompatible version, or corrupted
+            derived = None
+
+    if derived is None:
+        derived = build(config)
+        if path is not None:
+            _write_cache(path, derived)
+
+    _derived[key] = derived
+    return derived
+
+
+def _write_cache(path: Path, derived: Any):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open("wb") as f:
+            pickle.dump(derived, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError):
+        # the cache is an optimisation, never fail the hook because of it
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -0,0 +1,148 @@
+"""Long-lived process that keeps the hooks instantiated and runs them on behalf of the shims.
+
+A shim installed with `install-hook-shims --use-daemon` forwards its standard input and argv
+over a Unix domain socket and relays the output and the exit code that the daemon sends back.
+This way the interpreter startup, the imports and the hook configuration parsing are paid only
+once, when the daemon starts, instead of on every hook invocation.
+
+Keep in mind that the hooks are configured based on the environment of the daemon, not on the
+environment of the shell that invoked Taskwarrior. They are instantiated once for every
+Taskwarrior data directory that the requests come from, i.e., the data: argument of the hooks.
+
+The socket is only accessible by the user that runs the daemon and lives in a directory that
+other users can't write to. The shims only connect to a socket that's owned by their user, and
+the daemon only runs the hooks that tw_hooks.registry finds, plus the ones of the modules that
+it's explicitly given.
+"""
+import io
+import os
+import socket
+import socketserver
+import sys
+import traceback
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Sequence, Union
+
+from tw_hooks.dispatcher import dispatch
+from tw_hooks.json_codec import dumps, loads
+from tw_hooks.registry import available_hooks
+from tw_hooks.types import HookSpec
+
+envvar = "TW_HOOKS_DAEMON_SOCKET"
+
+
+def default_socket_path() -> Path:
+    """Path of the socket that the daemon listens to and that the shims connect to.
+
+    The shims resolve this path the same way, keep the two in sync.
+    """
+    path = os.environ.get(envvar)
+    if path:
+        return Path(path)
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "tw-hooks.sock"
+
+    # a directory of our own, /tmp itself is writable by everyone
+    return Path(f"/tmp/tw-hooks-{os.getuid()}") / "daemon.sock"
+
+
+def handle_request(
+    request: Dict[str, Any], allowed_hooks: FrozenSet[HookSpec]
+) -> Dict[str, Any]:
+    """Run the hooks described in the request and return what the shim should output.
+
+    :param allowed_hooks: (module, class name) of the hooks that the daemon may run
+    """
+    hook_specs = [(str(module), str(name)) for module, name in request["hooks"]]
+    unknown = [spec for spec in hook_specs if spec not in allowed_hooks]
+    if unknown:
+        return {
+            "stdout": (
+                f"Refusing to run unknown hook(s) {', '.join(name for _, name in unknown)},"
+                " pass their modules to tw-hooks-daemon with --register-additional\n"
+            ),
+            "retcode": 1,
+        }
+
+    buf = io.StringIO()
+    argv = sys.argv
+    try:
+        sys.argv = request.get("argv", argv)
+        with redirect_stdout(buf):
+            retcode = dispatch(
+                request["event"], hook_specs, stdin_lines=request["stdin_lines"]
+            )
+    except Exception:  # pylint: disable=W0703
+        # Don't bring the daemon down because of a misbehaving hook
+        buf.write(traceback.format_exc())
+        retcode = 1
+    finally:
+        sys.argv = argv
+
+    return {"stdout": buf.getvalue(), "retcode": retcode}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = loads(self.rfile.read().decode("utf-8"))
+        response = handle_request(request, self.server.allowed_hooks)  # type: ignore
+        self.wfile.write(dumps(response).encode("utf-8"))
+
+
+class HookDaemon(socketserver.UnixStreamServer):
+    """Serve hook invocations, one at a time, over a Unix domain socket.
+
+    Taskwarrior invokes its hooks one after the other anyway, so there's no need to serve
+    requests concurrently.
+
+    :param additional_modules: Modules of hooks to run on top of the ones that
+                               tw_hooks.registry finds by default
+    """
+
+    def __init__(self, socket_path: Union[str, Path], additional_modules: Sequence[str] = ()):
+        self.socket_path = Path(socket_path)
+        self.allowed_hooks = frozenset(
+            hook.spec for hook in available_hooks(additional_modules)
+        )
+        self._ensure_private_dir()
+        self._remove_stale_socket()
+        # never accessible by anyone else, not even between binding and a chmod
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.socket_path), _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def _ensure_private_dir(self):
+        socket_dir = self.socket_path.parent
+        socket_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = socket_dir.stat()
+        if st.st_uid != os.getuid() or st.st_mode & 0o022:
+            raise RuntimeError(
+                f"Refusing to listen in {socket_dir}, it should be owned by the current user"
+                " and not writable by anyone else"
+            )
+
+    def _remove_stale_socket(self):
+        if not self.socket_path.exists():
+            return
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(self.socket_path))
+        except ConnectionRefusedError:
+            # left behind by a daemon that didn't exit cleanly
+            self.socket_path.unlink()
+            return
+        finally:
+            sock.close()
+
+        raise RuntimeError(f"Another daemon is already listening to {self.socket_path}")
+
+    def server_close(self):
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
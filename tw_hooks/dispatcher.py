@@ -0,0 +1,567 @@
+"""Run all the hooks registered for a Taskwarrior event from within a single process.
+
+Taskwarrior spawns one process per hook script. Instead of paying for an interpreter startup
+and for importing tw_hooks once for every hook, a dispatcher shim hands all the hooks of an
+event to `dispatch`, which parses the standard input once, passes the task through each hook
+in order and emits the final JSON and the collected feedback once.
+
+The on-exit hooks can't modify the tasks, so instead of one after the other they all run
+concurrently, each in its own thread. The total time is then that of the slowest one, and
+hooks that don't finish within TW_HOOKS_EXIT_BUDGET seconds (5 by default, 0 to wait for them
+indefinitely) are abandoned, so that a slow report doesn't hold Taskwarrior back.
+
+Any hook can also have a latency budget of its own, see BaseHook.timeout. It can be overridden
+per hook class in TW_HOOKS_TIMEOUTS, e.g., {"PostLatestStartToI3Status": 0.5}, 0 to disable
+it. A hook that overruns it is abandoned: it's left running in a daemon thread, whatever it
+prints from then on is discarded and the task is passed on as it was before the hook, so that
+the command can proceed.
+"""
+import io
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from importlib import import_module
+from pathlib import Path
+from types import GeneratorType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+    Type,
+    cast,
+)
+
+from tw_hooks import circuit_breaker
+from tw_hooks.base_hooks import BaseHook, OnAddHook, OnExitHook, OnLaunchHook, OnModifyHook
+from tw_hooks.circuit_breaker import CircuitBreaker
+from tw_hooks.config import get_config
+from tw_hooks.instrumentation import AnyInvocation, instrument
+from tw_hooks.lazy_task import LazyTask
+from tw_hooks.types import HookSpec, TaskT
+from tw_hooks.utils import (
+    changed_fields,
+    get_task_dir,
+    iter_stdin_lines,
+    iter_tasks,
+    parse_stdin_lines,
+    stdin_lines_to_json,
+    use_json,
+)
+
+_event_to_base_hook = {
+    Base.shim_prefix(): Base for Base in (OnAddHook, OnModifyHook, OnExitHook, OnLaunchHook)
+}
+
+exit_budget_envvar = "TW_HOOKS_EXIT_BUDGET"
+_default_exit_budget = 5.0
+
+timeouts_envvar = "TW_HOOKS_TIMEOUTS"
+
+# Recorded as the return code of the hooks that overran their timeout, see instrumentation
+_timed_out = "Timeout"
+
+# Instantiated hooks, reused in case dispatch is called multiple times from the same process,
+# e.g., by the daemon. Per Taskwarrior directory, since some hooks only read it when they are
+# instantiated, and the requests may come from different task databases
+_hook_instances: Dict[Tuple[Path, HookSpec], BaseHook] = {}
+
+
+def load_hook(spec: HookSpec) -> BaseHook:
+    """Import and instantiate the hook identified by the given (module, class name) pair.
+
+    The instance is reused for the same Taskwarrior directory, see get_task_dir.
+    """
+    key = (get_task_dir(), spec)
+    hook = _hook_instances.get(key)
+    if hook is None:
+        module, class_name = spec
+        hook = getattr(import_module(module), class_name)()
+        _hook_instances[key] = hook
+
+    return hook
+
+
+def capture(fn: Callable[..., Any], *args, **kargs) -> Tuple[int, List[str]]:
+    """Call a hook method and return its return code along with the lines it printed."""
+    stdout = sys.stdout
+    if isinstance(stdout, _ThreadStdout):
+        # hooks that overran their timeout may still be printing, only capture this thread
+        buf = stdout.register()
+        try:
+            ret = fn(*args, **kargs)
+        finally:
+            stdout.unregister()
+    else:
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            ret = fn(*args, **kargs)
+
+    return (1 if ret else 0), buf.getvalue().splitlines()
+
+
+def split_output(lines: List[str]) -> Tuple[Optional[str], List[str]]:
+    """Separate the JSON task emitted by a hook from the rest of its feedback."""
+    task_line = None
+    feedback = []
+    for line in lines:
+        if line.startswith("{"):
+            task_line = line
+        else:
+            feedback.append(line)
+
+    return task_line, feedback
+
+
+def _emit(task_line: Optional[str], feedback: List[str]):
+    for line in feedback:
+        print(line)
+    if task_line is not None:
+        print(task_line)
+
+
+def _dispatch_on_add(
+    hooks: Sequence[OnAddHook],
+    stdin_lines: List[str],
+    invocation: AnyInvocation,
+    breaker: Optional[CircuitBreaker] = None,
+) -> int:
+    # pylint: disable=W0212
+    task_line = stdin_lines[0].strip()
+    task: TaskT = stdin_lines_to_json(stdin_lines)[0]
+    invocation.parsed()
+    feedback: List[str] = []
+    for hook in hooks:
+        captured = _call_hook(
+            hook,
+            "on-add",
+            [task_line],
+            breaker,
+            hook._on_add,
+            hook._view(task),
+        )
+        if captured is None:
+            # the abandoned hook may still modify the task, carry on with a copy
+            task = use_json(task_line)
+            continue
+        ret, out = captured
+        emitted, hook_feedback = split_output(out)
+        feedback.extend(hook_feedback)
+        if emitted is not None:
+            task_line = emitted
+            task = use_json(emitted)
+        if ret:
+            _emit(task_line, feedback)
+            return 1
+
+    _emit(task_line, feedback)
+    return 0
+
+
+def _dispatch_on_modify(
+    hooks: Sequence[OnModifyHook],
+    stdin_lines: List[str],
+    invocation: AnyInvocation,
+    breaker: Optional[CircuitBreaker] = None,
+) -> int:
+    # pylint: disable=W0212
+    original_line, task_line = (line.strip() for line in stdin_lines)
+    # decoded at most once, and only if one of the hooks accesses it
+    original_task = cast(TaskT, LazyTask(original_line))
+    modified_task = use_json(task_line)
+    invocation.parsed()
+    # computed once, when the first hook that watches specific fields comes up
+    changed: Optional[Set[str]] = None
+    feedback: List[str] = []
+    for hook in hooks:
+        if hook.watched_fields is not None:
+            if changed is None:
+                changed = changed_fields(original_task, modified_task)
+            if not hook.watches_any(changed):
+                continue
+
+        captured = _call_hook(
+            hook,
+            "on-modify",
+            [original_line, task_line],
+            breaker,
+            hook._on_modify,
+            original_task=(hook._view(original_task) if hook.requires_original_task else None),
+            modified_task=hook._view(modified_task),
+        )
+        if captured is None:
+            # the abandoned hook may still modify the task, carry on with a copy
+            modified_task = use_json(task_line)
+            continue
+        ret, out = captured
+        emitted, hook_feedback = split_output(out)
+        feedback.extend(hook_feedback)
+        if emitted is not None:
+            task_line = emitted
+            emitted_task = use_json(emitted)
+            if changed is not None:
+                # the next hooks see the changes of this one as modifications too
+                changed |= changed_fields(modified_task, emitted_task)
+            modified_task = emitted_task
+        if ret:
+            _emit(task_line, feedback)
+            return 1
+
+    _emit(task_line, feedback)
+    return 0
+
+
+class _ThreadStdout(io.TextIOBase):
+    """Standard output that keeps what each of the registered threads prints separately.
+
+    redirect_stdout replaces sys.stdout for all the threads at once, so it can't capture the
+    output of hooks that run concurrently. Threads that aren't registered print to the wrapped
+    stream.
+    """
+
+    def __init__(self, stream: TextIO):
+        super().__init__()
+        self.stream = stream
+        self._buffers: Dict[int, io.StringIO] = {}
+
+    def register(self) -> io.StringIO:
+        """Collect what the calling thread prints from now on in the returned buffer."""
+        buf = io.StringIO()
+        self._buffers[threading.get_ident()] = buf
+        return buf
+
+    def unregister(self):
+        self._buffers.pop(threading.get_ident(), None)
+
+    @property
+    def busy(self) -> bool:
+        """True if any of the registered threads is still running."""
+        return bool(self._buffers)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:  # type: ignore
+        buf = self._buffers.get(threading.get_ident())
+        return (self.stream if buf is None else buf).write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _exit_budget() -> Optional[float]:
+    budget = get_config(exit_budget_envvar)
+    if budget is None:
+        return _default_exit_budget
+    return float(budget) if float(budget) > 0 else None
+
+
+def _timeout(hook: BaseHook) -> Optional[float]:
+    """Latency budget of the given hook in seconds, None if it can take as long as it wants."""
+    timeouts = get_config(timeouts_envvar)
+    if timeouts is not None:
+        if not isinstance(timeouts, dict):
+            raise RuntimeError(
+                f"Parsed value from {timeouts_envvar} doesn't contain a dict as expected but a"
+                f" {type(timeouts)}-> {timeouts}"
+            )
+        timeout = timeouts.get(hook.name())
+        if timeout is not None:
+            return float(timeout) if float(timeout) > 0 else None
+
+    return hook.timeout
+
+
+def _redirect_to_threads() -> Tuple[TextIO, _ThreadStdout]:
+    """Replace sys.stdout with a _ThreadStdout, return the original one along with it."""
+    orig_stdout = sys.stdout
+    stdout = (
+        orig_stdout if isinstance(orig_stdout, _ThreadStdout) else _ThreadStdout(orig_stdout)
+    )
+    sys.stdout = stdout
+    return orig_stdout, stdout
+
+
+def _restore_stdout(orig_stdout: TextIO, stdout: _ThreadStdout):
+    if not stdout.busy:
+        sys.stdout = orig_stdout
+    # otherwise keep discarding what the abandoned hooks print, instead of printing it late
+
+
+def _capture_within(
+    timeout: Optional[float], fn: Callable[..., Any], *args, **kargs
+) -> Optional[Tuple[int, List[str]]]:
+    """Like capture, but give up on the hook if it doesn't return within timeout seconds.
+
+    :return: None if the hook overran its timeout
+    """
+    if timeout is None:
+        return capture(fn, *args, **kargs)
+
+    orig_stdout, stdout = _redirect_to_threads()
+    outcome: Dict[str, Any] = {}
+
+    def _run():
+        buf = stdout.register()
+        try:
+            outcome["ret"] = fn(*args, **kargs)
+        except BaseException as e:  # pylint: disable=W0703
+            outcome["exc"] = e
+        finally:
+            stdout.unregister()
+            outcome["out"] = buf.getvalue()
+
+    # a daemon thread, so that a hook that overran doesn't keep the process
+    thread = threading.Thread(target=_run, name="tw-hooks-watchdog", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    _restore_stdout(orig_stdout, stdout)
+    if thread.is_alive():
+        return None
+    if "exc" in outcome:
+        raise outcome["exc"]
+
+    return (1 if outcome["ret"] else 0), outcome["out"].splitlines()
+
+
+def _log_overrun(hook: BaseHook, timeout: Optional[float], action: str):
+    # straight to the original standard output, sys.stdout may still be a _ThreadStdout
+    stream = sys.stdout.stream if isinstance(sys.stdout, _ThreadStdout) else sys.stdout
+    print(f"[{hook.name()}] Didn't finish within {timeout:g}s, {action}", file=stream)
+
+
+def _record_outcome(
+    breaker: Optional[CircuitBreaker], hook: BaseHook, failed: bool, elapsed_ms: float
+):
+    if breaker is None:
+        return
+    message = breaker.record(hook.name(), failed=failed, elapsed_ms=elapsed_ms)
+    if message is not None:
+        stream = sys.stdout.stream if isinstance(sys.stdout, _ThreadStdout) else sys.stdout
+        print(message, file=stream)
+
+
+def _call_hook(
+    hook: BaseHook,
+    event: str,
+    hook_lines: List[str],
+    breaker: Optional[CircuitBreaker],
+    fn: Callable[..., Any],
+    *args,
+    **kargs,
+) -> Optional[Tuple[int, List[str]]]:
+    """Call the given method of the hook within its timeout, and measure it.
+
+    :return: The return code and the output of the hook, None if it overran its timeout
+    """
+    timeout = _timeout(hook)
+    start = time.perf_counter()
+    try:
+        with instrument(hook.name(), event, hook_lines) as hook_invocation:
+            captured = _capture_within(timeout, fn, *args, **kargs)
+            hook_invocation.done(_timed_out if captured is None else captured[0])
+    except BaseException:
+        _record_outcome(breaker, hook, True, (time.perf_counter() - start) * 1000)
+        raise
+
+    _record_outcome(breaker, hook, captured is None, (time.perf_counter() - start) * 1000)
+    if captured is None:
+        action = "skipping it" if event == "on-launch" else "passing the task through"
+        _log_overrun(hook, timeout, action)
+    return captured
+
+
+def _run_on_exit(
+    hook: OnExitHook,
+    hook_input: Any,
+    stdin_lines: List[str],
+    stdout: _ThreadStdout,
+    outcome: Dict[str, Any],
+    in_parallel: bool,
+):
+    # pylint: disable=W0212
+    buf = stdout.register()
+    start = time.perf_counter()
+    try:
+        with instrument(
+            hook.name(), "on-exit", stdin_lines, measure_peak=not in_parallel
+        ) as hook_invocation:
+            if hook.streams_tasks():
+                tasks = map(hook._view, iter_tasks(hook_input))
+                ret = hook._on_exit_iter(tasks)
+            else:
+                if hook.task_view:
+                    hook_input = [hook._view(task) for task in hook_input]
+                ret = hook._on_exit(hook_input)
+            outcome["ret"] = hook_invocation.done(ret)
+    except BaseException as e:  # pylint: disable=W0703
+        outcome["exc"] = e
+    finally:
+        stdout.unregister()
+        outcome["ms"] = (time.perf_counter() - start) * 1000
+        outcome["out"] = buf.getvalue()
+        if isinstance(hook_input, GeneratorType):
+            # skip the rest of the standard input, if the hook stopped reading early
+            hook_input.close()
+
+
+def _dispatch_on_exit(
+    hooks: Sequence[OnExitHook],
+    stdin_lines: Optional[List[str]],
+    invocation: AnyInvocation,
+    breaker: Optional[CircuitBreaker] = None,
+) -> int:
+    """Run the on-exit hooks concurrently.
+
+    :param stdin_lines: None to stream the standard input to the single, streaming, hook
+    """
+    hook_inputs: List[Any]
+    if stdin_lines is None:
+        # read the tasks as the hook consumes them, never hold all of them in memory
+        hook_inputs = [iter_stdin_lines()]
+        stdin_lines = []
+    else:
+        # streaming hooks decode the lines themselves, one at a time
+        streaming = [hook.streams_tasks() for hook in hooks]
+        tasks = [] if all(streaming) else stdin_lines_to_json(stdin_lines)
+        # hand a copy to each hook, they are not supposed to modify the tasks anyway
+        hook_inputs = [stdin_lines if s else list(tasks) for s in streaming]
+    invocation.parsed()
+    budget = _exit_budget()
+
+    orig_stdout, stdout = _redirect_to_threads()
+    outcomes: List[Dict[str, Any]] = [{} for _ in hooks]
+    threads = [
+        # daemon threads, so that hooks that run out of their budget don't keep the process
+        threading.Thread(
+            target=_run_on_exit,
+            args=(hook, hook_input, stdin_lines, stdout, outcome, len(hooks) > 1),
+            name=f"tw-hooks-{hook.name()}",
+            daemon=True,
+        )
+        for hook, hook_input, outcome in zip(hooks, hook_inputs, outcomes)
+    ]
+    # each hook gets the shortest of its own timeout and of the budget of all of them
+    timeouts: List[Optional[float]] = []
+    for hook in hooks:
+        limits = [t for t in (_timeout(hook), budget) if t is not None]
+        timeouts.append(min(limits) if limits else None)
+    for thread in threads:
+        thread.start()
+    start = time.monotonic()
+    for thread, timeout in zip(threads, timeouts):
+        thread.join(None if timeout is None else max(0.0, start + timeout - time.monotonic()))
+
+    _restore_stdout(orig_stdout, stdout)
+
+    # print the output of the hooks in their order, regardless of which one finished first
+    ret = 0
+    exc: Optional[BaseException] = None
+    for hook, thread, outcome, timeout in zip(hooks, threads, outcomes, timeouts):
+        if thread.is_alive():
+            _log_overrun(hook, timeout, "skipping it")
+            _record_outcome(breaker, hook, True, (time.monotonic() - start) * 1000)
+            continue
+        stdout.stream.write(outcome["out"])
+        _record_outcome(breaker, hook, "exc" in outcome, outcome["ms"])
+        if "exc" in outcome:
+            exc = exc or outcome["exc"]
+        elif outcome["ret"]:
+            ret = 1
+
+    if exc is not None:
+        raise exc
+
+    return ret
+
+
+def _dispatch_on_launch(
+    hooks: Sequence[OnLaunchHook], breaker: Optional[CircuitBreaker] = None
+) -> int:
+    # pylint: disable=W0212
+    for hook in hooks:
+        captured = _call_hook(hook, "on-launch", [], breaker, hook._on_launch)
+        if captured is None:
+            continue
+        ret, out = captured
+        _emit(None, out)
+        if ret:
+            return 1
+
+    return 0
+
+
+def dispatch(
+    event: str, hooks: Sequence[HookSpec], stdin_lines: Optional[List[str]] = None
+) -> int:
+    """Run the given hooks for the given event, e.g., "on-add", in the order specified.
+
+    Mirror what Taskwarrior does when it calls the hook scripts one after the other: the task
+    emitted by a hook is the input of the next one and processing stops at the first hook that
+    returns a non-zero exit code.
+
+    :param event: Shim prefix of the event to dispatch, e.g., "on-modify"
+    :param hooks: (module, class name) pairs of the hooks to run
+    :param stdin_lines: Lines that Taskwarrior passed to the hook. Read from the standard input
+                        if not given
+    :return: Exit code for the shim. 0 if all the hooks succeeded, 1 otherwise
+    """
+    Base = _event_to_base_hook.get(event)
+    if Base is None:
+        raise RuntimeError(
+            f"Unknown hook event {event}, expected one of {list(_event_to_base_hook)}"
+        )
+
+    hook_objs = []
+    for spec in hooks:
+        try:
+            hook_obj = load_hook(spec)
+        except ModuleNotFoundError:
+            print(f"Can't import {spec[1]} hook")
+            continue
+        if not isinstance(hook_obj, Base):
+            raise RuntimeError(f"{spec[1]} can't handle the {event} event")
+        hook_objs.append(hook_obj)
+
+    breaker = circuit_breaker.from_config()
+    if breaker is not None:
+        # bypassed until their cooldown is over, see tw_hooks.circuit_breaker
+        hook_objs = [hook for hook in hook_objs if breaker.allow(hook.name())]
+    try:
+        return _dispatch(Base, event, hook_objs, stdin_lines, breaker)
+    finally:
+        if breaker is not None:
+            breaker.save()
+
+
+def _dispatch(
+    Base: Type[BaseHook],
+    event: str,
+    hook_objs: List[Any],
+    stdin_lines: Optional[List[str]],
+    breaker: Optional[CircuitBreaker],
+) -> int:
+    if not Base.require_stdin():
+        with instrument("dispatcher", event) as invocation:
+            return invocation.done(_dispatch_on_launch(hook_objs, breaker))
+
+    if stdin_lines is None:
+        if Base is OnExitHook and len(hook_objs) == 1 and hook_objs[0].streams_tasks():
+            with instrument("dispatcher", event) as invocation:
+                return invocation.done(_dispatch_on_exit(hook_objs, None, invocation, breaker))
+        stdin_lines = parse_stdin_lines()
+
+    with instrument("dispatcher", event, stdin_lines) as invocation:
+        if Base is OnAddHook:
+            ret = _dispatch_on_add(hook_objs, stdin_lines, invocation, breaker)
+        elif Base is OnModifyHook:
+            ret = _dispatch_on_modify(hook_objs, stdin_lines, invocation, breaker)
+        else:
+            ret = _dispatch_on_exit(hook_objs, stdin_lines, invocation, breaker)
+        return invocation.done(ret)
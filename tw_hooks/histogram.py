@@ -0,0 +1,72 @@
+"""Count timestamps per day, with NumPy for large inputs if it's installed.
+
+Importing NumPy takes longer than a hook usually runs, so it's only used once there are enough
+timestamps for the vectorized pass to make up for it, or if it's already imported, e.g., in the
+daemon. The standard library fallback gives the same results.
+"""
+import sys
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence, cast
+
+# Below this many timestamps, importing NumPy (~90ms) costs more than it saves: the fallback
+# counts 100k timestamps in ~15ms, NumPy in ~3ms
+_NUMPY_MIN_SIZE = 500_000
+
+
+def day_boundaries(n_days: int, first_day: Optional[date] = None) -> List[int]:
+    """Local midnights, in seconds since the epoch, of n_days consecutive days and of the next.
+
+    Days aren't always 86400 seconds long, e.g., when the clocks change.
+
+    >>> b = day_boundaries(2, date(2022, 5, 28))
+    >>> len(b), b[2] - b[1] == b[1] - b[0] == 86400
+    (3, True)
+    """
+    if first_day is None:
+        first_day = date.today()
+    midnight = datetime(first_day.year, first_day.month, first_day.day)
+    return [int((midnight + timedelta(days=i)).timestamp()) for i in range(n_days + 1)]
+
+
+def _numpy():
+    try:
+        import numpy  # type: ignore # pylint: disable=C0415
+    except ImportError:
+        return None
+    return numpy
+
+
+def _counts_numpy(numpy, timestamps: "array[int]", boundaries: Sequence[int]) -> List[int]:
+    ts = numpy.frombuffer(timestamps, dtype=numpy.int64)
+    ts = ts[(ts >= boundaries[0]) & (ts < boundaries[-1])]
+    bins = numpy.searchsorted(numpy.asarray(boundaries, dtype=numpy.int64), ts, side="right")
+    counts = numpy.bincount(bins - 1, minlength=len(boundaries) - 1)
+    return cast(List[int], counts.tolist())
+
+
+def _counts_python(timestamps: "array[int]", boundaries: Sequence[int]) -> List[int]:
+    counts = [0] * (len(boundaries) - 1)
+    start, end = boundaries[0], boundaries[-1]
+    for ts in timestamps:
+        if start <= ts < end:
+            counts[bisect_right(boundaries, ts) - 1] += 1
+    return counts
+
+
+def counts_per_bin(timestamps: "array[int]", boundaries: Sequence[int]) -> List[int]:
+    """Number of timestamps in each [boundaries[i], boundaries[i + 1]) bin.
+
+    :param timestamps: Seconds since the epoch, as an array('q')
+    :param boundaries: Sorted edges of the bins, timestamps outside them aren't counted
+
+    >>> counts_per_bin(array("q", [5, 10, 12, 19, 20, 30]), [10, 15, 20])
+    [2, 1]
+    """
+    if "numpy" in sys.modules or len(timestamps) >= _NUMPY_MIN_SIZE:
+        numpy = _numpy()
+        if numpy is not None:
+            return _counts_numpy(numpy, timestamps, boundaries)
+
+    return _counts_python(timestamps, boundaries)
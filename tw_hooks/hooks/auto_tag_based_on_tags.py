@@ -1,13 +1,88 @@
-import json
 import re
-from typing import cast
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union, cast
 
 from tw_hooks import OnAddHook, OnModifyHook
-from tw_hooks.types import MapOfTags, TaskT
-from tw_hooks.utils import get_json_from_environ
+from tw_hooks.config import get_config, get_derived
+from tw_hooks.json_codec import dumps
+from tw_hooks.memo import get_memo
+from tw_hooks.types import MapOfExtraTags, TaskLike
 
 envvar = "TW_AUTO_TAG_MAPPINGS"
 
+_regex_special_chars = frozenset(".^$*+?{}[]\\|()")
+
+# Backreferences would point to the wrong group once the pattern is part of an alternation
+_backreference = re.compile(r"\\\d|\(\?P=")
+
+
+class _TagPatternMatcher:
+    """Find all the patterns of a mapping that match a tag.
+
+    Patterns without any special characters are plain prefixes (the patterns are applied with
+    re.match) and are looked up in a dict by the prefixes of the tag. The rest are compiled into
+    a single alternation, which tells in one call whether any of them matches and which is the
+    first one to do so. Only the patterns after that one have to be tried separately.
+
+    >>> matcher = _TagPatternMatcher(["git", "github.*", "python", r"py\\d", ".*hub"])
+    >>> matcher.match("github-actions")
+    [0, 1, 4]
+    >>> matcher.match("py3")
+    [3]
+    >>> matcher.match("rust")
+    []
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self._prefixes: Dict[str, List[int]] = {}
+        self._regexes: List[re.Pattern] = []
+        self._regex_idxs: List[int] = []
+        for idx, pattern in enumerate(patterns):
+            if _regex_special_chars.isdisjoint(pattern):
+                self._prefixes.setdefault(pattern, []).append(idx)
+            else:
+                self._regexes.append(re.compile(pattern))
+                self._regex_idxs.append(idx)
+
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._prefixes})
+
+        self._combined: Optional[re.Pattern] = None
+        if self._regexes and not any(_backreference.search(r.pattern) for r in self._regexes):
+            try:
+                self._combined = re.compile(
+                    "|".join(f"(?P<p{i}>{r.pattern})" for i, r in enumerate(self._regexes))
+                )
+            except re.error:
+                # e.g., duplicate named groups across the patterns
+                self._combined = None
+
+    def match(self, tag: str) -> List[int]:
+        """Return the indices of all the patterns that match the given tag, in order."""
+        idxs = [
+            idx
+            for length in self._prefix_lengths
+            if length <= len(tag)
+            for idx in self._prefixes.get(tag[:length], ())
+        ]
+
+        regexes_start = 0
+        if self._combined is not None:
+            m = self._combined.match(tag)
+            if m is None:
+                return sorted(idxs)
+            first = int(m.lastgroup[1:])  # type: ignore
+            idxs.append(self._regex_idxs[first])
+            regexes_start = first + 1
+
+        for i in range(regexes_start, len(self._regexes)):
+            if self._regexes[i].match(tag):
+                idxs.append(self._regex_idxs[i])
+
+        return sorted(idxs)
+
+
+def _decode_steps(value: Any) -> List[Tuple[int, List[str]]]:
+    return [(int(idx), [str(tag) for tag in new_tags]) for idx, new_tags in value]
+
 
 class AutoTagBasedOnTags(OnModifyHook, OnAddHook):
     """
@@ -18,31 +93,83 @@ class AutoTagBasedOnTags(OnModifyHook, OnAddHook):
         TW_AUTO_TAG_MAPPINGS='{"python": "programming", "cpp": "programming", "github.*": "programming"}'
     """
 
-    def __init__(self, tag_mappings=get_json_from_environ(envvar)):
+    requires_original_task = False
+    watched_fields = frozenset({"tags"})
+
+    def __init__(self, tag_mappings: Optional[MapOfExtraTags] = None):
+        if tag_mappings is None:
+            tag_mappings = cast(Optional[MapOfExtraTags], get_config(envvar))
         if tag_mappings is None:
             tag_mappings = {}
-        self._tag_mappings = cast(MapOfTags, tag_mappings)
+        self._tag_mappings = cast(MapOfExtraTags, tag_mappings)
+
+        self._patterns = list(self._tag_mappings.keys())
+        self._extra_tags: List[List[str]] = [
+            self._as_list(self._tag_mappings[pattern]) for pattern in self._patterns
+        ]
+        self._memo = get_memo(AutoTagBasedOnTags, self._tag_mappings, _decode_steps)
+        self._loaded_matcher: Optional[_TagPatternMatcher] = None
+        if self._memo is None:
+            # otherwise it's only loaded for the tags that aren't memoized yet
+            self._matcher()
+
+    def _matcher(self) -> _TagPatternMatcher:
+        if self._loaded_matcher is None:
+            self._loaded_matcher = get_derived(_TagPatternMatcher, self._patterns)
+        return self._loaded_matcher
+
+    @staticmethod
+    def _as_list(extra_tags: Union[str, Sequence[str]]) -> List[str]:
+        return [extra_tags] if isinstance(extra_tags, str) else list(extra_tags)
+
+    def _extra_tag_steps(self, tags: Sequence[str]) -> List[Tuple[int, List[str]]]:
+        """Return the (pattern index, extra tags) to apply to the given tags, in order."""
+        matcher = self._matcher()
+        present = dict.fromkeys(tags)  # ordered set of the tags of the task
+        applied: Set[int] = set()
+        steps = []
+        # tags that haven't been matched against the patterns yet. Extra tags added by a
+        # pattern may in turn match other patterns
+        unchecked = list(present)
+        while unchecked:
+            idxs = {idx for tag in unchecked for idx in matcher.match(tag)} - applied
+            applied.update(idxs)
+            unchecked = []
+            for idx in sorted(idxs):
+                new_tags = [tag for tag in self._extra_tags[idx] if tag not in present]
+                if not new_tags:
+                    continue
+
+                present.update(dict.fromkeys(new_tags))
+                unchecked.extend(new_tags)
+                steps.append((idx, new_tags))
+
+        return steps
 
-    def _check_and_apply_extra_tags(self, task: TaskT):
+    def _check_and_apply_extra_tags(self, task: TaskLike):
         if "tags" not in task:
             return
 
         tags = task["tags"]
-        old_tags = list(tags)
-        for tag_pattern in self._tag_mappings.keys():
-            if not any(re.match(tag_pattern, tag) for tag in tags):
-                continue
+        if self._memo is None:
+            steps = self._extra_tag_steps(tags)
+        else:
+            cached = self._memo.get(tags)
+            if cached is None:
+                steps = self._extra_tag_steps(tags)
+                self._memo.put(tags, steps)
+            else:
+                steps = cached
 
-            new_tags = self._tag_mappings[tag_pattern]
+        for idx, new_tags in steps:
             tags.extend(new_tags)
-            if set(old_tags) != set(tags):
-                self.log(f"Applying extra tags (due to pattern {tag_pattern}): {new_tags}")
+            self.log(f"Applying extra tags (due to pattern {self._patterns[idx]}): {new_tags}")
 
-    def _on_modify(self, original_task: TaskT, modified_task: TaskT):
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
         del original_task
         self._check_and_apply_extra_tags(modified_task)
-        print(json.dumps(modified_task))
+        print(dumps(modified_task))
 
-    def _on_add(self, added_task: TaskT):
+    def _on_add(self, added_task: TaskLike):
         self._check_and_apply_extra_tags(added_task)
-        print(json.dumps(added_task))
+        print(dumps(added_task))
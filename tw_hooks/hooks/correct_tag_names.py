@@ -1,12 +1,158 @@
-import json
-from typing import cast
+import fnmatch
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
 
 from tw_hooks import OnModifyHook
 from tw_hooks.base_hooks.on_add_hook import OnAddHook
-from tw_hooks.types import MapOfTags, TaskT
-from tw_hooks.utils import get_json_from_environ
+from tw_hooks.config import get_config, get_derived
+from tw_hooks.json_codec import dumps
+from tw_hooks.memo import get_memo
+from tw_hooks.types import MapOfTags, TaskLike
 
 envvar = "TW_CORRECT_TAG_MAPPINGS"
+ignore_case_envvar = "TW_CORRECT_TAG_IGNORE_CASE"
+
+_glob_special_chars = frozenset("*?[")
+
+
+class _CorrectionTable:
+    """Resolve each tag to its final correction in a single lookup.
+
+    Keys with any of *, ? or [ are glob patterns, e.g., "movie*", the rest are looked up as they
+    are. Corrections are applied transitively, e.g., with wor -> work and work -> job, wor is
+    corrected to job directly. The resolved correction of every tag is cached.
+
+    >>> table = _CorrectionTable({"wor": "work", "work": "job", "mov*": "movie"})
+    >>> [table.resolve(tag) for tag in ["wor", "work", "movies", "movie", "fun"]]
+    ['job', 'job', 'movie', 'movie', 'fun']
+    >>> table.correct(["wor", "movies", "job", "fun"])
+    (['job', 'movie', 'fun'], [('wor', 'job'), ('movies', 'movie')])
+    >>> _CorrectionTable({"a": "b", "b": "c", "c": "a"})
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Tag corrections form a cycle: a -> b -> c -> a
+    """
+
+    def __init__(self, mappings: MapOfTags, ignore_case: bool = False):
+        self._ignore_case = ignore_case
+        self._exact: Dict[str, str] = {}
+        globs: List[Tuple[str, str]] = []
+        for bad_tag, good_tag in mappings.items():
+            if _glob_special_chars.isdisjoint(bad_tag):
+                self._exact[self._fold(bad_tag)] = good_tag
+            else:
+                globs.append((bad_tag, good_tag))
+
+        # first matching pattern wins, in the order they were specified
+        self._glob_targets = [good_tag for _, good_tag in globs]
+        self._globs: Optional[re.Pattern] = None
+        if globs:
+            self._globs = re.compile(
+                "|".join(
+                    f"(?P<g{i}>{fnmatch.translate(bad_tag)})"
+                    for i, (bad_tag, _) in enumerate(globs)
+                ),
+                re.IGNORECASE if ignore_case else 0,
+            )
+
+        self._resolved: Dict[str, str] = {}
+        for bad_tag in self._exact:
+            cycle = self._follow(bad_tag)[1]
+            if cycle:
+                raise RuntimeError(f"Tag corrections form a cycle: {' -> '.join(cycle)}")
+
+    def _fold(self, tag: str) -> str:
+        return tag.casefold() if self._ignore_case else tag
+
+    def _step(self, tag: str) -> Optional[str]:
+        """Correction of the tag according to a single mapping, None if there's none."""
+        good_tag = self._exact.get(self._fold(tag))
+        if good_tag is None and self._globs is not None:
+            m = self._globs.match(tag)
+            if m is not None:
+                good_tag = self._glob_targets[int(m.lastgroup[1:])]  # type: ignore
+
+        return good_tag
+
+    def _follow(self, tag: str) -> Tuple[str, List[str]]:
+        """Apply the mappings to the tag until it doesn't change anymore.
+
+        Return the final tag, and the tags that form a cycle if the mappings lead to one. The
+        final tag of every tag along the way is cached.
+        """
+        chain = [tag]
+        in_chain = {tag}
+        current = tag
+        while True:
+            resolved = self._resolved.get(current)
+            if resolved is not None:
+                current = resolved
+                break
+
+            good_tag = self._step(current)
+            if good_tag is None or good_tag == current:
+                break
+            if good_tag in in_chain:
+                return tag, chain[chain.index(good_tag) :] + [good_tag]
+
+            chain.append(good_tag)
+            in_chain.add(good_tag)
+            current = good_tag
+
+        for t in chain:
+            self._resolved[t] = current
+        return current, []
+
+    def resolve(self, tag: str) -> str:
+        """Return the final correction of the given tag, the tag itself if it's correct."""
+        resolved = self._resolved.get(tag)
+        if resolved is None:
+            resolved, cycle = self._follow(tag)
+            if cycle:
+                # a cycle that only glob patterns lead to, leave the tag as it is
+                self._resolved[tag] = tag
+
+        return resolved
+
+    def correct(self, tags: Sequence[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """Correct the given tags and drop any duplicates.
+
+        Return the corrected tags and the (bad tag, good tag) corrections that were applied.
+        """
+        out: List[str] = []
+        seen = set()
+        corrections = []
+        for tag in tags:
+            good_tag = self.resolve(tag)
+            if good_tag != tag:
+                corrections.append((tag, good_tag))
+            if good_tag not in seen:
+                seen.add(good_tag)
+                out.append(good_tag)
+
+        return out, corrections
+
+
+def _apply_corrections(
+    tags: Sequence[str], mapping: Dict[str, str]
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Same as _CorrectionTable.correct, given the correction of every tag that has one.
+
+    >>> _apply_corrections(["wor", "job", "movies", "wor"], {"wor": "job", "movies": "movie"})
+    (['job', 'movie'], [('wor', 'job'), ('movies', 'movie'), ('wor', 'job')])
+    """
+    out = list(dict.fromkeys(mapping.get(tag, tag) for tag in tags))
+    corrections = [(tag, mapping[tag]) for tag in tags if tag in mapping]
+    return out, corrections
+
+
+def _decode_corrections(value: Any) -> Dict[str, str]:
+    return {str(bad_tag): str(good_tag) for bad_tag, good_tag in value.items()}
+
+
+def _build_table(config: Tuple[MapOfTags, bool]) -> _CorrectionTable:
+    mappings, ignore_case = config
+    return _CorrectionTable(mappings, ignore_case=ignore_case)
 
 
 class CorrectTagNames(OnModifyHook, OnAddHook):
@@ -14,32 +160,60 @@ class CorrectTagNames(OnModifyHook, OnAddHook):
 
     To specify a mapping, add something like this to your shell rc file:
 
-        TW_CORRECT_TAG_MAPPINGS='{"movies": "movie", "wor": "work"}'
+        TW_CORRECT_TAG_MAPPINGS='{"movies": "movie", "wor": "work", "proj*": "project"}'
+
+    Keys may be glob patterns and corrections are applied transitively. Set
+    TW_CORRECT_TAG_IGNORE_CASE=1 to also correct tags that differ from the keys only in case.
     """
 
-    def __init__(self, tag_mappings=get_json_from_environ(envvar)):
+    requires_original_task = False
+    watched_fields = frozenset({"tags"})
+
+    def __init__(
+        self, tag_mappings: Optional[MapOfTags] = None, ignore_case: Optional[bool] = None
+    ):
+        if tag_mappings is None:
+            tag_mappings = cast(Optional[MapOfTags], get_config(envvar))
         if tag_mappings is None:
             tag_mappings = {}
+        if ignore_case is None:
+            val = get_config(ignore_case_envvar, raw=True)
+            ignore_case = val is True or str(val).lower() in ("1", "true", "yes")
         self._tag_mappings = cast(MapOfTags, tag_mappings)
+        self._table_config = (self._tag_mappings, ignore_case)
+        self._memo = get_memo(CorrectTagNames, self._table_config, _decode_corrections)
+        self._loaded_table: Optional[_CorrectionTable] = None
+        if self._memo is None:
+            # otherwise it's only loaded for the tags that aren't memoized yet
+            self._table()
 
-    def _correct_tags(self, task: TaskT):
+    def _table(self) -> _CorrectionTable:
+        if self._loaded_table is None:
+            self._loaded_table = get_derived(_build_table, self._table_config)
+        return self._loaded_table
+
+    def _correct_tags(self, task: TaskLike):
         if "tags" not in task:
             return
 
-        tags = task["tags"]
-        for bad_tag in self._tag_mappings.keys():
-            try:
-                bad_idx = tags.index(bad_tag)
-                tags[bad_idx] = self._tag_mappings[bad_tag]
-                self.log(f"Correcting tag: {bad_tag} -> {self._tag_mappings[bad_tag]}")
-            except ValueError:
-                pass
+        if self._memo is None:
+            tags, corrections = self._table().correct(task["tags"])
+        else:
+            mapping = self._memo.get(task["tags"])
+            if mapping is None:
+                mapping = dict(self._table().correct(task["tags"])[1])
+                self._memo.put(task["tags"], mapping)
+            tags, corrections = _apply_corrections(task["tags"], mapping)
+
+        for bad_tag, good_tag in corrections:
+            self.log(f"Correcting tag: {bad_tag} -> {good_tag}")
+        task["tags"] = tags
 
-    def _on_modify(self, original_task: TaskT, modified_task: TaskT):
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
         del original_task
         self._correct_tags(modified_task)
-        print(json.dumps(modified_task))
+        print(dumps(modified_task))
 
-    def _on_add(self, added_task: TaskT):
+    def _on_add(self, added_task: TaskLike):
         self._correct_tags(added_task)
-        print(json.dumps(added_task))
+        print(dumps(added_task))
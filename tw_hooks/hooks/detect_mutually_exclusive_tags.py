@@ -1,14 +1,78 @@
-import json
-from typing import List, Set, cast
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, cast
 
 from tw_hooks import OnModifyHook
 from tw_hooks.base_hooks.on_add_hook import OnAddHook
-from tw_hooks.types import ListOfTagsList, Retcode, TaskT
-from tw_hooks.utils import get_json_from_environ
+from tw_hooks.config import get_config, get_derived
+from tw_hooks.json_codec import dumps
+from tw_hooks.memo import get_memo
+from tw_hooks.types import ListOfTagsList, Retcode, TaskLike
 
 envvar = "TW_INCOMPATIBLE_TAG_SETS"
 
 
+class _ExclusiveTagSetsIndex:
+    """Find all the configured tag sets that are contained in the tags of a task.
+
+    Each tag maps to a bitmask of the sets that contain it. For every set, the number of its
+    tags that the task has is kept in bit-sliced counters, i.e., bit i of counters[j] is bit j
+    of the count of set i. Adding a tag is a ripple-carry addition of its bitmask, and the
+    conflicting sets are those whose count equals their size, found with a few XORs/ANDs. This
+    way only the sets that contain the task's tags are touched and the cost doesn't depend on
+    the number of configured sets.
+
+    >>> index = _ExclusiveTagSetsIndex([["work", "movie"], ["work", "freetime", "movie"]])
+    >>> [sorted(tag_set) for tag_set in index.conflicts(["work", "movie"])]
+    [['movie', 'work']]
+    >>> [sorted(tag_set) for tag_set in index.conflicts(["freetime", "movie", "work", "work"])]
+    [['movie', 'work'], ['freetime', 'movie', 'work']]
+    >>> index.conflicts(["work", "freetime"])
+    []
+    """
+
+    def __init__(self, tag_sets: Iterable[Iterable[str]]):
+        # an empty set can't be violated by any combination of tags, ignore it
+        self._tag_sets: List[FrozenSet[str]] = [frozenset(s) for s in tag_sets if s]
+        self._masks: Dict[str, int] = {}
+        for i, tag_set in enumerate(self._tag_sets):
+            for tag in tag_set:
+                self._masks[tag] = self._masks.get(tag, 0) | (1 << i)
+
+        max_size = max((len(tag_set) for tag_set in self._tag_sets), default=0)
+        self._width = max_size.bit_length()
+        self._size_slices = [
+            sum(1 << i for i, tag_set in enumerate(self._tag_sets) if len(tag_set) >> j & 1)
+            for j in range(self._width)
+        ]
+
+    def conflicts(self, tags: Iterable[str]) -> List[FrozenSet[str]]:
+        """Return all the configured sets that are subsets of the given tags, in order."""
+        counters = [0] * self._width
+        touched = 0
+        for tag in set(tags):
+            carry = self._masks.get(tag, 0)
+            touched |= carry
+            for j in range(self._width):
+                counters[j], carry = counters[j] ^ carry, counters[j] & carry
+                if not carry:
+                    break
+
+        matched = touched
+        for counter, size_slice in zip(counters, self._size_slices):
+            matched &= ~(counter ^ size_slice)
+
+        out = []
+        while matched:
+            lowest = matched & -matched
+            out.append(self._tag_sets[lowest.bit_length() - 1])
+            matched ^= lowest
+
+        return out
+
+
+def _decode_conflicts(value: Any) -> List[FrozenSet[str]]:
+    return [frozenset(str(tag) for tag in tag_set) for tag_set in value]
+
+
 class DetectMutuallyExclusiveTags(OnModifyHook, OnAddHook):
     """
     Inspect the list of tags in the added/modified tasks and see whether the user has specified an incompatible combination of tags.
@@ -19,7 +83,12 @@ class DetectMutuallyExclusiveTags(OnModifyHook, OnAddHook):
         TW_INCOMPATIBLE_TAG_SETS='[("projectideas", "freetime")]'
     """
 
-    def __init__(self, tag_sets=get_json_from_environ(envvar)):
+    requires_original_task = False
+    watched_fields = frozenset({"tags"})
+
+    def __init__(self, tag_sets: Optional[ListOfTagsList] = None):
+        if tag_sets is None:
+            tag_sets = cast(Optional[ListOfTagsList], get_config(envvar))
         if tag_sets is None:
             tag_sets = []
         if not isinstance(tag_sets, list):
@@ -27,27 +96,48 @@ class DetectMutuallyExclusiveTags(OnModifyHook, OnAddHook):
                 f"Parsed value from {envvar} doesn't contain a  list as expected but a"
                 f" {type(tag_sets)}-> {tag_sets}"
             )
-        self._tag_sets: List[Set[str]] = [set(li) for li in cast(ListOfTagsList, tag_sets)]
+        self._tag_sets = tag_sets
+        self._memo = get_memo(DetectMutuallyExclusiveTags, tag_sets, _decode_conflicts)
+        self._loaded_index: Optional[_ExclusiveTagSetsIndex] = None
+        if self._memo is None:
+            # otherwise it's only loaded for the tags that aren't memoized yet
+            self._index()
 
-    def _detect_incompatible_tags(self, task: TaskT) -> Retcode:
+    def _index(self) -> _ExclusiveTagSetsIndex:
+        if self._loaded_index is None:
+            self._loaded_index = get_derived(_ExclusiveTagSetsIndex, self._tag_sets)
+        return self._loaded_index
+
+    def _detect_incompatible_tags(self, task: TaskLike) -> Retcode:
         if "tags" not in task:
             return 0
 
-        tags = task["tags"]
-        for tag_set in self._tag_sets:
-            if tag_set.issubset(tags):
-                self.log(f"Can't use the following tags together -> {tag_set}")
-                return 1
+        if self._memo is None:
+            conflicts = self._index().conflicts(task["tags"])
+        else:
+            cached = self._memo.get(task["tags"])
+            if cached is None:
+                conflicts = self._index().conflicts(task["tags"])
+                self._memo.put(task["tags"], [sorted(tag_set) for tag_set in conflicts])
+            else:
+                conflicts = cached
+
+        for tag_set in conflicts:
+            # sorted, so that it reads the same whether the conflict was memoized or not
+            tags = ", ".join(repr(tag) for tag in sorted(tag_set))
+            self.log(f"Can't use the following tags together -> {{{tags}}}")
 
-        return 0
+        return 1 if conflicts else 0
 
-    def _on_modify(self, original_task: TaskT, modified_task: TaskT) -> Retcode:
+    def _on_modify(
+        self, original_task: Optional[TaskLike], modified_task: TaskLike
+    ) -> Retcode:
         del original_task
         ret = self._detect_incompatible_tags(modified_task)
-        print(json.dumps(modified_task))
+        print(dumps(modified_task))
         return ret
 
-    def _on_add(self, added_task: TaskT) -> Retcode:
+    def _on_add(self, added_task: TaskLike) -> Retcode:
         ret = self._detect_incompatible_tags(added_task)
-        print(json.dumps(added_task))
+        print(dumps(added_task))
         return ret
@@ -0,0 +1,40 @@
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from tw_hooks.base_hooks.on_exit_hook import OnExitHook
+from tw_hooks.task_index import TaskIndex
+from tw_hooks.types import TaskLike
+from tw_hooks.utils import get_task_dir
+
+
+class MaintainTaskIndex(OnExitHook):
+    """
+    Keep the SQLite index of the pending tasks, that other hooks can query, up to date.
+
+    The index is updated with the tasks that each command added or modified. This is done on
+    exit rather than on add/modify, since a later hook may still reject the task at that point.
+    See tw_hooks.task_index for the queries that it answers.
+
+    It writes to the index on every command, so it's only installed on request, e.g., with
+    install-hook-shims -r tw_hooks.hooks.maintain_task_index
+    """
+
+    task_view = True
+    installed_by_default = False
+
+    def __init__(self, task_dir: Optional[Union[str, Path]] = None):
+        if task_dir is None:
+            task_dir = get_task_dir()
+        self._index = TaskIndex.for_task_dir(task_dir)
+
+    def _on_exit_iter(self, added_modified_tasks: Iterator[TaskLike]):
+        pending_data = self._index.pending_data
+        if not pending_data.is_file():
+            self.log(f"Can't find pending.data file -> {pending_data}")
+            return 1
+
+        try:
+            self._index.refresh(added_modified_tasks)
+        finally:
+            self._index.close()
+        return 0
@@ -1,9 +1,10 @@
-import json
-import os
 import subprocess
+from typing import List, Optional, cast
 
 from tw_hooks import OnModifyHook
-from tw_hooks.types import Retcode, TaskT
+from tw_hooks.config import get_config
+from tw_hooks.json_codec import dumps
+from tw_hooks.types import Retcode, TaskLike
 
 envvar = "TW_I3STATUS_RS_DBUS_NAME"
 
@@ -19,16 +20,55 @@ class PostLatestSTartToI3Status(OnModifyHook):
         TW_I3STATUS_RS_DBUS_NAME=ActiveTaskwarriorTask
     """
 
-    def __init__(self, dbus_name=os.environ.get(envvar)):
+    requires_original_task = False
+    watched_fields = frozenset({"start", "description", "annotations"})
+
+    def __init__(
+        self,
+        dbus_name: Optional[str] = None,
+        busctl: str = "busctl",
+        blocking: bool = False,
+        timeout: float = 2.0,
+    ):
+        """Initialise the hook.
+
+        :param busctl: Executable to send the message with
+        :param blocking: Wait for i3status-rs to reply and report any errors. By default the
+                         message is handed to a detached busctl process, which doesn't wait for
+                         a reply, and the hook returns immediately
+        :param timeout: Upper limit, in seconds, for busctl to get the message through
+        """
+        if dbus_name is None:
+            dbus_name = cast(Optional[str], get_config(envvar, raw=True))
         self._dbus_name: str = dbus_name if dbus_name else ""
+        self._busctl = busctl
+        self._blocking = blocking
+        self._timeout = timeout
 
-    def _detect_start_of_task(self, task: TaskT) -> bool:
+    def _detect_start_of_task(self, task: TaskLike) -> bool:
         """Return True if task is marked as started, false otherwise
 
         I don't care whether the task was alredy started or not.
         """
         return "start" in task.keys()
 
+    def _busctl_cmd(self, task_desc: str) -> List[str]:
+        return [
+            self._busctl,
+            "--user",
+            f"--timeout={self._timeout:g}s",
+            f"--expect-reply={'yes' if self._blocking else 'no'}",
+            "call",
+            "i3.status.rs",
+            "/ActiveTaskwarriorTask",
+            "i3.status.rs",
+            "SetStatus",
+            "sss",
+            task_desc,
+            "tasks",
+            "Good",
+        ]
+
     def _post_to_dbus(self, task) -> Retcode:
         task_desc = f'{task["uuid"][:8]} | {task["description"]}'
         if "annotations" in task:
@@ -40,42 +80,43 @@ class PostLatestSTartToI3Status(OnModifyHook):
         # upper limit on the length of the string I'll be sending
         task_desc = task_desc[:200]
 
-        proc = subprocess.run(
-            [
-                "busctl",
-                "--user",
-                "call",
-                "i3.status.rs",
-                "/ActiveTaskwarriorTask",
-                "i3.status.rs",
-                "SetStatus",
-                "sss",
-                task_desc,
-                "tasks",
-                "Good",
-            ],
-            check=False,
-        )
+        # Don't fail this execution in any case. Updating the i3status is not that important.
+        cmd = self._busctl_cmd(task_desc)
+        if not self._blocking:
+            try:
+                # Own session and no inherited file descriptors, so that neither Taskwarrior nor
+                # the terminal wait for it
+                subprocess.Popen(  # pylint: disable=R1732
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+            except OSError as err:
+                self.log(f"Failed to send started task: {err}")
+            return 0
+
+        try:
+            proc = subprocess.run(
+                cmd, capture_output=True, timeout=self._timeout + 1, check=False
+            )
+        except (OSError, subprocess.TimeoutExpired) as err:
+            self.log(f"Failed to send started task: {err}")
+            return 0
 
         if proc.returncode != 0:
-            # Don't fail this execution. Updating the i3status is not that important.
-            if proc.stdout:
-                out = proc.stdout.decode("utf-8")
-            else:
-                out = ""
-            if proc.stderr:
-                err = proc.stderr.decode("utf-8")
-            else:
-                err = ""
-            self.log(f"Failed to send started task.\n\nstdout: {out}\n\nstderr: {err}")
+            stdout = proc.stdout.decode("utf-8", errors="replace")
+            stderr = proc.stderr.decode("utf-8", errors="replace")
+            self.log(f"Failed to send started task.\n\nstdout: {stdout}\n\nstderr: {stderr}")
 
         return 0
 
-    def _on_modify(self, original_task: TaskT, modified_task: TaskT):
+    def _on_modify(self, original_task: Optional[TaskLike], modified_task: TaskLike):
         del original_task
         ret = 0
         if self._detect_start_of_task(modified_task):
             ret = self._post_to_dbus(modified_task)
 
-        print(json.dumps(modified_task))
+        print(dumps(modified_task))
         return ret
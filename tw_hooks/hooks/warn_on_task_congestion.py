@@ -1,9 +1,29 @@
-import re
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Union
+from typing import Iterator, List, Optional, Sequence, Union, cast
 
 from tw_hooks.base_hooks.on_exit_hook import OnExitHook
+from tw_hooks.config import get_config
+from tw_hooks.histogram import counts_per_bin, day_boundaries
+from tw_hooks.pending_data import PendingDataIndex
+from tw_hooks.types import TaskLike
+from tw_hooks.utils import get_hooks_data_dir, get_task_dir
+
+fields_envvar = "TW_CONGESTION_DATE_FIELDS"
+horizon_envvar = "TW_CONGESTION_HORIZON_DAYS"
+
+
+def _day_filter(day: date, offset: int) -> str:
+    """How to refer to the given day in a Taskwarrior filter.
+
+    >>> [_day_filter(date(2022, 5, 28), offset) for offset in (0, 1, 2)]
+    ['today', 'tomorrow', '2022-05-28']
+    """
+    if offset == 0:
+        return "today"
+    if offset == 1:
+        return "tomorrow"
+    return day.isoformat()
 
 
 class WarnOnTaskCongestion(OnExitHook):
@@ -12,25 +32,54 @@ class WarnOnTaskCongestion(OnExitHook):
 
     By default this class will warn if there are multiple tasks that are due:today.
 
-    In the future the date field (due, scheduled) that will be used for this should be
-    configurable.
+    Set the date fields to check, e.g., ["due", "scheduled", "wait"], in
+    TW_CONGESTION_DATE_FIELDS and the number of days to check, starting from today, in
+    TW_CONGESTION_HORIZON_DAYS. All the fields are extracted in a single pass and the tasks of
+    each day are counted at once, however many days are checked.
+
+    pending.data is not parsed from scratch on every invocation, an index of it is kept under
+    the tw_hooks directory of the Taskwarrior directory instead (see PendingDataIndex).
     """
 
+    task_view = True
+
     def __init__(
         self,
-        task_dir: Union[str, Path] = Path.home() / ".task",
+        task_dir: Optional[Union[str, Path]] = None,
         date_field="due",
         warn_threshold=20,
+        date_fields: Optional[Sequence[str]] = None,
+        horizon_days: Optional[int] = None,
     ):
+        if task_dir is None:
+            task_dir = get_task_dir()
         self._task_dir = Path(task_dir)
         self._pending_data = self._task_dir / "pending.data"
 
-        self._date_field = date_field
-        self._date = "today"
-        self._re_pat = rf"({self._date_field}:\"\d+).*" + "]"
+        if date_fields is None:
+            date_fields = cast(Optional[List[str]], get_config(fields_envvar))
+        if date_fields is None:
+            date_fields = [date_field]
+        if not isinstance(date_fields, (list, tuple)):
+            raise RuntimeError(
+                f"Parsed value from {fields_envvar} doesn't contain a list as expected but a"
+                f" {type(date_fields)}-> {date_fields}"
+            )
+        if horizon_days is None:
+            horizon_days = int(get_config(horizon_envvar, raw=True) or 1)
+        if horizon_days < 1:
+            raise RuntimeError(f"{horizon_envvar} should be at least 1, got {horizon_days}")
+
+        self._date_fields = list(date_fields)
+        self._horizon_days = horizon_days
         self._warn_threshold = warn_threshold
+        self._index = PendingDataIndex(
+            pending_data=self._pending_data,
+            index_path=get_hooks_data_dir(self._task_dir) / "warn-on-task-congestion.index",
+            fields=self._date_fields,
+        )
 
-    def _on_exit(self, _):
+    def _on_exit_iter(self, added_modified_tasks: Iterator[TaskLike]):
         # I can't just invoke the taskwarrior executable. There's some sort of lock being
         # acquired so a potential subprocess.run call is blocking forever.
         # I have to manually parse pending.data
@@ -38,28 +87,19 @@ class WarnOnTaskCongestion(OnExitHook):
             self.log(f"Can't find pending.data file -> {self._pending_data}")
             return 1
 
-        # compute range of timestamps which corresponds to "today"
-        today = datetime.today()
-        today = datetime(year=today.year, month=today.month, day=today.day)
-        today_start = int(today.timestamp())
-        tomorrow_start = int((today + timedelta(days=1)).timestamp())
-
-        conts = self._pending_data.read_text(errors="ignore")
-        filter_ = f"{self._date_field}:{self._date}"
-        re_iter = re.finditer(pattern=self._re_pat, string=conts)
-
-        # count all the tasks whose selected date is today. If that surpasses our threshold
-        # break and issue warning
-        count = 0
-        for g in re_iter:
-            g_ = g.group(1)
-            ts = int(g_.split('"')[-1])
-            if today_start <= ts < tomorrow_start:
-                count += 1
+        self._index.refresh(added_modified_tasks)
+
+        # count the tasks of each day of the horizon, for each one of the date fields. Warn for
+        # every day that surpasses our threshold
+        today = date.today()
+        boundaries = day_boundaries(self._horizon_days, today)
+        for field, timestamps in self._index.timestamp_arrays().items():
+            counts = counts_per_bin(timestamps, boundaries)
+            for offset, count in enumerate(counts):
                 if count > self._warn_threshold:
+                    filter_ = f"{field}:{_day_filter(today + timedelta(days=offset), offset)}"
                     self.log(
                         f"Too many {filter_} tasks (threshold={self._warn_threshold})."
                         " Consider reducing them to avoid noise in your reports"
                     )
-                    break
         return 0
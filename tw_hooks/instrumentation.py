@@ -0,0 +1,185 @@
+"""Opt-in timing and memory measurements of every hook invocation.
+
+Set TW_HOOKS_STATS to 1 to append one JSON record per hook invocation to
+<task dir>/tw_hooks/stats.jsonl, or to the path of a file to append them to that file instead.
+The records are never written to the standard output, so the hooks' output isn't affected.
+Use `tw-hooks-stats` to aggregate them.
+
+Each record contains:
+
+- ts: When the invocation started, seconds since the epoch
+- hook, event: Name of the hook (or "dispatcher" for the dispatcher shims) and hook event
+- wall_ms, cpu_ms: Wall-clock and CPU time of the invocation
+- parse_ms: Time spent parsing the standard input, part of wall_ms
+- payload_bytes: Size of the standard input
+- peak_kib: Peak of the memory allocated during the invocation, according to tracemalloc.
+  null for on-exit hooks that ran in parallel with others, as tracemalloc only keeps a single
+  peak for the whole process
+- retcode: Return code of the hook, or the exception it raised
+"""
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Sequence, Type, TypeVar, Union
+
+from tw_hooks.json_codec import dumps
+from tw_hooks.utils import get_hooks_data_dir, get_task_dir
+
+envvar = "TW_HOOKS_STATS"
+
+R = TypeVar("R")
+
+
+def stats_path() -> Optional[Path]:
+    """Path of the file to append the records to, None if instrumentation is disabled."""
+    val = os.environ.get(envvar, "")
+    if val.lower() in ("", "0", "false", "no"):
+        return None
+    if val.lower() in ("1", "true", "yes"):
+        return get_hooks_data_dir(get_task_dir()) / "stats.jsonl"
+    return Path(val).expanduser()
+
+
+class _NullInvocation:
+    """Stand-in for Invocation when instrumentation is disabled, that doesn't measure anything."""
+
+    def __enter__(self) -> "_NullInvocation":
+        return self
+
+    def __exit__(self, *_):
+        return None
+
+    def parsed(self):
+        pass
+
+    def done(self, retcode: R) -> R:
+        return retcode
+
+
+_null_invocation = _NullInvocation()
+
+# Invocations whose memory peak is being measured, e.g., the dispatcher and one of the hooks
+# that it runs
+_active: List["Invocation"] = []
+
+# Guards _active and the tracemalloc state, on-exit hooks run in threads of their own
+_lock = threading.Lock()
+
+
+class Invocation:
+    """Measure a single hook invocation and append a record for it when it exits."""
+
+    def __init__(
+        self,
+        path: Path,
+        hook: str,
+        event: str,
+        stdin_lines: Sequence[str],
+        measure_peak: bool = True,
+    ):
+        self._path = path
+        self._measure_peak = measure_peak
+        self._record: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "hook": hook,
+            "event": event,
+            "wall_ms": 0.0,
+            "cpu_ms": 0.0,
+            "parse_ms": 0.0,
+            "payload_bytes": sum(len(line.encode("utf-8")) for line in stdin_lines),
+            "peak_kib": 0.0 if measure_peak else None,
+            "retcode": None,
+        }
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+        self._mem_start = 0
+        self._peak = 0
+        self._started_tracing = False
+
+    def __enter__(self) -> "Invocation":
+        with _lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._measure_peak:
+                self._reset_peak()
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def _reset_peak(self):
+        # resetting the peak would lose the one of the enclosing invocations so far
+        peak = tracemalloc.get_traced_memory()[1]
+        for invocation in _active:
+            invocation._peak = max(invocation._peak, peak)
+        _active.append(self)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()  # type: ignore
+            self._mem_start = tracemalloc.get_traced_memory()[0]
+        else:
+            # python < 3.9, this resets the peak as well
+            tracemalloc.clear_traces()
+
+    def parsed(self):
+        """Mark the end of parsing the standard input."""
+        self._record["parse_ms"] = round((time.perf_counter() - self._wall_start) * 1000, 3)
+
+    def done(self, retcode: R) -> R:
+        """Record and return the return code of the hook."""
+        self._record["retcode"] = retcode
+        return retcode
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ):
+        record = self._record
+        record["wall_ms"] = round((time.perf_counter() - self._wall_start) * 1000, 3)
+        record["cpu_ms"] = round((time.process_time() - self._cpu_start) * 1000, 3)
+        with _lock:
+            if self._measure_peak:
+                peak = max(self._peak, tracemalloc.get_traced_memory()[1]) - self._mem_start
+                record["peak_kib"] = round(max(peak, 0) / 1024, 1)
+                _active.remove(self)
+            if self._started_tracing:
+                tracemalloc.stop()
+        if exc_type is not None:
+            record["retcode"] = exc_type.__name__
+
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with self._path.open("a", encoding="utf-8") as f:
+                f.write(dumps(record) + "\n")
+        except OSError:
+            # measuring must never break the hooks
+            pass
+
+
+# What instrument() returns, whether instrumentation is enabled or not
+AnyInvocation = Union[Invocation, _NullInvocation]
+
+
+def instrument(
+    hook: str, event: str, stdin_lines: Sequence[str] = (), measure_peak: bool = True
+) -> AnyInvocation:
+    """Context manager that measures the hook invocation it wraps, if enabled.
+
+    It returns an object on which parsed() can be called to mark the end of the input parsing
+    and done(retcode) to record the return code of the hook.
+
+    :param measure_peak: False if other invocations may run in parallel, in other threads,
+                         whose allocations would count towards the peak of this one
+    """
+    path = stats_path()
+    if path is None:
+        return _null_invocation
+
+    return Invocation(
+        path, hook=hook, event=event, stdin_lines=stdin_lines, measure_peak=measure_peak
+    )
@@ -0,0 +1,132 @@
+"""Encode and decode JSON with the fastest of the installed backends.
+
+orjson is used if it's installed, then ujson, then the json module of the standard library.
+Set TW_HOOKS_JSON_BACKEND to one of the names in `backends` to force a specific backend.
+"""
+import ast
+import json
+import os
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple, cast
+
+envvar = "TW_HOOKS_JSON_BACKEND"
+
+Loads = Callable[[str], Any]
+Dumps = Callable[[Any], str]
+
+
+def _orjson() -> Tuple[Loads, Dumps]:
+    import orjson  # pylint: disable=C0415
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    return orjson.loads, dumps
+
+
+def _ujson() -> Tuple[Loads, Dumps]:
+    import ujson  # type: ignore[import-untyped] # pylint: disable=C0415
+
+    def dumps(obj: Any) -> str:
+        return cast(str, ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False))
+
+    return ujson.loads, dumps
+
+
+def _stdlib() -> Tuple[Loads, Dumps]:
+    return json.loads, json.dumps
+
+
+# In order of preference
+backends: Dict[str, Callable[[], Tuple[Loads, Dumps]]] = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _stdlib,
+}
+
+
+def load_backend(name: Optional[str] = None) -> Tuple[str, Loads, Dumps]:
+    """Return the name, loads and dumps functions of the given or of the preferred backend.
+
+    >>> load_backend("json")[0]
+    'json'
+    """
+    if name is not None and name not in backends:
+        raise RuntimeError(
+            f"Unknown JSON backend {name}, choose one of {', '.join(backends.keys())}"
+        )
+
+    for candidate in [name] if name is not None else backends.keys():
+        try:
+            return (candidate, *backends[candidate]())  # type: ignore
+        except ImportError:
+            if name is not None:
+                raise
+
+    raise RuntimeError("Unreachable, the json module is always available")
+
+
+backend, _loads, _dumps = load_backend(os.environ.get(envvar) or None)
+
+
+def loads(s: str) -> Any:
+    """Decode a JSON document. Raises ValueError if it's not valid JSON."""
+    return _loads(s)
+
+
+def dumps(obj: Any) -> str:
+    """Encode the given object to a single-line JSON document.
+
+    >>> dumps({"tags": ["movie"]}).replace(" ", "")
+    '{"tags":["movie"]}'
+    """
+    try:
+        return _dumps(obj)
+    except TypeError:
+        # e.g., a LazyTask or some other mapping that isn't a dict
+        return json.dumps(obj, default=_to_builtin)
+
+
+def _to_builtin(obj: Any) -> Any:
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def loads_literal(s: str) -> Any:
+    """Decode a Python literal of a dict or a list, e.g., as produced by str() on a task.
+
+    Fail fast, without invoking the parser, if the string can't be such a literal.
+
+    >>> loads_literal("{'description': \\"Buy Tom's book\\", 'tags': ('a', 'b')}")
+    {'description': "Buy Tom's book", 'tags': ('a', 'b')}
+    >>> loads_literal("kalimera")
+    Traceback (most recent call last):
+    ...
+    ValueError: Not a Python dict or list literal: kalimera
+    """
+    if not s or s[0] not in "{[":
+        raise ValueError(f"Not a Python dict or list literal: {s}")
+
+    try:
+        out = ast.literal_eval(s)
+    except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError) as err:
+        raise ValueError(f"Not a Python dict or list literal: {s}") from err
+
+    if not isinstance(out, (dict, list)):
+        raise ValueError(f"Not a Python dict or list literal: {s}")
+
+    return out
+
+
+def loads_lenient(s: str) -> Any:
+    """Decode a JSON document, or a Python literal if it's not valid JSON.
+
+    Raise the original JSON decoding error if it's neither.
+    """
+    try:
+        return _loads(s)
+    except ValueError as err:
+        try:
+            return loads_literal(s)
+        except ValueError:
+            raise err from None
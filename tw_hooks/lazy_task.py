@@ -0,0 +1,60 @@
+"""Task that is decoded from the line Taskwarrior passed to the hook only when it's accessed."""
+from typing import Any, Iterator, MutableMapping, Optional
+
+from tw_hooks.types import TaskT
+from tw_hooks.utils import use_json
+
+
+class LazyTask(MutableMapping[str, Any]):
+    """Dict-like proxy of a task, that parses its JSON line on first access.
+
+    >>> task = LazyTask('{"description": "kalimera", "tags": ["movie"]}\\n')
+    >>> task.decoded
+    False
+    >>> task["tags"]
+    ['movie']
+    >>> task.decoded
+    True
+    """
+
+    __slots__ = ("_line", "_task")
+
+    def __init__(self, line: str):
+        self._line = line
+        self._task: Optional[TaskT] = None
+
+    @property
+    def decoded(self) -> bool:
+        """True if the line has already been parsed."""
+        return self._task is not None
+
+    @property
+    def task(self) -> TaskT:
+        """The decoded task."""
+        if self._task is None:
+            self._task = use_json(self._line.strip())
+        return self._task
+
+    def copy(self) -> TaskT:
+        return dict(self.task)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.task[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self.task[key] = value
+
+    def __delitem__(self, key: str):
+        del self.task[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.task
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.task)
+
+    def __len__(self) -> int:
+        return len(self.task)
+
+    def __repr__(self) -> str:
+        return repr(self.task)
@@ -0,0 +1,125 @@
+"""Persistent memoization of what the tag hooks compute for each combination of tags.
+
+CorrectTagNames, AutoTagBasedOnTags and DetectMutuallyExclusiveTags only depend on the set of
+tags of a task and on their configuration, and the same combinations of tags come up over and
+over. Set TW_HOOKS_TAG_MEMO to the maximum number of combinations to remember, e.g., 10000, and
+their results are kept under the cache directory (see tw_hooks.config), so that a combination
+that was seen before, by any earlier invocation, skips evaluating the rules altogether.
+
+The entries are keyed by a hash of the sorted tags, of the configuration of the hook and of its
+code, so changing either doesn't return stale results. Each entry is a small file, in one of a
+number of shards, so a lookup is a single read, without opening or importing a database. Once a
+shard holds more than its share of the maximum, its least recently used entries are evicted.
+
+What a hit saves is mostly loading the structures that the hooks derive from their
+configuration (see tw_hooks.config.get_derived), e.g., compiling the regular expressions of the
+patterns, which the hooks only do on a miss when the memo is enabled. It's disabled by default:
+with few rules, loading and evaluating them is about as fast as looking them up. Compare the
+hook/<hook>/on-add/cold and .../cold-memo results of benchmarks/bench_hooks.py.
+"""
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+from tw_hooks.config import _cache_key, cache_dir_path, get_config
+from tw_hooks.json_codec import dumps, loads
+
+envvar = "TW_HOOKS_TAG_MEMO"
+
+# Bump when the format of the entries changes
+_MEMO_VERSION = 1
+
+# Entries are spread over directories of about this many entries, by their key, so that
+# eviction only has to list a small one
+_SHARD_SIZE = 64
+_MAX_SHARDS = 256
+
+# Only mark an entry as used if it was last used longer than this ago, in seconds, so that
+# repeated hits don't each cost a write
+_USED_AT_RESOLUTION = 60
+
+T = TypeVar("T")
+
+
+class TagMemo(Generic[T]):
+    """Results of a hook for each combination of tags, persisted under the given directory.
+
+    :param decode: Build the result from what was put, as decoded from JSON. Raise TypeError,
+                   ValueError or AttributeError if it's malformed, it's then ignored
+    """
+
+    def __init__(
+        self, path: Path, namespace: str, max_entries: int, decode: Callable[[Any], T]
+    ):
+        self._path = path
+        self._namespace = namespace
+        self._decode = decode
+        self._n_shards = min(_MAX_SHARDS, max(1, max_entries // _SHARD_SIZE))
+        self._max_per_shard = max(1, -(-max_entries // self._n_shards))
+
+    def _entry_path(self, tags: Iterable[str]) -> Path:
+        contents = "\0".join([self._namespace, *sorted(set(tags))])
+        key = hashlib.sha1(contents.encode("utf-8")).hexdigest()
+        return self._path / f"{int(key[:8], 16) % self._n_shards:02x}" / key
+
+    def get(self, tags: Iterable[str]) -> Optional[T]:
+        """The result remembered for the given tags, in any order, None if there's none."""
+        path = self._entry_path(tags)
+        try:
+            with path.open(encoding="utf-8") as f:
+                contents = f.read()
+                now = time.time()
+                if now - os.fstat(f.fileno()).st_mtime >= _USED_AT_RESOLUTION:
+                    os.utime(path, (now, now))
+            return self._decode(loads(contents))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return None
+
+    def put(self, tags: Iterable[str], value: Any):
+        """Remember the result for the given tags, in a JSON-serializable form."""
+        path = self._entry_path(tags)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(dumps(value), encoding="utf-8")
+            os.replace(tmp_path, path)
+            self._evict(path.parent)
+        except OSError:
+            # only an optimisation, the rules are evaluated again next time
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _evict(self, shard: Path):
+        entries = [e for e in os.scandir(shard) if not e.name.endswith(".tmp")]
+        if len(entries) <= self._max_per_shard:
+            return
+
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for entry in entries[: len(entries) - self._max_per_shard]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                # e.g., evicted by another process
+                pass
+
+
+def get_memo(
+    owner: Callable[..., Any], config: Any, decode: Callable[[Any], T]
+) -> Optional[TagMemo[T]]:
+    """Memo for the results of the given hook class with the given configuration.
+
+    :return: None if memoization is disabled, or if there's no cache directory
+    """
+    val = get_config(envvar, raw=True)
+    try:
+        max_entries = int(val or 0)
+    except ValueError as err:
+        raise RuntimeError(f"{envvar} should be a number of entries, got {val}") from err
+    cache_dir = cache_dir_path()
+    if max_entries <= 0 or cache_dir is None:
+        return None
+
+    namespace = _cache_key(owner, [_MEMO_VERSION, config])
+    return TagMemo(cache_dir / "tag-memo", namespace, max_entries, decode)
@@ -0,0 +1,223 @@
+"""Incrementally maintained index of the date fields of the tasks in pending.data.
+
+Hooks can't invoke the task executable (Taskwarrior holds a lock while they run), so they have
+to parse the data files themselves. Instead of reading and parsing the whole of pending.data on
+every invocation, keep an index of the tasks in it along with how much of the file has already
+been processed:
+
+- If the file only grew, parse the appended lines.
+- Apply the added/modified tasks that Taskwarrior passes to the on-exit hooks, they cover the
+  tasks that were modified in place.
+- Rescan the whole file only if it was truncated or rewritten by something else, or if the index
+  is older than max_age.
+"""
+import os
+import pickle
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple, cast
+
+from tw_hooks.task import Task
+from tw_hooks.types import TaskLike, TaskT
+
+_INDEX_VERSION = 1
+
+# Bytes right before the processed offset, used to tell whether the file was only appended to
+_TAIL_LEN = 64
+
+# Tasks in these states don't count, even if they stay in pending.data until the next gc
+_inactive_statuses = {"completed", "deleted"}
+_inactive_statuses_b = {status.encode() for status in _inactive_statuses}
+
+Timestamps = Tuple[Optional[int], ...]
+
+
+class PendingDataIndex:
+    """Index of uuid -> timestamp of each of the given fields, for the tasks in pending.data."""
+
+    def __init__(
+        self,
+        pending_data: Path,
+        index_path: Path,
+        fields: Sequence[str],
+        max_age: float = 24 * 60 * 60,
+    ):
+        self._pending_data = pending_data
+        self._index_path = index_path
+        self._fields = tuple(fields)
+        self._field_keys = [f'{field}:"'.encode() for field in fields]
+        self._max_age = max_age
+
+        self._state: Dict[str, Any] = {}
+        self._entries: Dict[str, Timestamps] = {}
+
+    @property
+    def entries(self) -> Dict[str, Timestamps]:
+        """uuid -> timestamps, in the order of the fields given at construction."""
+        return self._entries
+
+    def timestamps(self, field: str) -> Iterator[int]:
+        """Iterate over the timestamps of the given field, for the tasks that have it set."""
+        i = self._fields.index(field)
+        for entry in self._entries.values():
+            ts = entry[i]
+            if ts is not None:
+                yield ts
+
+    def timestamp_arrays(self) -> Dict[str, "array[int]"]:
+        """field -> its timestamps as a compact array of int64, all fields in a single pass.
+
+        See tw_hooks.histogram for counting them.
+        """
+        arrays = {field: array("q") for field in self._fields}
+        appends = [arrays[field].append for field in self._fields]
+        for entry in self._entries.values():
+            for append, ts in zip(appends, entry):
+                if ts is not None:
+                    append(ts)
+        return arrays
+
+    def refresh(self, tasks: Iterable[TaskLike] = ()):
+        """Bring the index up to date with pending.data.
+
+        :param tasks: Tasks that were added/modified since the last refresh, as passed to the
+                      on-exit hooks
+        """
+        stat = self._pending_data.stat()
+        self._load()
+        state = self._state
+
+        if not self._is_compatible(stat):
+            self._rescan(stat)
+        elif state["size"] == stat.st_size and state["mtime_ns"] == stat.st_mtime_ns:
+            return
+        elif self._was_appended_to(stat):
+            self._parse_tail(stat)
+            self._apply_tasks(tasks)
+        else:
+            tasks = list(tasks)
+            if tasks:
+                # modified in place by the command that's exiting
+                self._apply_tasks(tasks)
+                self._set_file_state(stat, offset=stat.st_size)
+            else:
+                self._rescan(stat)
+
+        self._save()
+
+    def _is_compatible(self, stat: os.stat_result) -> bool:
+        state = self._state
+        return (
+            state.get("version") == _INDEX_VERSION
+            and state.get("fields") == self._fields
+            and state.get("inode") == stat.st_ino
+            and time.time() - state.get("built_at", 0) < self._max_age
+        )
+
+    def _was_appended_to(self, stat: os.stat_result) -> bool:
+        offset = self._state["offset"]
+        if stat.st_size < offset:
+            return False
+
+        tail: bytes = self._state["tail"]
+        with self._pending_data.open("rb") as f:
+            f.seek(max(0, offset - _TAIL_LEN))
+            return f.read(min(offset, _TAIL_LEN)) == tail
+
+    @staticmethod
+    def _attribute(line: bytes, key: bytes) -> Optional[bytes]:
+        """Value of the attribute with the given key, e.g., b'due:"', in a pending.data line."""
+        # plain find() is much faster than a regular expression when called for every line
+        start = line.find(key)
+        while start > 0 and line[start - 1] not in b"[ ":
+            # e.g., looking for due and found overdue
+            start = line.find(key, start + 1)
+        if start == -1:
+            return None
+
+        start += len(key)
+        return line[start : line.find(b'"', start)]
+
+    def _parse_lines(self, data: bytes):
+        for line in data.splitlines():
+            uuid = self._attribute(line, b'uuid:"')
+            if uuid is None:
+                continue
+
+            status = self._attribute(line, b'status:"')
+            if status in _inactive_statuses_b:
+                self._entries.pop(uuid.decode(), None)
+                continue
+
+            timestamps = []
+            for key in self._field_keys:
+                ts = self._attribute(line, key)
+                timestamps.append(int(ts) if ts else None)
+            self._entries[uuid.decode()] = tuple(timestamps)
+
+    def _parse_tail(self, stat: os.stat_result):
+        with self._pending_data.open("rb") as f:
+            f.seek(self._state["offset"])
+            data = f.read()
+
+        # leave an incomplete last line for later, it's still being written
+        end = data.rfind(b"\n") + 1
+        self._parse_lines(data[:end])
+        self._set_file_state(stat, offset=self._state["offset"] + end)
+
+    def _rescan(self, stat: os.stat_result):
+        self._entries = {}
+        self._state = {
+            "version": _INDEX_VERSION,
+            "fields": self._fields,
+            "inode": stat.st_ino,
+            "built_at": time.time(),
+            "offset": 0,
+        }
+        self._parse_tail(stat)
+
+    def _apply_tasks(self, tasks: Iterable[TaskLike]):
+        for task in tasks:
+            view = task if isinstance(task, Task) else Task(cast(TaskT, task))
+            uuid = view.uuid
+            if uuid is None:
+                continue
+            if view.status in _inactive_statuses:
+                self._entries.pop(uuid, None)
+                continue
+
+            self._entries[uuid] = tuple(view.timestamp(field) for field in self._fields)
+
+    def _set_file_state(self, stat: os.stat_result, offset: int):
+        with self._pending_data.open("rb") as f:
+            f.seek(max(0, offset - _TAIL_LEN))
+            tail = f.read(min(offset, _TAIL_LEN))
+
+        self._state.update(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, offset=offset, tail=tail
+        )
+
+    def _load(self):
+        if self._state:
+            return
+
+        try:
+            with self._index_path.open("rb") as f:
+                self._state, self._entries = pickle.load(f)
+        except Exception:  # pylint: disable=W0703
+            # missing, or written by an incompatible version, or corrupted. Scan it all again
+            self._state, self._entries = {}, {}
+
+    def _save(self):
+        path = self._index_path
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("wb") as f:
+                pickle.dump((self._state, self._entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the index is an optimisation, never fail the hook because of it
+            if tmp_path.exists():
+                tmp_path.unlink()
@@ -0,0 +1,326 @@
+"""Find the available hooks without importing the modules that define them.
+
+The hooks come from the modules under tw_hooks.hooks, from the "tw_hooks.hooks" entry point
+group of the installed packages and from any other module that's explicitly given. Each module
+is parsed instead of imported: its classes that derive from one of the base hooks, directly or
+through other hooks, are the hooks it defines. Hooks that set installed_by_default to False in
+their class body are opt-in: they're only installed if their module is explicitly given. A
+timeout set in the class body, or in the one of a base hook, is picked up as well.
+
+The hooks found in each module are kept in a manifest under the cache directory (see
+tw_hooks.config), along with the modification time of the module. A module is only parsed
+again when it changes.
+
+A third-party package registers its hooks with an entry point per hook module, e.g., in its
+pyproject.toml:
+
+    [tool.poetry.plugins."tw_hooks.hooks"]
+    my_hook = "my_package.my_hook:MyHook"
+"""
+import ast
+import os
+import sys
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple, Type
+
+from tw_hooks.base_hooks import BaseHook, OnAddHook, OnExitHook, OnLaunchHook, OnModifyHook
+from tw_hooks.config import cache_dir_path
+from tw_hooks.json_codec import dumps, loads
+from tw_hooks.types import HookSpec
+
+entry_point_group = "tw_hooks.hooks"
+
+# Bump when the format of the manifest changes
+_MANIFEST_VERSION = 3
+
+# name of base hook class -> event that it handles
+_base_events = {
+    Base.__name__: Base.shim_prefix()
+    for Base in (OnAddHook, OnModifyHook, OnExitHook, OnLaunchHook)
+}
+
+# path of the manifest -> its contents, loaded once per process
+_manifests: Dict[Optional[Path], Dict[str, Any]] = {}
+
+
+class HookInfo(NamedTuple):
+    """What the installation of a hook needs to know about it, without importing it."""
+
+    module: str
+    name: str
+    # shim prefixes of the events that the hook handles, e.g., ("on-add", "on-modify")
+    events: Tuple[str, ...]
+    description: str
+    installed_by_default: bool = True
+    # the timeout class attribute, if it's set to a number
+    timeout: Optional[float] = None
+
+    @property
+    def spec(self) -> HookSpec:
+        return (self.module, self.name)
+
+    @classmethod
+    def from_class(cls, Hook: Type[BaseHook]) -> "HookInfo":
+        """Describe an already imported hook class.
+
+        >>> from tw_hooks.hooks.correct_tag_names import CorrectTagNames
+        >>> HookInfo.from_class(CorrectTagNames).events
+        ('on-add', 'on-modify')
+        """
+        events = sorted(
+            Base.shim_prefix()
+            for Base in (OnAddHook, OnModifyHook, OnExitHook, OnLaunchHook)
+            if issubclass(Hook, Base)
+        )
+        return cls(
+            Hook.__module__,
+            Hook.name(),
+            tuple(events),
+            Hook.description(),
+            Hook.installed_by_default,
+            Hook.timeout,
+        )
+
+
+def builtin_modules() -> List[str]:
+    """Modules of the hooks that come with tw_hooks."""
+    hooks_dir = Path(__file__).parent / "hooks"
+    return sorted(
+        f"tw_hooks.hooks.{path.stem}"
+        for path in hooks_dir.glob("*.py")
+        if not path.name.startswith("_")
+    )
+
+
+def entry_point_modules() -> List[str]:
+    """Modules of the hooks that the installed packages register as entry points."""
+    # pylint: disable=C0415
+    from importlib.metadata import entry_points
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        group = eps.select(group=entry_point_group)  # type: ignore
+    else:
+        # python < 3.10
+        group = eps.get(entry_point_group, [])  # type: ignore
+
+    # e.g., "my_package.my_hook:MyHook", the other classes of the module are hooks as well
+    return sorted({ep.value.partition(":")[0].strip() for ep in group})
+
+
+def _description(node: ast.ClassDef) -> str:
+    doc = ast.get_docstring(node)
+    if not doc:
+        return "No description"
+    return doc.strip("\n ").split("\n")[0]
+
+
+def _class_attribute(node: ast.ClassDef, name: str) -> Optional[ast.expr]:
+    """Value assigned to the given attribute in the class body, None if it's not assigned."""
+    for stmt in node.body:
+        if isinstance(stmt, ast.Assign):
+            targets, value = stmt.targets, stmt.value
+        elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+            targets, value = [stmt.target], stmt.value
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == name for t in targets):
+            return value
+
+    return None
+
+
+def _installed_by_default(node: ast.ClassDef) -> bool:
+    value = _class_attribute(node, "installed_by_default")
+    return not isinstance(value, ast.Constant) or bool(value.value)
+
+
+def _timeout(node: ast.ClassDef) -> Dict[str, Any]:
+    """{"timeout": ...} if the class body sets the timeout to a number or to None, {} otherwise.
+
+    >>> _timeout(ast.parse("class A:\\n    timeout = 0.5").body[0])
+    {'timeout': 0.5}
+    """
+    value = _class_attribute(node, "timeout")
+    if not isinstance(value, ast.Constant):
+        return {}
+    if value.value is None or type(value.value) in (int, float):
+        return {"timeout": value.value}
+    return {}
+
+
+def _parse_module(path: Path) -> List[Dict[str, Any]]:
+    """Top-level classes of the module at the given path, along with the names of their bases.
+
+    >>> classes = _parse_module(module_path("tw_hooks.hooks.correct_tag_names"))
+    >>> [c["bases"] for c in classes if c["name"] == "CorrectTagNames"]
+    [['OnModifyHook', 'OnAddHook']]
+    """
+    tree = ast.parse(path.read_bytes(), filename=str(path))
+    classes = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = []
+        for base in node.bases:
+            if isinstance(base, ast.Name):
+                bases.append(base.id)
+            elif isinstance(base, ast.Attribute):
+                bases.append(base.attr)
+        classes.append(
+            {
+                "name": node.name,
+                "bases": bases,
+                "description": _description(node),
+                "installed_by_default": _installed_by_default(node),
+                **_timeout(node),
+            }
+        )
+
+    return classes
+
+
+def _manifest_path() -> Optional[Path]:
+    cache_dir = cache_dir_path()
+    return cache_dir / "hooks-manifest.json" if cache_dir is not None else None
+
+
+def _load_manifest(path: Optional[Path]) -> Dict[str, Any]:
+    manifest = _manifests.get(path)
+    if manifest is None:
+        manifest = {}
+        if path is not None and path.is_file():
+            try:
+                contents = loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                contents = {}
+            if contents.get("version") == _MANIFEST_VERSION:
+                manifest = contents["modules"]
+        _manifests[path] = manifest
+
+    return manifest
+
+
+def _save_manifest(path: Optional[Path], manifest: Dict[str, Any]):
+    if path is None:
+        return
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(
+            dumps({"version": _MANIFEST_VERSION, "modules": manifest}), encoding="utf-8"
+        )
+        os.replace(tmp_path, path)
+    except OSError:
+        # the manifest is an optimisation, parse the modules again next time
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def module_path(module: str) -> Optional[Path]:
+    """Path of the source of the given module, None if it can't be found.
+
+    Only the parent packages of the module are imported, not the module itself.
+
+    >>> module_path("tw_hooks.hooks.correct_tag_names").name
+    'correct_tag_names.py'
+    >>> module_path("tw_hooks.hooks.kalimera") is None
+    True
+    """
+    loaded = sys.modules.get(module)
+    if loaded is not None and getattr(loaded, "__file__", None):
+        return Path(loaded.__file__)  # type: ignore
+
+    try:
+        spec = find_spec(module)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.has_location or not spec.origin:
+        return None
+    return Path(spec.origin)
+
+
+def discover(modules: Sequence[str]) -> List[HookInfo]:
+    """Find the hooks defined in the given modules, without importing them.
+
+    A base class is matched by its name only, so a hook can derive from a hook of another one
+    of the given modules.
+
+    :return: The hooks, in the order of the modules and of their definitions. Modules that
+             can't be found are skipped
+    """
+    manifest_path = _manifest_path()
+    manifest = _load_manifest(manifest_path)
+    classes: List[Tuple[str, Dict[str, Any]]] = []
+    changed = False
+    for module in dict.fromkeys(modules):
+        path = module_path(module)
+        if path is None or path.suffix != ".py":
+            # e.g., compiled extension, can't be parsed
+            continue
+        mtime_ns = path.stat().st_mtime_ns
+        entry = manifest.get(module)
+        if entry is None or entry["file"] != str(path) or entry["mtime_ns"] != mtime_ns:
+            entry = {"file": str(path), "mtime_ns": mtime_ns, "classes": _parse_module(path)}
+            manifest[module] = entry
+            changed = True
+        classes.extend((module, c) for c in entry["classes"])
+
+    if changed:
+        _save_manifest(manifest_path, manifest)
+
+    # resolve the events of each class through its bases
+    bases_of: Dict[str, List[str]] = {c["name"]: c["bases"] for _, c in classes}
+    events_of: Dict[str, FrozenSet[str]] = {}
+
+    def _events(name: str, visiting: Set[str]) -> FrozenSet[str]:
+        if name in _base_events:
+            return frozenset([_base_events[name]])
+        if name in events_of:
+            return events_of[name]
+        if name in visiting or name not in bases_of:
+            return frozenset()
+        visiting.add(name)
+        events = frozenset().union(*(_events(base, visiting) for base in bases_of[name]))
+        events_of[name] = events
+        return events
+
+    # and their timeout, unless they set one of their own
+    classes_by_name = {c["name"]: c for _, c in classes}
+
+    def _inherited_timeout(name: str, visiting: Set[str]) -> Optional[float]:
+        c = classes_by_name.get(name)
+        if c is None or name in visiting:
+            return None
+        if "timeout" in c:
+            return None if c["timeout"] is None else float(c["timeout"])
+        visiting.add(name)
+        for base in c["bases"]:
+            timeout = _inherited_timeout(base, visiting)
+            if timeout is not None:
+                return timeout
+        return None
+
+    hooks = []
+    for module, c in classes:
+        events = _events(c["name"], set())
+        if events:
+            hooks.append(
+                HookInfo(
+                    module,
+                    c["name"],
+                    tuple(sorted(events)),
+                    c["description"],
+                    c["installed_by_default"],
+                    _inherited_timeout(c["name"], set()),
+                )
+            )
+
+    return hooks
+
+
+def available_hooks(additional_modules: Sequence[str] = ()) -> List[HookInfo]:
+    """The hooks of tw_hooks, of the installed packages and of the given modules."""
+    return discover([*builtin_modules(), *entry_point_modules(), *additional_modules])
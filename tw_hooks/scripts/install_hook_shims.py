@@ -2,41 +2,49 @@
 """Detect Taskwarrior hooks and register an executable shim for each one of them."""
 import sys
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
-from importlib import import_module
 from pathlib import Path
-from typing import Dict, Sequence, Set, Type
+from typing import Dict, List, Optional, Protocol, Sequence, Type
 
-from bubop.classes import all_subclasses
 from bubop.fs import valid_path
 from bubop.logging import logger
-from bubop.string import format_dict, format_list
+from bubop.string import camel_case_to_dashed, format_dict, format_list
 
 from tw_hooks.base_hooks import BaseHook, OnAddHook, OnExitHook, OnLaunchHook, OnModifyHook
-from tw_hooks.hooks import import_concrete_hooks
+from tw_hooks.bundle import BUNDLE_PYTHON_FLAGS, build_bundle, measure_startup
+from tw_hooks.registry import (
+    HookInfo,
+    builtin_modules,
+    discover,
+    entry_point_modules,
+    module_path,
+)
+from tw_hooks.utils import get_hooks_data_dir
 
-# By default this will find all the implementations in this package. If the user wants to
-# include their own hook classes, they'll have to specify the module paths in the
-# TW_ADDITIONAL_HOOKS environment variable
+# By default this will find all the implementations in this package and the ones that other
+# packages register as entry points (see tw_hooks.registry). If the user wants to include their
+# own hook classes, they'll have to specify the module paths with --register-additional
 
 
 HOOK_TEMPLATE = """
-#!/usr/bin/env python3
+{shebang}
 
 import sys
-from pathlib import Path
+{bundle_path}
+stdin_lines = None
+{daemon_client}
 # Make this robust in case e.g., the user is running inside a virtualenv and tw_hooks is not
 # installed in there.
 try:
-    from {import_from} import {class_name}
+    from tw_hooks.dispatcher import dispatch
 except ModuleNotFoundError:
-    print("Can't import {class_name} hook")
+    print("Can't import {hook_names} hook(s)")
 
     # We have to return some JSON that's compatible with the hooks API
     # https://taskwarrior.org/docs/hooks/
-    name = Path(__file__).name
-    hook_type = "-".join(name.split("-")[:2])
+    hook_type = "{event}"
 
-    stdin = sys.stdin.read().strip()
+    stdin = "".join(stdin_lines) if stdin_lines is not None else sys.stdin.read()
+    stdin = stdin.strip()
 
     if hook_type == "on-add":
         added_task = stdin
@@ -49,34 +57,149 @@ except ModuleNotFoundError:
 
     sys.exit(0)
 
-obj = {class_name}()
-{invoke_instructions}
+sys.exit(dispatch("{event}", {hook_specs}, stdin_lines=stdin_lines))
 """
 
-INVOKE_WITH_STDIN_TEMPLATE = """
-from tw_hooks.utils import parse_stdin_lines
-sys.exit(obj.{class_entrypoint}(parse_stdin_lines()))
+# Forward the invocation to tw-hooks-daemon. Only use the standard library here, the point is
+# to avoid the imports altogether if the daemon is running.
+DAEMON_CLIENT_TEMPLATE = """
+import json
+import os
+import socket
+import stat
+
+# keep in sync with tw_hooks.daemon.default_socket_path
+socket_path = os.environ.get("TW_HOOKS_DAEMON_SOCKET")
+if not socket_path:
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        socket_path = os.path.join(os.environ["XDG_RUNTIME_DIR"], "tw-hooks.sock")
+    else:
+        socket_path = f"/tmp/tw-hooks-{{os.getuid()}}/daemon.sock"
+
+{read_stdin}
+request = {{
+    "event": "{event}",
+    "hooks": {hook_specs},
+    "stdin_lines": stdin_lines,
+    "argv": sys.argv,
+}}
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+# e.g., a hook hangs in the daemon, never block Taskwarrior on it
+sock.settimeout({daemon_timeout})
+try:
+    # only trust a daemon of the same user, anyone else could make up the tasks
+    st = os.stat(socket_path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        sys.stderr.write(f"Not using {{socket_path}}, it's not a socket of the current user\\n")
+        raise OSError
+    sock.connect(socket_path)
+    sock.sendall(json.dumps(request).encode("utf-8"))
+    sock.shutdown(socket.SHUT_WR)
+    chunks = []
+    chunk = sock.recv(65536)
+    while chunk:
+        chunks.append(chunk)
+        chunk = sock.recv(65536)
+    response = json.loads(b"".join(chunks))
+except socket.timeout:
+    sys.stderr.write(
+        "tw-hooks-daemon didn't reply within {daemon_timeout:g}s, running without it\\n"
+    )
+    response = None
+except (OSError, ValueError):
+    # daemon is not running - run the hooks from within this process instead
+    response = None
+finally:
+    sock.close()
+
+if response is not None:
+    sys.stdout.write(response["stdout"])
+    sys.exit(response["retcode"])
 """
 
-INVOKE_WITH_NO_ARGS_TEMPLATE = """
-sys.exit(obj.{class_entrypoint}())
+DAEMON_CLIENT_READ_STDIN = """
+stdin = sys.stdin.buffer.read().decode("utf-8", errors="ignore")
+stdin_lines = stdin.splitlines(keepends=True)
 """
 
-
-def _build_shim(base_hook: Type[BaseHook], hook: Type[BaseHook]) -> str:
-    invoke_instructions = (
-        INVOKE_WITH_STDIN_TEMPLATE
-        if base_hook.require_stdin()
-        else INVOKE_WITH_NO_ARGS_TEMPLATE
-    )
-    invoke_instructions = invoke_instructions.format(class_entrypoint=base_hook.entrypoint())
+# How long a shim waits for the daemon to run each hook that doesn't have a timeout of its
+# own, and on top of all of them, before it gives up on the daemon and runs them itself
+DAEMON_HOOK_TIMEOUT = 10.0
+DAEMON_REPLY_SLACK = 1.0
+
+# Name (without the event prefix) of the shim that runs all the hooks of an event
+DISPATCHER_SHIM_NAME = "tw-hooks-dispatcher"
+
+
+class _EventBase(Protocol):
+    """What a shim needs of the base hook of its event, e.g., the abstract OnAddHook class."""
+
+    def shim_prefix(self) -> str: ...
+
+    def require_stdin(self) -> bool: ...
+
+
+def _daemon_timeout(base_hook: _EventBase, hooks: Sequence[HookInfo]) -> float:
+    """How long the shim of the given hooks waits for the daemon to reply, in seconds.
+
+    >>> hooks = [HookInfo("m", "A", ("on-add",), "", timeout=0.5), HookInfo("m", "B", (), "")]
+    >>> _daemon_timeout(OnAddHook, hooks)
+    11.5
+    >>> _daemon_timeout(OnExitHook, hooks)
+    11.0
+    """
+    timeouts = [
+        DAEMON_HOOK_TIMEOUT if hook.timeout is None else hook.timeout for hook in hooks
+    ]
+    if base_hook.shim_prefix() == OnExitHook.shim_prefix():
+        # run in parallel
+        return max(timeouts, default=0.0) + DAEMON_REPLY_SLACK
+    return sum(timeouts) + DAEMON_REPLY_SLACK
+
+
+def _build_shim(
+    base_hook: _EventBase,
+    hooks: Sequence[HookInfo],
+    use_daemon: bool = False,
+    bundle_dir: Optional[Path] = None,
+) -> str:
+    event = base_hook.shim_prefix()
+    hook_specs = repr([hook.spec for hook in hooks])
+    daemon_client = ""
+    if use_daemon:
+        daemon_client = DAEMON_CLIENT_TEMPLATE.format(
+            event=event,
+            hook_specs=hook_specs,
+            daemon_timeout=_daemon_timeout(base_hook, hooks),
+            read_stdin=DAEMON_CLIENT_READ_STDIN if base_hook.require_stdin() else "",
+        )
+    shebang = "#!/usr/bin/env python3"
+    bundle_path = ""
+    if bundle_dir is not None:
+        # the very interpreter that compiled the bundle, without site and the user's env
+        shebang = f"#!{sys.executable} {BUNDLE_PYTHON_FLAGS}"
+        bundle_path = f"sys.path.insert(0, {str(bundle_dir)!r})\n"
     return HOOK_TEMPLATE.format(
-        import_from=hook.__module__,
-        class_name=hook.name(),
-        invoke_instructions=invoke_instructions,
+        shebang=shebang,
+        bundle_path=bundle_path,
+        event=event,
+        hook_names=", ".join(hook.name for hook in hooks),
+        hook_specs=hook_specs,
+        daemon_client=daemon_client,
     ).strip()
 
 
+def _write_shim(shim_path: Path, shim_contents: str):
+    shim_path.write_text(shim_contents)
+    shim_path.chmod(mode=0o764)
+
+
+def _remove_shim(shim_path: Path):
+    if shim_path.is_file():
+        logger.info(f"Removing shim {shim_path.name}, superseded by the new installation")
+        shim_path.unlink()
+
+
 def main():
     """Main."""
     # parse CLI arguments ---------------------------------------------------------------------
@@ -105,6 +228,35 @@ def main():
         help="List the available hooks and exit",
         action="store_true",
     )
+    parser.add_argument(
+        "-d",
+        "--dispatcher",
+        help=(
+            "Install a single dispatcher shim per event which runs all the hooks of that event"
+            " from within the same process, instead of one shim per hook"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "-u",
+        "--use-daemon",
+        help=(
+            "Make the shims forward their invocations to tw-hooks-daemon if it's running, and"
+            " run the hooks themselves otherwise"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "-b",
+        "--bundle",
+        help=(
+            "Copy tw_hooks, the hooks and their dependencies in a single precompiled bundle"
+            " under the tw_hooks directory of the Taskwarrior directory, and make the shims"
+            " run it with an isolated interpreter that doesn't import site, so that they start"
+            " faster. Install the shims again after upgrading any of these packages"
+        ),
+        action="store_true",
+    )
     parser.add_argument("-r", "--register-additional", nargs="+", default=[])
 
     executable = Path(sys.argv[0]).stem
@@ -119,15 +271,27 @@ def main():
             "-r mod.hook_name"
         ),
         "List all the available hooks and exit": "--list-hooks",
+        "Install all the available hooks, using a single process per Taskwarrior event": (
+            "--all-hooks --dispatcher"
+        ),
+        "Install all the available hooks and serve them from a running tw-hooks-daemon": (
+            "--all-hooks --dispatcher --use-daemon"
+        ),
+        "Install all the available hooks, bundled for a faster startup": (
+            "--all-hooks --dispatcher --bundle"
+        ),
     }
     parser.epilog = f'Usage examples:\n{"=" * 15}\n\n' + "\n".join(
-        (f"- {k}\n  {executable} {v}\n" for k, v in usecases.items())
+        f"- {k}\n  {executable} {v}\n" for k, v in usecases.items()
     )
 
     args = vars(parser.parse_args())
     additional_hook_modules: Sequence[str] = args["register_additional"]
     install_all_hooks: bool = args["all_hooks"]
     list_hooks: bool = args["list_hooks"]
+    use_dispatcher: bool = args["dispatcher"]
+    use_daemon: bool = args["use_daemon"]
+    use_bundle: bool = args["bundle"]
     hooks_dir: Path = args["task_dir"] / "hooks"
 
     if (not install_all_hooks and not additional_hook_modules) and not list_hooks:
@@ -145,9 +309,12 @@ def main():
         format_dict(
             header="CLI Configuration",
             items={
-                "Hooks directory": (hooks_dir),
+                "Hooks directory": hooks_dir,
                 "Install all available hooks": install_all_hooks,
                 "List hooks and exit": list_hooks,
+                "Single dispatcher shim per event": use_dispatcher,
+                "Forward invocations to tw-hooks-daemon": use_daemon,
+                "Bundle the hooks and their dependencies": use_bundle,
                 "Register hooks from modules": additional_hook_modules,
             },
             align_items=True,
@@ -156,14 +323,10 @@ def main():
 
     if install_all_hooks:
         logger.info("Installing all available hooks...")
-        import_concrete_hooks()
 
-    # iterate over additional_hook_modules, try to find a (partial) match on ------------------
-    # any importable module and import it
+    # make sure that the additional modules can be found - without importing them -------------
     for ad_hook in additional_hook_modules:
-        try:
-            import_module(ad_hook)
-        except ModuleNotFoundError:
+        if module_path(ad_hook) is None:
             logger.error(
                 f"Couldn't find module {ad_hook} in your path. Make sure this module is"
                 " accessible, e.g., by adding its location in $PYTHONPATH"
@@ -180,15 +343,34 @@ def main():
 
     # fetch all the hook implemenattions and group them per base hook -------------------------
     hook_bases: Sequence[Type[BaseHook]] = [OnExitHook, OnLaunchHook, OnAddHook, OnModifyHook]
-    hooks_to_install: Dict[Type[BaseHook], Set[Type[BaseHook]]] = {}
+    hooks_to_install: Dict[Type[BaseHook], Sequence[HookInfo]] = {}
 
     # gather all the hooks --------------------------------------------------------------------
+    found = discover([*builtin_modules(), *entry_point_modules(), *additional_hook_modules])
+    if not install_all_hooks:
+        # the rest are only parsed so that the hooks of the additional modules can derive from
+        # them
+        found = [hook for hook in found if hook.module in additional_hook_modules]
+    elif not list_hooks:
+        # opt-in hooks only if their module is explicitly given
+        found = [
+            hook
+            for hook in found
+            if hook.installed_by_default or hook.module in additional_hook_modules
+        ]
     hook_with_descriptions: Dict[str, Sequence[str]] = {}  # only for reporting to the user...
     for SomeBaseHook in hook_bases:
-        subclasses: Set[Type[BaseHook]] = all_subclasses(SomeBaseHook)  # type: ignore # TODO?
+        # Taskwarrior runs the hook scripts in alphabetical order, keep the same order when
+        # dispatching them from a single shim
+        subclasses = sorted(
+            (hook for hook in found if SomeBaseHook.shim_prefix() in hook.events),
+            key=lambda hook: camel_case_to_dashed(hook.name),
+        )
         hooks_to_install[SomeBaseHook] = subclasses
         hook_with_descriptions[SomeBaseHook.name()] = [
-            f"{Subclass.name()}: {Subclass.description()}" for Subclass in subclasses
+            f"{hook.name}: {hook.description}"
+            + ("" if hook.installed_by_default else f" (opt-in, -r {hook.module})")
+            for hook in subclasses
         ]
 
     # report all the hook implementations found -----------------------------------------------
@@ -207,15 +389,51 @@ def main():
         logger.warning("No shims to install.")
         return
 
+    # bundle the hooks and their dependencies, if requested ------------------------------------
+    bundle_dir: Optional[Path] = None
+    if use_bundle:
+        bundle_dir = get_hooks_data_dir(args["task_dir"]) / "bundle"
+        modules: List[str] = ["tw_hooks.dispatcher"]
+        for subclasses in hooks_to_install.values():
+            modules.extend(hook.module for hook in subclasses)
+        modules = list(dict.fromkeys(modules))
+
+        logger.info(f"Bundling the hooks and their dependencies under {bundle_dir}")
+        bundled = build_bundle(bundle_dir, modules)
+        logger.debug(f"Bundled: {', '.join(path.name for path in bundled)}")
+
+        startup_before = measure_startup(modules)
+        startup_after = measure_startup(modules, bundle_dir=bundle_dir)
+        logger.info(
+            f"Cold start of the shims: {startup_before:.1f} ms -> {startup_after:.1f} ms"
+            f" ({(startup_after - startup_before) / startup_before:+.0%})"
+        )
+
     # install a shim under the hooks directory for each hook implementation -------------------
+    # or a single dispatcher shim for each event
     logger.info(f"Installing shim executables under {hooks_dir}")
     for SomeBaseHook, subclasses in hooks_to_install.items():
-        for SomeHook in subclasses:
-            logger.debug(f"Creating shim for {SomeHook.name()}.{SomeBaseHook.entrypoint()}")
-            shim_contents = _build_shim(SomeBaseHook, SomeHook)
-            shim_path = hooks_dir / f"{SomeBaseHook.shim_prefix()}-{SomeHook.dashed_name()}.py"
-            shim_path.write_text(shim_contents)
-            shim_path.chmod(mode=0o764)
+        if not subclasses:
+            continue
+
+        prefix = SomeBaseHook.shim_prefix()
+        dispatcher_shim_path = hooks_dir / f"{prefix}-{DISPATCHER_SHIM_NAME}.py"
+        hook_shim_paths = [
+            hooks_dir / f"{prefix}-{camel_case_to_dashed(hook.name)}.py" for hook in subclasses
+        ]
+        if use_dispatcher:
+            logger.debug(f"Creating {prefix} dispatcher shim for {len(subclasses)} hook(s)")
+            shim_contents = _build_shim(SomeBaseHook, subclasses, use_daemon, bundle_dir)
+            _write_shim(dispatcher_shim_path, shim_contents)
+            # otherwise taskwarrior would run these hooks twice
+            for shim_path in hook_shim_paths:
+                _remove_shim(shim_path)
+        else:
+            for hook, shim_path in zip(subclasses, hook_shim_paths):
+                logger.debug(f"Creating shim for {hook.name}.{SomeBaseHook.entrypoint()}")
+                shim_contents = _build_shim(SomeBaseHook, [hook], use_daemon, bundle_dir)
+                _write_shim(shim_path, shim_contents)
+            _remove_shim(dispatcher_shim_path)
 
     return
 
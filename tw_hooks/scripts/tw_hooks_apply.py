@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Run on-add/on-modify hooks over existing tasks and print the ones that they changed.
+
+Read the output of `task export` and print the changed tasks as JSON lines, in a form that
+`task import` accepts. The feedback of the hooks goes to the standard error.
+"""
+import os
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from typing import List, Sequence, TextIO
+
+from bubop.logging import logger
+
+from tw_hooks.apply import apply
+from tw_hooks.registry import available_hooks
+from tw_hooks.types import HookSpec
+
+
+def _find_hooks(
+    names: Sequence[str], additional_hook_modules: Sequence[str]
+) -> List[HookSpec]:
+    available = {
+        hook.name: hook
+        for hook in available_hooks(additional_hook_modules)
+        if {"on-add", "on-modify"} & set(hook.events)
+    }
+
+    specs = []
+    for name in names:
+        hook = available.get(name)
+        if hook is None:
+            raise RuntimeError(
+                f"Unknown hook {name}, expected one of {sorted(available)}. Use"
+                " --register-additional for hooks outside of tw_hooks"
+            )
+        specs.append(hook.spec)
+
+    return specs
+
+
+def main():
+    """Main."""
+    # parse CLI arguments ---------------------------------------------------------------------
+    parser = ArgumentParser(
+        __doc__,
+        formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "hooks",
+        nargs="+",
+        help="Names of the hooks to run, in order, e.g., CorrectTagNames",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        help="File with the exported tasks, the standard input if not given",
+        default="-",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes, 1 to run the hooks from within this process",
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        help="Number of tasks that are handed to a worker process at once",
+        default=500,
+    )
+    parser.add_argument("-r", "--register-additional", nargs="+", default=[])
+    parser.epilog = (
+        "Usage example:\n\n"
+        "  task export | tw-hooks-apply CorrectTagNames AutoTagBasedOnTags | task import -\n\n"
+        "Hooks that handle both the on-add and the on-modify events run as on-add hooks. The"
+        " rest of them run as if the task had been modified without changing anything."
+    )
+
+    args = vars(parser.parse_args())
+    specs = _find_hooks(args["hooks"], args["register_additional"])
+
+    # run the hooks ---------------------------------------------------------------------------
+    f: TextIO = sys.stdin if args["input"] == "-" else open(args["input"], encoding="utf-8")
+    changed = rejected = 0
+    try:
+        results = apply(specs, f, jobs=args["jobs"], chunk_size=args["chunk_size"])
+        for result in results:
+            for line in result.feedback:
+                print(f"{result.uuid}: {line}", file=sys.stderr)
+            if result.retcode:
+                rejected += 1
+            elif result.task_line is not None:
+                changed += 1
+                print(result.task_line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    logger.info(f"Changed {changed} task(s), {rejected} task(s) were rejected by the hooks")
+    sys.exit(1 if rejected else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Keep the Taskwarrior hooks instantiated and serve the shims over a Unix domain socket."""
+import signal
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from pathlib import Path
+from typing import List
+
+from bubop.logging import logger
+from bubop.string import format_dict
+
+from tw_hooks.daemon import HookDaemon, default_socket_path
+
+
+def main():
+    """Main."""
+    # parse CLI arguments ---------------------------------------------------------------------
+    parser = ArgumentParser(
+        __doc__,
+        formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        type=Path,
+        help=(
+            "Path to the socket to listen to. Set the TW_HOOKS_DAEMON_SOCKET environment"
+            " variable to the same path so that the shims can find it"
+        ),
+        default=default_socket_path(),
+    )
+    parser.add_argument(
+        "-r",
+        "--register-additional",
+        nargs="+",
+        default=[],
+        help=(
+            "Modules of custom hooks to serve, as passed to install-hook-shims. Only these and"
+            " the hooks that install-hook-shims finds by default are run"
+        ),
+    )
+    parser.epilog = (
+        "Install the shims with `install-hook-shims --use-daemon` so that they forward their"
+        " invocations to this daemon. If the daemon is not running, the shims run the hooks"
+        " themselves."
+    )
+
+    args = vars(parser.parse_args())
+    socket_path: Path = args["socket"]
+    additional_hook_modules: List[str] = args["register_additional"]
+
+    print(
+        format_dict(
+            header="CLI Configuration",
+            items={
+                "Socket": socket_path,
+                "Register hooks from modules": additional_hook_modules,
+            },
+            align_items=True,
+        )
+    )
+
+    # serve until interrupted -----------------------------------------------------------------
+    server = HookDaemon(socket_path, additional_modules=additional_hook_modules)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    logger.info(f"Listening for hook invocations on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down...")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
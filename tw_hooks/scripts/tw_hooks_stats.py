@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Aggregate the measurements recorded with TW_HOOKS_STATS, per hook and per event."""
+import json
+import sys
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from tw_hooks.instrumentation import envvar, stats_path
+from tw_hooks.utils import get_hooks_data_dir, get_task_dir
+
+_metrics = ("wall_ms", "cpu_ms", "parse_ms", "payload_bytes", "peak_kib")
+_percentiles = (50, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values.
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile([1, 2, 3, 4], 99)
+    4
+    """
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def aggregate(records: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Compute the percentiles of each metric, for each (hook, event) pair."""
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        groups[(record["hook"], record["event"])].append(record)
+
+    out = {}
+    for key, group in sorted(groups.items()):
+        stats: Dict[str, Any] = {
+            "count": len(group),
+            "failures": sum(1 for r in group if r.get("retcode") not in (0, None)),
+        }
+        for metric in _metrics:
+            # null if it wasn't measured, e.g., the peak of concurrent on-exit hooks
+            values = sorted(v for v in (r.get(metric, 0) for r in group) if v is not None)
+            for p in _percentiles:
+                stats[f"{metric}_p{p}"] = percentile(values, p) if values else None
+        out[key] = stats
+
+    return out
+
+
+def _read_records(path: Path) -> List[Dict[str, Any]]:
+    records = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # e.g., partially written line
+                continue
+
+    return records
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return f"{'-':>11}"
+    if isinstance(value, int):
+        return f"{value:>11}"
+    return f"{value:>11.2f}"
+
+
+def _print_table(stats: Dict[Tuple[str, str], Dict[str, Any]]):
+    columns = ["count", "failures"]
+    for metric in ("wall_ms", "cpu_ms", "parse_ms"):
+        columns.extend(f"{metric}_p{p}" for p in _percentiles)
+    columns.extend(["payload_bytes_p50", "peak_kib_p95"])
+
+    # e.g., wall_ms_p50 -> wall p50
+    labels = [c.replace("_ms", "").replace("_bytes", "").replace("_kib", "") for c in columns]
+    header = f"{'hook':<32} {'event':<10} " + " ".join(
+        f"{label.replace('_', ' '):>11}" for label in labels
+    )
+    print("Times in ms, payload in bytes, memory peak in KiB\n")
+    print(header)
+    print("-" * len(header))
+    for (hook, event), row in stats.items():
+        print(f"{hook:<32} {event:<10} " + " ".join(_format_cell(row[c]) for c in columns))
+
+
+def main():
+    """Main."""
+    # parse CLI arguments ---------------------------------------------------------------------
+    parser = ArgumentParser(
+        __doc__,
+        formatter_class=RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        type=Path,
+        help="File with the recorded measurements",
+        default=stats_path() or get_hooks_data_dir(get_task_dir()) / "stats.jsonl",
+    )
+    parser.add_argument(
+        "-j", "--json", action="store_true", help="Print the aggregated stats as JSON"
+    )
+    parser.epilog = (
+        f"Set {envvar}=1 in the environment that Taskwarrior runs in to record a measurement"
+        " for every hook invocation. The dispatcher shims record a separate measurement,"
+        ' under the name "dispatcher", which also includes parsing the standard input once for'
+        " all their hooks."
+    )
+
+    args = vars(parser.parse_args())
+    path: Path = args["file"]
+    if not path.is_file():
+        print(f"Can't find any recorded measurements under {path}", file=sys.stderr)
+        sys.exit(1)
+
+    stats = aggregate(_read_records(path))
+    if args["json"]:
+        print(
+            json.dumps(
+                [
+                    {"hook": hook, "event": event, **row}
+                    for (hook, event), row in stats.items()
+                ],
+                indent=2,
+            )
+        )
+    else:
+        _print_table(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Typed view of a task, over the dict that Taskwarrior passes to the hooks."""
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, MutableMapping, Optional
+
+from tw_hooks.json_codec import dumps
+from tw_hooks.types import TaskT
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    # days since 1970-01-01 of the given proleptic Gregorian date, see
+    # http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def parse_iso_basic(s: str) -> int:
+    """Convert a timestamp in the format used in the hooks' JSON to seconds since the epoch.
+
+    Slicing the fixed-width fields is several times faster than time.strptime.
+
+    >>> parse_iso_basic("20220528T155959Z")
+    1653753599
+    >>> parse_iso_basic("19691231T235959Z")
+    -1
+    >>> parse_iso_basic("2022-05-28")
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid timestamp, expected YYYYMMDDTHHMMSSZ: 2022-05-28
+    """
+    if len(s) != 16 or s[8] != "T" or s[15] != "Z" or not s[:8].isdigit():
+        raise ValueError(f"Invalid timestamp, expected YYYYMMDDTHHMMSSZ: {s}")
+    month = int(s[4:6])
+    day = int(s[6:8])
+    hours = int(s[9:11])
+    minutes = int(s[11:13])
+    seconds = int(s[13:15])
+    if not (
+        1 <= month <= 12 and 1 <= day <= 31 and hours < 24 and minutes < 60 and seconds < 61
+    ):
+        raise ValueError(f"Invalid timestamp, expected YYYYMMDDTHHMMSSZ: {s}")
+
+    days = _days_from_civil(int(s[:4]), month, day)
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+class Task(MutableMapping[str, Any]):
+    """Dict-like view of a task with typed accessors, that decodes each field at most once.
+
+    The view doesn't copy the task: changes go to the underlying dict, which is what's
+    serialized back. Assign to the fields instead of modifying their values in place, e.g.,
+    task["tags"].append(...), otherwise the decoded values aren't updated.
+
+    >>> task = Task({"description": "kalimera", "due": "20220528T155959Z", "tags": ["a", "b"]})
+    >>> task.due
+    1653753599
+    >>> task.wait is None
+    True
+    >>> sorted(task.tags)
+    ['a', 'b']
+    >>> task.tags = task.tags | {"c"}
+    >>> task["tags"]
+    ['a', 'b', 'c']
+    """
+
+    __slots__ = ("_data", "_tags", "_timestamps")
+
+    def __init__(self, data: TaskT):
+        self._data = data
+        self._tags: Optional[FrozenSet[str]] = None
+        self._timestamps: Dict[str, Optional[int]] = {}
+
+    @property
+    def data(self) -> TaskT:
+        """The underlying dict, not a copy."""
+        return self._data
+
+    @property
+    def uuid(self) -> Optional[str]:
+        return self._data.get("uuid")
+
+    @property
+    def description(self) -> Optional[str]:
+        return self._data.get("description")
+
+    @property
+    def status(self) -> Optional[str]:
+        return self._data.get("status")
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        if self._tags is None:
+            self._tags = frozenset(self._data.get("tags", ()))
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags: Iterable[str]):
+        # keep the order of the existing tags, Taskwarrior does too
+        existing = self._data.get("tags", [])
+        tags = frozenset(tags)
+        new_tags = [tag for tag in existing if tag in tags]
+        new_tags.extend(sorted(tags.difference(new_tags)))
+        if new_tags:
+            self["tags"] = new_tags
+        elif "tags" in self._data:
+            del self["tags"]
+
+    def timestamp(self, field: str) -> Optional[int]:
+        """Seconds since the epoch of the given date field, None if it's not set."""
+        try:
+            return self._timestamps[field]
+        except KeyError:
+            val = self._data.get(field)
+            ts = parse_iso_basic(val) if val is not None else None
+            self._timestamps[field] = ts
+            return ts
+
+    @property
+    def due(self) -> Optional[int]:
+        return self.timestamp("due")
+
+    @property
+    def scheduled(self) -> Optional[int]:
+        return self.timestamp("scheduled")
+
+    @property
+    def wait(self) -> Optional[int]:
+        return self.timestamp("wait")
+
+    @property
+    def start(self) -> Optional[int]:
+        return self.timestamp("start")
+
+    @property
+    def entry(self) -> Optional[int]:
+        return self.timestamp("entry")
+
+    @property
+    def modified(self) -> Optional[int]:
+        return self.timestamp("modified")
+
+    def to_json(self) -> str:
+        """Serialize the underlying dict, the way the hooks have to emit it."""
+        return dumps(self._data)
+
+    def _invalidate(self, key: str):
+        if key == "tags":
+            self._tags = None
+        else:
+            self._timestamps.pop(key, None)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self._data[key] = value
+        self._invalidate(key)
+
+    def __delitem__(self, key: str):
+        del self._data[key]
+        self._invalidate(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"Task({self._data!r})"
@@ -0,0 +1,318 @@
+"""SQLite index of the pending tasks, that hooks can query instead of parsing pending.data.
+
+Hooks can't invoke the task executable (Taskwarrior holds a lock while they run). Rather than
+scanning the data files for every question, e.g., "how many tasks are due today?", keep the
+fields that hooks filter on in a SQLite database under the tw_hooks directory of the
+Taskwarrior directory, with an index on each of them.
+
+The database is kept up to date by the MaintainTaskIndex on-exit hook, from the tasks that each
+command added or modified. It's rebuilt from pending.data if something else changed the file,
+e.g., a `task sync` or a `task gc`, or if it's older than max_age. The journal is in WAL mode,
+so hooks that read it don't block the hook that writes it, nor each other.
+
+Only active tasks are indexed: completed and deleted ones are dropped, even if they stay in
+pending.data until the next gc.
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, cast
+
+from tw_hooks.json_codec import loads
+from tw_hooks.task import Task
+from tw_hooks.types import TaskLike, TaskT
+from tw_hooks.utils import get_hooks_data_dir
+
+# Bump when the schema changes, the database is then rebuilt
+_SCHEMA_VERSION = 1
+
+_TABLES = (
+    """CREATE TABLE IF NOT EXISTS tasks (
+        uuid TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        project TEXT,
+        due INTEGER,
+        scheduled INTEGER
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS task_tags (
+        tag TEXT NOT NULL,
+        uuid TEXT NOT NULL,
+        PRIMARY KEY (tag, uuid)
+    ) WITHOUT ROWID""",
+    "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value) WITHOUT ROWID",
+)
+
+# Created after the tables are filled by a rebuild, which is faster than updating them per row
+_INDICES = (
+    "CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due) WHERE due IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS tasks_scheduled ON tasks (scheduled) WHERE scheduled IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS tasks_project ON tasks (project) WHERE project IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS task_tags_uuid ON task_tags (uuid)",
+)
+
+# Date fields that can be queried, they are stored as seconds since the epoch
+date_fields = ("due", "scheduled")
+
+_inactive_statuses = {"completed", "deleted"}
+
+_Row = Tuple[str, str, Optional[str], Optional[int], Optional[int]]
+
+
+def _decode_value(value: str) -> str:
+    if "\\" in value:
+        try:
+            value = loads(f'"{value}"')
+        except ValueError:
+            pass
+    if "&" in value:
+        value = value.replace("&open;", "[").replace("&close;", "]")
+    return value
+
+
+def _attribute(line: str, key: str) -> Optional[str]:
+    """Value of the attribute with the given key, e.g., 'project:"', in a pending.data line.
+
+    >>> _attribute('[description:"say \\\\"hi\\\\"" project:"home"]', 'description:"')
+    'say "hi"'
+    >>> _attribute('[description:"the project:\\\\"x\\\\""]', 'project:"') is None
+    True
+    """
+    # plain find() is much faster than a regular expression when called for every line
+    start = line.find(key)
+    while start > 0 and line[start - 1] not in "[ ":
+        # e.g., looking for due and found overdue
+        start = line.find(key, start + 1)
+    if start == -1:
+        return None
+
+    start += len(key)
+    end = line.find('"', start)
+    while end != -1 and line[end - 1] == "\\":
+        end = line.find('"', end + 1)
+    return _decode_value(line[start:end])
+
+
+def _parse_line(line: str) -> Optional[Tuple[_Row, List[str]]]:
+    uuid = _attribute(line, 'uuid:"')
+    if uuid is None:
+        return None
+
+    dates = []
+    for field in date_fields:
+        val = _attribute(line, f'{field}:"')
+        dates.append(int(val) if val else None)
+    tags = [tag for tag in (_attribute(line, 'tags:"') or "").split(",") if tag]
+    status = _attribute(line, 'status:"') or "pending"
+    return (uuid, status, _attribute(line, 'project:"'), *dates), tags  # type: ignore
+
+
+def _row_from_task(task: Task) -> Tuple[_Row, List[str]]:
+    row = (
+        task.uuid,
+        task.status or "pending",
+        task.get("project"),
+        *(task.timestamp(field) for field in date_fields),
+    )
+    return row, sorted(task.tags)  # type: ignore
+
+
+class TaskIndex:
+    """Index of the status, project, tags and dates of the active tasks in pending.data."""
+
+    def __init__(self, pending_data: Path, db_path: Path, max_age: float = 24 * 60 * 60):
+        self._pending_data = pending_data
+        self._db_path = db_path
+        self._max_age = max_age
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def for_task_dir(cls, task_dir: Union[str, Path], **kargs) -> "TaskIndex":
+        """Index of the tasks of the given Taskwarrior directory, where the hooks keep it."""
+        task_dir = Path(task_dir)
+        return cls(
+            pending_data=task_dir / "pending.data",
+            db_path=get_hooks_data_dir(task_dir) / "tasks.sqlite",
+            **kargs,
+        )
+
+    @property
+    def pending_data(self) -> Path:
+        return self._pending_data
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._db_path.parent.mkdir(parents=True, exist_ok=True)
+            # transactions are managed explicitly, see _write
+            conn = sqlite3.connect(self._db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # in WAL mode, a crash can only lose the last transactions, not corrupt the db
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+            if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                with self._write():
+                    for table in ("tasks", "task_tags", "state"):
+                        conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    for statement in (*_TABLES, *_INDICES):
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # updates ---------------------------------------------------------------------------------
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        conn = self.conn
+        # take the write lock upfront, instead of failing to upgrade a read lock halfway
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, row: _Row, tags: Sequence[str]):
+        uuid = row[0]
+        conn.execute("DELETE FROM task_tags WHERE uuid = ?", (uuid,))
+        if row[1] in _inactive_statuses:
+            conn.execute("DELETE FROM tasks WHERE uuid = ?", (uuid,))
+            return
+        conn.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)", row)
+        conn.executemany(
+            "INSERT OR IGNORE INTO task_tags VALUES (?, ?)", ((t, uuid) for t in tags)
+        )
+
+    def _apply_tasks(self, conn: sqlite3.Connection, tasks: Iterable[TaskLike]):
+        for task in tasks:
+            view = task if isinstance(task, Task) else Task(cast(TaskT, task))
+            if view.uuid is None:
+                continue
+            self._upsert(conn, *_row_from_task(view))
+
+    def update(self, tasks: Iterable[TaskLike]):
+        """Apply the given added/modified tasks, as passed to the on-exit hooks."""
+        with self._write() as conn:
+            self._apply_tasks(conn, tasks)
+
+    def rebuild(self):
+        """Index the tasks of pending.data from scratch."""
+        stat = self._pending_data.stat()
+        # a task may appear more than once, the last line wins
+        parsed: Dict[str, Tuple[_Row, List[str]]] = {}
+        with self._pending_data.open("r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                row_tags = _parse_line(line)
+                if row_tags is not None:
+                    parsed[row_tags[0][0]] = row_tags
+        active = [rt for rt in parsed.values() if rt[0][1] not in _inactive_statuses]
+
+        with self._write() as conn:
+            # recreate the tables and fill them in the order of their primary keys, it's
+            # several times faster than deleting and inserting the rows in random order
+            conn.execute("DROP TABLE tasks")
+            conn.execute("DROP TABLE task_tags")
+            for statement in _TABLES:
+                conn.execute(statement)
+            conn.executemany(
+                "INSERT INTO tasks VALUES (?, ?, ?, ?, ?)", sorted(row for row, _ in active)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO task_tags VALUES (?, ?)",
+                sorted((tag, row[0]) for row, tags in active for tag in tags),
+            )
+            for statement in _INDICES:
+                conn.execute(statement)
+            self._set_state(conn, stat, built_at=time.time())
+
+    def refresh(self, tasks: Iterable[TaskLike] = ()):
+        """Bring the index up to date with pending.data.
+
+        :param tasks: Tasks that were added/modified since the last refresh, as passed to the
+                      on-exit hooks
+        """
+        stat = self._pending_data.stat()
+        state = self._state()
+        if (
+            state.get("inode") != stat.st_ino
+            or time.time() - state.get("built_at", 0) >= self._max_age
+        ):
+            self.rebuild()
+            return
+        if state.get("size") == stat.st_size and state.get("mtime_ns") == stat.st_mtime_ns:
+            return
+
+        tasks = list(tasks)
+        if not tasks:
+            # changed by something other than a command that ran the hooks
+            self.rebuild()
+            return
+
+        # modified by the command that's exiting
+        with self._write() as conn:
+            self._apply_tasks(conn, tasks)
+            self._set_state(conn, stat)
+
+    def _state(self) -> Dict[str, float]:
+        return dict(self.conn.execute("SELECT key, value FROM state").fetchall())
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, stat: os.stat_result, **extra: float):
+        state = {
+            "inode": stat.st_ino,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            **extra,
+        }
+        conn.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)", state.items())
+
+    # queries ---------------------------------------------------------------------------------
+    @staticmethod
+    def _check_date_field(field: str):
+        if field not in date_fields:
+            raise RuntimeError(f"Can't query {field}, expected one of {list(date_fields)}")
+
+    def count(self) -> int:
+        """Number of active tasks."""
+        return int(self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0])
+
+    def count_between(self, start: int, end: int, field: str = "due") -> int:
+        """Number of tasks with the given date field in [start, end), in seconds since the epoch."""
+        self._check_date_field(field)
+        return int(
+            self.conn.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE {field} >= ? AND {field} < ?", (start, end)
+            ).fetchone()[0]
+        )
+
+    def uuids_between(self, start: int, end: int, field: str = "due") -> List[str]:
+        """UUIDs of the tasks with the given date field in [start, end), earliest first."""
+        self._check_date_field(field)
+        rows = self.conn.execute(
+            f"SELECT uuid FROM tasks WHERE {field} >= ? AND {field} < ? ORDER BY {field}",
+            (start, end),
+        )
+        return [row[0] for row in rows]
+
+    def uuids_with_tag(self, tag: str) -> List[str]:
+        """UUIDs of the tasks with the given tag."""
+        rows = self.conn.execute("SELECT uuid FROM task_tags WHERE tag = ?", (tag,))
+        return [row[0] for row in rows]
+
+    def uuids_in_project(self, project: str) -> List[str]:
+        """UUIDs of the tasks of the given project, or of any of its subprojects."""
+        # a range instead of LIKE 'project.%', so that the index on project is used. '/' is the
+        # character right after '.'
+        rows = self.conn.execute(
+            "SELECT uuid FROM tasks WHERE project = ? OR (project >= ? AND project < ?)",
+            (project, f"{project}.", f"{project}/"),
+        )
+        return [row[0] for row in rows]
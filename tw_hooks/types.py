@@ -1,6 +1,14 @@
-from typing import Any, Dict, List, Literal, Mapping
+from typing import Any, Dict, List, Literal, Mapping, MutableMapping, Sequence, Tuple, Union
 
 TaskT = Dict[str, Any]
+# A task as the hooks get it: the decoded JSON, or a tw_hooks.task.Task view of it if the hook
+# sets task_view
+TaskLike = MutableMapping[str, Any]
 MapOfTags = Mapping[str, str]
+# tag pattern -> tag, or tags, to add
+MapOfExtraTags = Mapping[str, Union[str, Sequence[str]]]
 ListOfTagsList = List[List[str]]
 Retcode = Literal[0, 1]
+
+# (module path, class name) pair that identifies a hook without having to import it
+HookSpec = Tuple[str, str]
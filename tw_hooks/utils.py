@@ -2,27 +2,21 @@
 
 If something is generic enough, make a PR to <https://github.com/bergercookie/bubop>
 """
-import json
 import os
 import sys
-from json.decoder import JSONDecodeError
-from typing import List, Optional, Union, cast
-
-from bubop import logger
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Union, cast
 
+from tw_hooks.json_codec import loads_lenient
 from tw_hooks.types import ListOfTagsList, MapOfTags, TaskT
 
 
-def _use_json(json_str: str):
+def use_json(json_str: str):
+    """Decode a task from a line of JSON, or of a Python literal. Empty lines are empty tasks."""
     if json_str == "":
         return {}
     else:
-        try:
-            out = json.loads(json_str)
-        except JSONDecodeError:
-            out = json.loads(json_str.replace("'", '"'))
-
-        return out
+        return loads_lenient(json_str)
 
 
 def stdin_lines_to_json(stdin_lines: List[str]) -> List[TaskT]:
@@ -32,11 +26,39 @@ def stdin_lines_to_json(stdin_lines: List[str]) -> List[TaskT]:
     """
     out: List[TaskT] = []
     for line in stdin_lines:
-        out.append(_use_json(line.strip()))
+        out.append(use_json(line.strip()))
 
     return out
 
 
+def iter_tasks(lines: Iterable[str]) -> Iterator[TaskT]:
+    """Decode the tasks of the given lines one at a time, as they are consumed.
+
+    >>> tasks = iter_tasks(['{"description": "kalimera"}\\n', '\\n', "{}\\n"])
+    >>> next(tasks)
+    {'description': 'kalimera'}
+    """
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield use_json(line)
+
+
+def changed_fields(
+    original_task: Mapping[str, Any], modified_task: Mapping[str, Any]
+) -> Set[str]:
+    """Fields that were added, removed or changed between the two versions of a task.
+
+    >>> sorted(changed_fields({"a": 1, "b": [1], "c": 0}, {"a": 1, "b": [1, 2], "d": 0}))
+    ['b', 'c', 'd']
+    """
+    return {
+        field
+        for field in original_task.keys() | modified_task.keys()
+        if original_task.get(field) != modified_task.get(field)
+    }
+
+
 _JsonRetValue = Optional[Union[MapOfTags, ListOfTagsList]]
 
 
@@ -46,10 +68,47 @@ def get_json_from_environ(envvar: str) -> _JsonRetValue:
     if val is None:
         return None
     else:
-        val = json.loads(val.replace("'", '"'))
-        return cast(_JsonRetValue, val)
+        return cast(_JsonRetValue, loads_lenient(val))
+
+
+def get_task_dir(argv: Optional[Sequence[str]] = None) -> Path:
+    """Taskwarrior data directory, as passed to the hooks in their arguments.
+
+    Default to ~/.task, e.g., if not called from within a hook.
+
+    >>> get_task_dir(["api:2", "data:/some/dir/.task", "version:2.6.2"])
+    PosixPath('/some/dir/.task')
+    """
+    if argv is None:
+        argv = sys.argv
+    for arg in argv:
+        if arg.startswith("data:"):
+            return Path(arg[len("data:") :]).expanduser()
+
+    return Path.home() / ".task"
+
+
+def get_hooks_data_dir(task_dir: Path) -> Path:
+    """Directory under the Taskwarrior directory, where the hooks can persist their own data."""
+    return task_dir / "tw_hooks"
 
 
 def parse_stdin_lines() -> List[str]:
     with open(sys.stdin.fileno(), "r", encoding="utf-8", errors="ignore") as f:
         return f.readlines()
+
+
+def iter_stdin_lines() -> Iterator[str]:
+    """Yield the lines of the standard input as they are read, instead of all at once.
+
+    When the generator is closed, the lines that weren't consumed are read and discarded, so
+    that Taskwarrior can write all of them without a broken pipe.
+    """
+    with open(sys.stdin.fileno(), "r", encoding="utf-8", errors="ignore") as f:
+        try:
+            # not `yield from f`, that would close the file when the generator is closed
+            for line in f:
+                yield line
+        finally:
+            while f.read(1 << 16):
+                pass